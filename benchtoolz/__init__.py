@@ -1,6 +1,14 @@
 from .benchutils import (BenchRunner, runbenchmarks, quickstart, bettertimeit,
                          findarenas, findbenchmarks, getarenalist, getbenchlist)
 
-from .printutils import ProgressPrinter, BenchPrinter
+from .clusterutils import BenchCoordinator
+
+from .compareutils import compareresults
+
+from .fixtureutils import fixture
+
+from .historyutils import HistoryStore, findregressions
+
+from .printutils import ProgressPrinter, BenchPrinter, ComparePrinter
 
 __version__ = '0.1.0'
@@ -0,0 +1,103 @@
+from __future__ import print_function
+import gc
+import timeit
+from .timerutils import (BenchTimer, compilecached, compileloop,
+                         default_overheadrepeat, gettimer)
+
+default_loopfactory = 'asyncio:new_event_loop'
+# {loopfactory name: event loop}.  One event loop is reused for all async
+# benchmarks in a process.
+_eventloops = {}
+# {(timername, loopfactory name, loops): overhead in seconds}
+_overheadcache = {}
+
+_batchtemplate = '''
+async def _benchbatch(_benchloops, _benchtimer):
+    _benchstart = _benchtimer()
+    for _benchi in range(_benchloops):
+{statements}
+    return _benchtimer() - _benchstart
+'''
+
+
+def getloopfactory(loopfactory=None):
+    """ Return the name and function of an event loop factory.
+
+    ``loopfactory`` is a function that returns a new event loop, such as
+    ``uvloop.new_event_loop``, or a string such as "uvloop:new_event_loop"
+    that names one.  The default is ``asyncio.new_event_loop``.  Strings are
+    useful to pass the loop factory to worker processes.
+    """
+    # Used by: geteventloop, AsyncTimer
+    if loopfactory is None:
+        loopfactory = default_loopfactory
+    if isinstance(loopfactory, str):
+        import importlib
+        modname, _, funcname = loopfactory.partition(':')
+        func = getattr(importlib.import_module(modname), funcname)
+        return loopfactory, func
+    name = '%s:%s' % (getattr(loopfactory, '__module__', ''),
+                      getattr(loopfactory, '__name__', repr(loopfactory)))
+    return name, loopfactory
+
+
+def geteventloop(loopfactory=None):
+    """ Return the event loop of ``loopfactory`` for this process.
+
+    The loop is created the first time and reused afterwards, so the cost of
+    creating event loops is never included in the benchmarks.
+    """
+    # Uses: getloopfactory
+    # Used by: AsyncTimer
+    name, func = getloopfactory(loopfactory)
+    if name not in _eventloops:
+        _eventloops[name] = func()
+    return _eventloops[name]
+
+
+class AsyncTimer(BenchTimer):
+    """ Like ``BenchTimer``, but ``stmt`` is the body of a coroutine.
+
+    The statements may use ``await``, ``async for``, and ``async with``.
+    They are run in a batch of ``number`` loops by a single coroutine, which
+    is run by an event loop from ``geteventloop``.  Hence, only one task is
+    scheduled per batch instead of per loop.  Like ``timeit``, garbage
+    collection is disabled while timing.
+
+    ``setup`` is run once in ``globals``, which should be a fresh dict.
+    """
+    def __init__(self, stmt='pass', setup='pass', timer=timeit.default_timer,
+                 globals=None, loopfactory=None):
+        # timeit.Timer can't compile statements that use ``await``
+        self.timerarg = timer
+        self.timername, self.timer, self.scale = gettimer(timer)
+        self.loopfactory = loopfactory
+        self.loopname = getloopfactory(loopfactory)[0]
+        self.loop = geteventloop(loopfactory)
+        namespace = {} if globals is None else globals
+        exec(compilecached(setup, '<setup>'), namespace)
+        exec(compileloop(stmt, template=_batchtemplate), namespace)
+        self.batch = namespace['_benchbatch']
+
+    def timeit(self, number=timeit.default_number):
+        gcold = gc.isenabled()
+        gc.disable()
+        try:
+            elapsed = self.loop.run_until_complete(
+                self.batch(number, self.timer))
+        finally:
+            if gcold:
+                gc.enable()
+        return self.scale * elapsed
+
+    def getoverhead(self, loops, numrepeat=default_overheadrepeat):
+        """ Return the time to run a batch of ``loops`` empty loops.
+
+        This includes the cost of scheduling the batch on the event loop.
+        """
+        key = (self.timername, self.loopname, loops)
+        if key not in _overheadcache:
+            empty = AsyncTimer('pass', timer=self.timerarg, globals={},
+                               loopfactory=self.loopfactory)
+            _overheadcache[key] = min(empty.repeat(numrepeat, loops))
+        return _overheadcache[key]
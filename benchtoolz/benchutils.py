@@ -1,21 +1,50 @@
 from __future__ import print_function
+import ast
 import glob
 import imp
 import inspect
+import math
+import multiprocessing
 import os.path
-import pyclbr
 import sys
 import textwrap
+import time
 import timeit
-from .printutils import ProgressPrinter, BenchPrinter, nsorted
+from .asyncutils import AsyncTimer, default_loopfactory
+from .cacheutils import ResultCache, default_cachefile, gettrialkey
+from .compareutils import compareresults, default_alpha, selectbaseline
+from .concurrencyutils import (getconcurrencylevels, getconcurrencymodes,
+                               measurescaling)
+from .cythonutils import buildall, loadextension
+from .fixtureutils import loadfixtures
+from .latencyutils import default_latencysamples, getlatency
+from .outpututils import outputit
+from .historyutils import (HistoryStore, findregressions, getcommit,
+                           getfingerprint)
+from .printutils import (ProgressPrinter, BenchPrinter, ComparePrinter, nsorted,
+                         numericstringkey)
+from .profileutils import default_profiledir, default_profiletime, profiletrial
+from .scaleutils import geometricsizes
+from .scanutils import getindex, scanfiles
+from .statutils import (default_confidence, describe, medianci, median,
+                        stdev)
+from .timerutils import BenchTimer, compilesetup, getlooptimes, gettimer
 
 # We can introduce better configuration handling later.
 # We should, however, think about and clean up the *values* of these configs.
 default_dirs = ['*arena*', '*benchmark*', '*benchit*']
 default_arenaprefixes = ['', 'trial_', 'arena_']
 default_benchprefixes = ['benchit_', 'bench_', 'timeit_', 'time_']
+# Prefix of the per-iteration setup function of a benchmark, such as
+# "setup_sort" for "bench_sort"
+default_itersetupprefix = 'setup_'
 default_mintime = 0.25
 default_numrepeat = 3
+default_maxtime = 10.0
+default_racingmargin = 0.25
+default_racingrepeat = 3
+# Fractions of a ``budget`` for calibrating trials and for work after timing
+default_budgetreserve = 0.1
 default_timer = timeit.default_timer
 
 
@@ -35,7 +64,9 @@ class BenchRunner(object):
     Finding arenas and benchmarks: call ``findarenas`` and ``findbenchmarks``
     methods to get dicts that map filenames to list of function names to use in
     the benchmarks.  No file will be imported (unless cython is True), so this
-    is a safe operation.  The user may modify the dicts if desired.
+    is a safe operation.  The user may modify the dicts if desired.  If
+    ``index`` is given, then functions are found via a ``ScanIndex`` (see
+    ``findarenas``), which is much faster for large source trees.
 
     Running benchmarks: run the benchmarks.  If ``arenadict`` and ``benchdict``
     aren't passed to ``BenchRunner.runbenchmarks``, then the values returned by
@@ -44,11 +75,19 @@ class BenchRunner(object):
     Display the benchmarks: currently only github-flavored markdown tables are
     supported.  Tables can be of time, relative time, and rank.
 
+    Track the benchmarks: if ``historyfile`` is given, then results may be
+    saved to and queried from a ``HistoryStore`` via ``savehistory`` and
+    ``queryhistory``, and ``findregressions`` compares results to their
+    history.  Results are keyed by the git commit of ``sourcedir``, and
+    ``comparehistory`` tests whether results are significantly faster or
+    slower than the results of another commit.
+
     """
     # Uses: getsourcedir, getpaths, findarenas, findbenchmarks, runbenchmarks
     def __init__(self, name, cython=False, arenaprefixes=default_arenaprefixes,
                  benchprefixes=default_benchprefixes, sourcedir=None,
-                 arenapaths=None, benchpaths=None):
+                 arenapaths=None, benchpaths=None, historyfile=None,
+                 index=None):
         self.name = name
         self.cython = cython
         self.arenaprefixes = list(arenaprefixes)
@@ -64,28 +103,43 @@ class BenchRunner(object):
             benchpaths = getpaths(name, sourcedir=sourcedir,
                                   prefixes=self.benchprefixes)
         self.benchpaths = list(benchpaths)
+        if historyfile is None:
+            self.history = None
+        else:
+            self.history = HistoryStore(historyfile)
+        self.index = getindex(index)
 
-    def findarenas(self):
+    def findarenas(self, workers=None):
         """ Return dict that maps filenames to list of func names to benchmark.
 
         This is a thin wrapper around ``findarenas`` function, so see that
         function for more detail.
         """
         return findarenas(self.name, prefixes=self.arenaprefixes,
-                          paths=self.arenapaths, cython=self.cython)
+                          paths=self.arenapaths, cython=self.cython,
+                          index=self.index, workers=workers)
 
-    def findbenchmarks(self):
+    def findbenchmarks(self, workers=None):
         """ Return dict that maps filenames to list of benchmark func names.
 
         This is a thin wrapper around ``findbenchmarks`` function, so see
         that function for more detail.
         """
         return findbenchmarks(self.name, prefixes=self.benchprefixes,
-                              paths=self.benchpaths)
+                              paths=self.benchpaths, index=self.index,
+                              workers=workers)
 
     def runbenchmarks(self, arenadict=None, benchdict=None, verbose=True,
                       mintime=default_mintime, numrepeat=default_numrepeat,
-                      timer=default_timer, trialfilter=None, trialcallback=None):
+                      timer=default_timer, trialfilter=None, trialcallback=None,
+                      workers=None, rtol=None, maxtime=default_maxtime,
+                      memory=False, profile=None,
+                      profiledir=default_profiledir,
+                      profiletime=default_profiletime, sizes=None,
+                      cache=None, coordinator=None, lownoise=False,
+                      calibrate=True, loopfactory=None, concurrency=None,
+                      concurrencymode='threads', racing=None, budget=None,
+                      latency=None, checkoutput=True):
         """ Thin wrapper around ``runbenchmarks`` to run the benchmarks.
 
         If ``arenadict`` and ``benchdict`` are not provided, then the values
@@ -95,30 +149,113 @@ class BenchRunner(object):
         See ``runbenchmarks`` for more detail.
         """
         if arenadict is None:
-            arenadict = self.findarenas()
+            arenadict = self.findarenas(workers=workers)
         if benchdict is None:
-            benchdict = self.findbenchmarks()
+            benchdict = self.findbenchmarks(workers=workers)
         return runbenchmarks(self.name, arenadict, benchdict, verbose=verbose,
                              mintime=mintime, numrepeat=numrepeat,
                              timer=timer, cython=self.cython,
                              trialfilter=trialfilter,
-                             trialcallback=trialcallback)
-
-    def to_gfm(self, results, relative=False, rank=False):
+                             trialcallback=trialcallback, workers=workers,
+                             rtol=rtol, maxtime=maxtime, memory=memory,
+                             profile=profile, profiledir=profiledir,
+                             profiletime=profiletime, sizes=sizes,
+                             cache=cache, coordinator=coordinator,
+                             lownoise=lownoise, calibrate=calibrate,
+                             loopfactory=loopfactory, concurrency=concurrency,
+                             concurrencymode=concurrencymode, racing=racing,
+                             budget=budget, latency=latency,
+                             checkoutput=checkoutput)
+
+    def to_gfm(self, results, relative=False, rank=False, error=False,
+               memory=False, throughput=False):
         """ Return a github-flavored markdown table of benchmark results.
 
         By default, the values in the table will be the times of the
         benchmarks.  Use ``relative=True`` keyword to display the relative
         times of the benchmarks (relative to the fastest function being
         benchmark), and use ``rank=True`` keyword to display the rank--from
-        fastest (1) to slowest--of each function being benchmarked.
+        fastest (1) to slowest--of each function being benchmarked.  Use
+        ``error=True`` to display the error (half-width of the confidence
+        interval) of times and relative times.  Use ``memory=True`` to
+        display peak memory instead of times (requires results from
+        ``runbenchmarks(memory=True)``), and use ``throughput=True`` to
+        display the number of runs per second instead of times.
         """
         arenaprefixes = [prefix + self.name for prefix in self.arenaprefixes]
         printer = BenchPrinter(results, arenaprefixes=arenaprefixes,
                                benchprefixes=self.benchprefixes)
         resultlist = []
-        for (benchfile, arenafile), table in sorted(printer.tables.items()):
-            val = printer.to_gfm(table, relative=relative, rank=rank)
+        for benchfile, arenafile in printer.tablekeys:
+            val = printer.to_gfm((benchfile, arenafile), relative=relative,
+                                 rank=rank, error=error, memory=memory,
+                                 throughput=throughput)
+            resultlist.append((arenafile, benchfile, val))
+        return resultlist
+
+    def _gethistory(self):
+        if self.history is None:
+            raise ValueError('BenchRunner was created without a historyfile')
+        return self.history
+
+    def savehistory(self, results, commit=None):
+        """ Append results from ``runbenchmarks`` to the history store.
+
+        If ``commit`` is not given, then the current git commit of the
+        source directory is used.  Returns the number of records added.
+        """
+        if commit is None:
+            commit = getcommit(self.sourcedir)
+        return self._gethistory().append(results, commit=commit)
+
+    def queryhistory(self, **kwargs):
+        """ Return a list of records from the history store.
+
+        See ``HistoryStore.query`` for the keyword arguments.
+        """
+        return self._gethistory().query(**kwargs)
+
+    def findregressions(self, results, commit=None, **kwargs):
+        """ Return results whose times moved beyond their historical noise.
+
+        History from the current commit (or ``commit`` if given) is ignored.
+        This is a thin wrapper around the ``findregressions`` function, so
+        see that function for more detail.
+        """
+        if commit is None:
+            commit = getcommit(self.sourcedir)
+        return findregressions(self._gethistory(), results, commit=commit,
+                               **kwargs)
+
+    def comparehistory(self, results, commit, alpha=default_alpha,
+                       machine=None):
+        """ Compare results to the results of ``commit`` in the history.
+
+        The times of every repeat are compared with a significance test, so
+        this tells whether a change is real or noise.  Each trial is
+        compared to the latest run of ``commit`` on its own machine, unless
+        a machine fingerprint is given as ``machine`` to compare to that
+        machine instead (see ``compareutils.selectbaseline``).  This is a
+        thin wrapper around ``compareutils.compareresults``, so see that
+        function for more detail.  Use ``to_gfm_compare`` to display the
+        comparisons.
+        """
+        baseline = selectbaseline(self._gethistory().query(commit=commit),
+                                  results, machine=machine)
+        return compareresults(baseline, results, alpha=alpha)
+
+    def to_gfm_compare(self, comparisons, pvalue=False):
+        """ Return gfm tables of comparisons from ``comparehistory``.
+
+        Significant speedups are emphasized like the best times of
+        ``to_gfm``.  See ``printutils.ComparePrinter.to_gfm``.
+        """
+        arenaprefixes = [prefix + self.name for prefix in self.arenaprefixes]
+        printer = ComparePrinter(comparisons, arenaprefixes=arenaprefixes,
+                                 benchprefixes=self.benchprefixes)
+        resultlist = []
+        for benchfile, arenafile in sorted(printer.tables):
+            val = printer.to_gfm((benchfile, arenafile), pvalue=pvalue)
             resultlist.append((arenafile, benchfile, val))
         return resultlist
 
@@ -176,56 +313,116 @@ def getpaths(name, sourcedir=None, dirs=None, prefixes=None):
     return paths
 
 
-def scanfuncs(filename, prefixes, cython=False):
+# Modules loaded by ``loadbenchfile`` and ``loadarenafile``.  Each benchmark
+# and arena file is executed at most once per process.
+_modulecache = {}
+
+
+def loadbenchfile(filename):
+    """ Import a benchmark file and return the module.
+
+    The file is executed only the first time it is loaded in this process.
+    Subsequent calls return the cached module, so expensive global setup in
+    benchmark files (such as creating large inputs) is only done once per
+    process instead of once per benchmark and arena function.
+
+    Globals created with the ``fixture`` decorator are replaced by their
+    values (see ``fixtureutils.loadfixtures``), which are built once and
+    shared by every process that loads the file.
+    """
+    # Uses: loadfixtures
+    # Used by: getbenchsetup, getbenchstrings
+    key = ('bench', filename)
+    if key in _modulecache:
+        return _modulecache[key]
+    sys.dont_write_bytecode = True
+    path, name = os.path.split(filename)
+    name, ext = os.path.splitext(name)
+    # Module names must be unique, because files in different directories
+    # may share the same base name.
+    modname = '_benchmark_file_%s_%d' % (name, len(_modulecache))
+    # make sure local imports work for benchmark file
+    sys.path.insert(0, path)
+    try:
+        mod = imp.load_source(modname, filename)
+    finally:
+        # undo making local imports work
+        sys.path.remove(path)
+    loadfixtures(mod, filename)
+    _modulecache[key] = mod
+    return mod
+
+
+def loadarenafile(filename, cython=False):
+    """ Import an arena file and return the module.
+
+    Cython files are built with ``pyximport`` and saved in a build cache
+    (see ``cythonutils.buildall``), so they are only compiled again when
+    they or their dependencies change.  Like ``loadbenchfile``, the file is
+    loaded and executed only once per process.
+    """
+    # Uses: loadextension
+    # Used by: scanfuncs, getarenasetup
+    key = ('arena', filename)
+    if key in _modulecache:
+        return _modulecache[key]
+    sys.dont_write_bytecode = True
+    path, name = os.path.split(filename)
+    name, ext = os.path.splitext(name)
+    # Make sure local imports work for the given file
+    sys.path.insert(0, path)
+    try:
+        if cython:
+            mod = loadextension(filename)
+        else:
+            modname = '_benchmark_arena_%s_%d' % (name, len(_modulecache))
+            mod = imp.load_source(modname, filename)
+    finally:
+        # Undo making local imports work
+        sys.path.remove(path)
+    _modulecache[key] = mod
+    return mod
+
+
+def scanfuncs(filename, prefixes, cython=False, index=None):
     """ Return list of function names from ``filename`` that begin with prefix.
 
     This *does not* import the Python file, so this is safe to use, but
     functionality is limited to retrieving names of basic functions defined
-    within global scope of the file.
+    within global scope of the file.  The file is parsed with ``ast``, and
+    ``index`` may be used to avoid parsing it again (see ``scanfiles``).
 
     This *does*, however, import Cython files (if applicable).
     """
-    # Used by: findarenas, findbenchmarks
+    # Uses: scanfiles, loadarenafile
     path, name = os.path.split(filename)
     name, ext = os.path.splitext(name)
     # Should `cython` be a keyword argument, or should we just infer it?
     cython = cython or ext == '.pyx'
     if not cython:
-        funcs = pyclbr.readmodule_ex(name, [path])
-        funcnames = []
-        for key, val in funcs.items():
-            if (any(key.startswith(prefix) for prefix in prefixes) and
-                    val.file == filename):
-                funcnames.append(key)
-        return funcnames
-
-    # Scan Cython file.  We need to import it.
-    import pyximport
-    pyximport.install()
-    sys.dont_write_bytecode = True
-    # Make sure local imports work for the given file
-    sys.path.insert(0, path)
-    pyximport.build_module(name, filename)
-    try:
-        mod = pyximport.load_module(name, filename)
-    except ImportError:
-        # There is most likely a '*.py' file that shares the same
-        # base name as the '*.pyx' file we are trying to import.
-        # Removing the directory from sys.path should fix this,
-        # but will disable local importing.
-        sys.path.pop(0)
-        mod = pyximport.load_module(name, filename)
-    # Undo making local imports work
-    if sys.path[0] == path:
-        sys.path.pop(0)
-    funcnames = []
-    for funcname in mod.__dict__:
-        if any(funcname.startswith(prefix) for prefix in prefixes):
-            funcnames.append(funcname)
-    return funcnames
-
-
-def findarenas(name, cython=False, prefixes=default_arenaprefixes, paths=None):
+        funcs = scanfiles([filename], index=index)[filename]
+    else:
+        # Scan Cython file.  We need to import it.
+        mod = loadarenafile(filename, cython=True)
+        funcs = list(mod.__dict__)
+    return [funcname for funcname in funcs
+            if any(funcname.startswith(prefix) for prefix in prefixes)]
+
+
+def globpaths(paths, suffix):
+    """ Return sorted list of unique filenames that match the path patterns
+    """
+    # Used by: findarenas, findbenchmarks
+    filenames = set()
+    for pattern in paths:
+        if not pattern.endswith(suffix):
+            pattern += suffix
+        filenames.update(glob.glob(pattern))
+    return sorted(filenames)
+
+
+def findarenas(name, cython=False, prefixes=default_arenaprefixes, paths=None,
+               index=None, workers=None):
     """ Return dict that maps filenames to list of function names to benchmark.
 
     This finds all functions that will be used in the benchmarks.  If
@@ -243,27 +440,40 @@ def findarenas(name, cython=False, prefixes=default_arenaprefixes, paths=None):
         - prefixes: list of prefixes that may come before ``name``
             - applies to filenames (if ``path`` isn't specified) and functions
         - paths: list of patterns that should glob to filenames to use
+        - index: a ``ScanIndex``, the filename of one, or True to use the
+          default file.  Python files that haven't changed since they were
+          indexed are not parsed again.
+        - workers: number of processes used to parse many Python files or
+          to compile Cython files
     """
-    # Uses: scanfuncs
+    # Uses: globpaths, scanfiles, scanfuncs
     # Used by: BenchRunner, quickstart
     if paths is None:
         paths = getpaths(name, prefixes=prefixes)
     suffix = '.pyx' if cython else '.py'
-    filenames = []
-    for pattern in paths:
-        if not pattern.endswith(suffix):
-            pattern += suffix
-        filenames.extend(glob.glob(pattern))
+    filenames = globpaths(paths, suffix)
+    funcprefixes = [prefix + name for prefix in prefixes]
     arenadict = {}
-    for filename in filenames:
-        funcprefixes = [prefix + name for prefix in prefixes]
-        funcs = scanfuncs(filename, funcprefixes, cython=cython)
+    if cython:
+        # Compile all files concurrently before importing them one by one
+        buildall(filenames, workers=workers)
+        for filename in filenames:
+            funcs = scanfuncs(filename, funcprefixes, cython=True)
+            if funcs:
+                arenadict[filename] = funcs
+        return arenadict
+    for filename, funcs in scanfiles(filenames, index=index,
+                                     workers=workers).items():
+        funcs = [funcname for funcname in funcs
+                 if any(funcname.startswith(prefix)
+                        for prefix in funcprefixes)]
         if funcs:
             arenadict[filename] = funcs
     return arenadict
 
 
-def findbenchmarks(name, prefixes=default_benchprefixes, paths=None):
+def findbenchmarks(name, prefixes=default_benchprefixes, paths=None,
+                   index=None, workers=None):
     """ Return dict that maps filenames to list of benchmark function names.
 
     This finds all functions that will be used to perform the benchmarks.
@@ -280,20 +490,19 @@ def findbenchmarks(name, prefixes=default_benchprefixes, paths=None):
         - prefixes: list of prefixes that identify benchmark functions
             - also applies to filenames if ``path`` isn't specified
         - paths: list of patterns that should glob to filenames to use
+        - index: see ``findarenas`` function.
+        - workers: see ``findarenas`` function.
     """
-    # Uses: scanfuncs
+    # Uses: globpaths, scanfiles
     # Used by: BenchRunner, quickstart
     if paths is None:
         paths = getpaths(name, prefixes=prefixes)
-    suffix = '.py'
-    filenames = []
-    for pattern in paths:
-        if not pattern.endswith(suffix):
-            pattern += suffix
-        filenames.extend(glob.glob(pattern))
+    filenames = globpaths(paths, '.py')
     benchdict = {}
-    for filename in filenames:
-        funcs = scanfuncs(filename, prefixes, cython=False)
+    for filename, funcs in scanfiles(filenames, index=index,
+                                     workers=workers).items():
+        funcs = [funcname for funcname in funcs
+                 if any(funcname.startswith(prefix) for prefix in prefixes)]
         if funcs:
             benchdict[filename] = funcs
     return benchdict
@@ -302,34 +511,23 @@ def findbenchmarks(name, prefixes=default_benchprefixes, paths=None):
 def getarenasetup(name, filename, funcnames, cython=False):
     """ Return dict that maps function name to setup string required by timeit.
 
+    The setup strings load the arena file via ``loadarenafile``, so the file
+    is only imported once per process regardless of how many times the setup
+    strings are run.
+
     This *does not* import any files.
     """
     # Used by: getarenalist
     setupdict = {}
     for funcname in funcnames:
-        path, modname = os.path.split(filename)
-        modname, ext = os.path.splitext(name)
-        func_setup = """
-            sys.path.insert(0, '{path}')
-            %s
-            sys.path.pop(0)
-            globals()['{name}'] = getattr(mod, '{funcname}')
+        text = """
+            import benchtoolz.benchutils as _benchutils
+            _benchmod = _benchutils.loadarenafile({filename!r}, cython={cython!r})
+            globals()[{name!r}] = getattr(_benchmod, {funcname!r})
         """
-        if cython:
-            load_mod = """
-            import pyximport
-            pyximport.install()
-            pyximport.build_module('{modname}', '{filename}')
-            mod = pyximport.load_module('{modname}', '{filename}')
-            """
-        else:
-            load_mod = """
-            mod = imp.load_source('_benchmark_arena_{modname}', '{filename}')
-            """
         # format text, removing leading spaces, then remove empty lines
-        text = func_setup % load_mod
-        text = text.format(path=path, name=name, filename=filename,
-                           funcname=funcname, modname=modname)
+        text = text.format(name=name, filename=filename, funcname=funcname,
+                           cython=cython)
         text = textwrap.dedent(text)
         text = ''.join(filter(str.strip, text.splitlines(True)))
         setupdict[funcname] = text
@@ -339,67 +537,316 @@ def getarenasetup(name, filename, funcnames, cython=False):
 def getbenchsetup(filename):
     """ Return setup string required by timeit for the given benchmark file.
 
+    The setup string loads the benchmark file via ``loadbenchfile``, so the
+    file is only imported once per process regardless of how many times the
+    setup string is run.  Setup strings only create local variables with
+    underscore-prefixed names such as ``_benchutils``, because local
+    variables of the setup shadow global variables used by benchmarks.
+
     This *does not* import any files.
     """
     # Used by: getbenchlist
-    path, name = os.path.split(filename)
-    name, ext = os.path.splitext(name)
     text = """
-        import imp
-        import os.path
-        import sys
-        sys.path.insert(0, '{path}')
-        mod = imp.load_source('_benchmark_file_{name}', '{filename}')
-        sys.path.pop(0)
-        globals().update(mod.__dict__)
+        import benchtoolz.benchutils as _benchutils
+        globals().update(_benchutils.loadbenchfile({filename!r}).__dict__)
     """
     # format text, removing leading spaces, then remove empty lines
-    text = text.format(path=path, filename=filename, name=name)
+    text = text.format(filename=filename)
     text = textwrap.dedent(text)
     text = ''.join(filter(str.strip, text.splitlines(True)))
     return text
 
 
+def _findnodes(nodes, types):
+    """ Return the nodes of ``types`` in ``nodes`` and their children, but not
+    in nested functions, lambdas, or classes.
+    """
+    # Used by: getbenchparts
+    scopes = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+    found = []
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, types):
+            found.append(node)
+        if not isinstance(node, scopes):
+            stack.extend(ast.iter_child_nodes(node))
+    return found
+
+
+def _getstmtsource(source, lines, stmt, indent):
+    """ Return the source of a statement, including decorators, with its
+    original indentation, so the statements of a block dedent together.
+
+    ``indent`` is the column of the block, which is used for statements that
+    follow other code on their line.
+    """
+    # Used by: getbenchparts
+    decorators = getattr(stmt, 'decorator_list', [])
+    start = min([stmt.lineno] + [node.lineno for node in decorators])
+    # Column offsets count bytes, which are the same as characters for
+    # indentation
+    prefix = lines[start - 1][:stmt.col_offset]
+    if prefix.strip():
+        # The statement follows other code on its line, such as the body of
+        # a one-line function or statements separated by ";"
+        return ' ' * indent + ast.get_source_segment(source, stmt)
+    text = lines[start - 1:stmt.end_lineno]
+    last = text[-1].encode('utf-8')[:stmt.end_col_offset]
+    text[-1] = last.decode('utf-8')
+    return ''.join(text)
+
+
+def getbenchparts(filename, benchname):
+    """ Return the body and the returned expression of a benchmark function.
+
+    The function is parsed with ``ast``, so multi-line signatures,
+    decorators, one-line functions, and multi-line return statements are
+    all handled.  The docstring is not part of the body.  The body is a
+    dedented string of the statements before the final return statement
+    (or "pass" if there are none), and the returned expression is a string
+    (in parentheses if it spans lines), or None if the function doesn't
+    return a value.
+
+    The body is timed inline instead of calling the function, so a function
+    that can't be inlined raises ValueError: one that returns before its
+    last statement, one that yields, or one with parameters that the setup
+    can't bind.  The only parameter may be the argument of a parametrized
+    benchmark (see ``getbenchdata``), so ``*args``, ``**kwargs``, and
+    keyword-only parameters are rejected.
+
+    **Warning:** this imports the file.
+    """
+    # Uses: loadbenchfile, _findnodes, _getstmtsource
+    # Used by: getbenchstrings
+    func = getattr(loadbenchfile(filename), benchname)
+    source = textwrap.dedent(''.join(inspect.getsourcelines(func)[0]))
+    node = ast.parse(source).body[0]
+    args = node.args
+    numargs = len(args.args) + len(getattr(args, 'posonlyargs', []))
+    if (args.vararg or args.kwarg or getattr(args, 'kwonlyargs', None) or
+            numargs > 1):
+        raise ValueError('Benchmark function %r in %r may only accept a '
+                         'single argument of input data, because its body '
+                         'is timed inline' % (benchname, filename))
+    body = list(node.body)
+    if (body and isinstance(body[0], ast.Expr) and
+            isinstance(body[0].value, ast.Constant) and
+            isinstance(body[0].value.value, str)):
+        body.pop(0)
+    value = None
+    if body and isinstance(body[-1], ast.Return):
+        value = body.pop().value
+    if _findnodes(body, ast.Return):
+        raise ValueError('Benchmark function %r in %r may only return at the '
+                         'end, because its body is timed inline'
+                         % (benchname, filename))
+    nodes = body if value is None else body + [value]
+    if _findnodes(nodes, (ast.Yield, ast.YieldFrom)):
+        raise ValueError('Benchmark function %r in %r must not be a generator'
+                         % (benchname, filename))
+    lines = source.splitlines(True)
+    stmts = [_getstmtsource(source, lines, stmt, body[0].col_offset)
+             for stmt in body]
+    bodystring = textwrap.dedent('\n'.join(stmts)) if stmts else 'pass'
+    returned = None
+    if value is not None:
+        returned = ast.get_source_segment(source, value)
+        if '\n' in returned:
+            returned = '(%s)' % returned
+    return bodystring + '\n', returned
+
+
 def getbenchstrings(filename, benchnames):
     """ Return dict of benchmark names to benchmark strings required by timeit.
 
     We benchmark using the function body.  We don't call the function directly,
     because this would add the overhead of a function call to the benchmarks.
-    The last line of the function may be a return statement.
+    The last statement of the function may be a return statement, and the
+    returned expression is then evaluated as the last statement of the
+    benchmark string.  See ``getbenchparts``.
 
     **Warning:** this imports the file.
     """
+    # Uses: getbenchparts
     # Used by: getbenchlist
-    # I bet somebody clever can make this function much better!
-    sys.dont_write_bytecode = True
-    path, name = os.path.split(filename)
-    name, ext = os.path.splitext(name)
-    # make sure local imports work for benchmark file
-    sys.path.insert(0, path)
-    mod = imp.load_source('_benchmark_file_' + name, filename)
     benchstrings = {}
     for benchname in benchnames:
-        lines, lineno = inspect.getsourcelines(getattr(mod, benchname))
-        # Remove "return" from final line in function.  This does not
-        # work for multi-line returns!  It also fails when there are
-        # multiple spaces between "return" and the next token.
-        # Also, is this the correct place to strip "return"?  We may
-        # want to compare outputs to verify each variant is the same.
-        lastline = lines[-1].strip()
-        if lastline.startswith('return '):
-            lines[-1] = lines[-1].replace('return ', '', 1)
-        elif lastline.startswith('return('):
-            lines[-1] = lines[-1].replace('return', '', 1)
-        elif lastline == 'return':
-            lines.pop()
-        # Skip the function definition.  This will fail if function
-        # definition takes more than one line.
-        benchstrings[benchname] = textwrap.dedent(''.join(lines[1:]))
-    # undo making local imports work
-    sys.path.pop(0)
+        bodystring, returned = getbenchparts(filename, benchname)
+        if returned is not None:
+            if bodystring == 'pass\n':
+                bodystring = ''
+            bodystring += returned + '\n'
+        benchstrings[benchname] = bodystring
     return benchstrings
 
 
+def getoutputstring(filename, benchname):
+    """ Return the body of a benchmark function that returns its output.
+
+    This is the body of ``getbenchparts`` followed by a return statement of
+    the returned expression, which is used to check the output of each
+    function being compared (see ``outpututils.outputit``).  Returns None
+    if the benchmark function doesn't return a value.
+
+    **Warning:** this imports the file.
+    """
+    # Uses: getbenchparts
+    # Used by: runbenchmarks
+    bodystring, returned = getbenchparts(filename, benchname)
+    if returned is None:
+        return None
+    return '%sreturn %s\n' % (bodystring, returned)
+
+
+def getitersetupname(benchfunc, prefix=default_itersetupprefix):
+    """ Return the name of the per-iteration setup function of a benchmark.
+
+    This is the name of the benchmark function with its prefix replaced by
+    ``prefix``, such as "setup_sort" for "bench_sort" and "time_sort".
+    """
+    # Used by: getitersetupstring
+    return prefix + benchfunc.split('_', 1)[-1]
+
+
+def getitersetupstring(filename, benchfunc):
+    """ Return the body of the per-iteration setup of a benchmark, or None.
+
+    A benchmark function may have a companion setup function (see
+    ``getitersetupname``) that creates fresh inputs for every iteration:
+
+        def setup_sort(data):
+            items = list(data)
+
+        def bench_sort(data):
+            sort(items)
+
+    The variables assigned by the setup function are the inputs of the
+    benchmark, which are created before timing (see ``timerutils.BenchTimer``),
+    so benchmarks of functions that mutate their input, such as sorting in
+    place, don't time a mutated input after the first iteration, and the
+    cost of copying the input isn't timed.  The setup function may accept
+    the same argument as a parametrized benchmark, and it may not return a
+    value.
+
+    **Warning:** this imports the file.
+    """
+    # Uses: loadbenchfile, getitersetupname, getbenchparts
+    # Used by: runbenchmarks
+    setupname = getitersetupname(benchfunc)
+    if not callable(getattr(loadbenchfile(filename), setupname, None)):
+        return None
+    bodystring, returned = getbenchparts(filename, setupname)
+    if returned is not None:
+        raise ValueError('Setup function %r in %r must assign the inputs of '
+                         'the benchmark to variables instead of returning '
+                         'them' % (setupname, filename))
+    return bodystring
+
+
+def isasyncbench(filename, benchname):
+    """ Return True if a benchmark function is a coroutine (``async def``)
+
+    **Warning:** this imports the file.
+    """
+    # Uses: loadbenchfile
+    # Used by: runbenchmarks
+    func = getattr(loadbenchfile(filename), benchname)
+    return inspect.iscoroutinefunction(func)
+
+
+def _getbenchargspec(filename, benchname):
+    """ Return the argspec of a benchmark function, or None if it has no args
+    """
+    # Uses: loadbenchfile
+    # Used by: getbenchdata, getbenchlist
+    func = getattr(loadbenchfile(filename), benchname)
+    try:
+        argspec = inspect.getfullargspec(func)
+    except AttributeError:  # Python 2
+        argspec = inspect.getargspec(func)
+    args = argspec.args
+    if not args:
+        return None
+    if len(args) > 1:
+        raise ValueError('Benchmark function %r in %r must accept at most one '
+                         'argument; got %r' % (benchname, filename, args))
+    return argspec
+
+
+def getbenchdata(filename, benchname):
+    """ Return the input data of a parametrized benchmark function.
+
+    A benchmark function may accept a single argument, in which case it is
+    run once for each item of input data.  There are two ways to define the
+    input data:
+
+        1. Define a positional argument, such as ``def bench(data):``.  The
+           name of the argument identifies the prefix of global variables in
+           the benchmark file to use as data, such as ``data_small = 10``.
+        2. Define a keyword argument, such as ``def bench(data=[0, 10]):``.
+           The default value may be a list or a dict.  The names of the data
+           are the keys of the dict or the items of the list (or their index
+           if the items are not suitable names).
+
+    Returns a tuple of the argument name and a dict that maps names to data,
+    or ``(None, None)`` if the benchmark does not accept an argument.  The
+    data are created only once, because the file is loaded by
+    ``loadbenchfile``.
+
+    **Warning:** this imports the file.
+    """
+    # Uses: loadbenchfile, _getbenchargspec
+    # Used by: getbenchlist, getdatasetup
+    mod = loadbenchfile(filename)
+    argspec = _getbenchargspec(filename, benchname)
+    if argspec is None:
+        return None, None
+    argname = argspec.args[0]
+    if not argspec.defaults:
+        prefix = argname + '_'
+        data = dict((key[len(prefix):], val)
+                    for key, val in mod.__dict__.items()
+                    if key.startswith(prefix) and len(key) > len(prefix))
+        if not data:
+            raise ValueError('No data found for benchmark function %r in %r.  '
+                             'Define global variables such as "%s1 = ..."'
+                             % (benchname, filename, prefix))
+        return argname, data
+    values = argspec.defaults[0]
+    if isinstance(values, dict):
+        return argname, dict((str(key), val) for key, val in values.items())
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    names = [str(val) for val in values]
+    if (len(set(names)) != len(names) or
+            any(len(name) > 20 or '\n' in name for name in names)):
+        names = [str(i) for i in range(len(values))]
+    return argname, dict(zip(names, values))
+
+
+def getdatasetup(filename, benchname, argname, dataname):
+    """ Return setup string that binds input data of a parametrized benchmark.
+
+    The data are retrieved via ``getbenchdata``, so they are bound to the
+    namespace of the benchmark instead of being re-created for each trial.
+
+    This *does not* import any files.
+    """
+    # Used by: getbenchlist
+    text = """
+        import benchtoolz.benchutils as _benchutils
+        _benchdata = _benchutils.getbenchdata({filename!r}, {benchname!r})[1]
+        globals()[{argname!r}] = _benchdata[{dataname!r}]
+    """
+    # format text, removing leading spaces, then remove empty lines
+    text = text.format(argname=argname, benchname=benchname,
+                       dataname=dataname, filename=filename)
+    text = textwrap.dedent(text)
+    text = ''.join(filter(str.strip, text.splitlines(True)))
+    return text
+
+
 def getarenalist(name, arenadict, cython=False):
     """ Get arena function info and flatten into a sorted list of tuples.
 
@@ -426,36 +873,88 @@ def getarenalist(name, arenadict, cython=False):
     return arenalist
 
 
-def getbenchlist(benchdict):
+def getbenchlist(benchdict, sizes=None):
     """ Get benchmark info and flatten into a sorted list of tuples.
 
     The ``benchdict`` argument is a dict that maps filename to list of
     benchmark function names (see ``findbenchmarks`` function).
 
+    Benchmark functions that accept an argument are parametrized (see
+    ``getbenchdata``), and they are expanded into one benchmark per item of
+    input data.  These benchmarks are named like "bench_func[dataname]".
+    If ``sizes`` is given, then the argument of parametrized benchmarks is
+    each integer in ``sizes`` instead of the data defined in the benchmark
+    file, and the name of the data is the size, such as "bench_func[1024]".
+
     The returned list of tuples contain the following:
 
         - benchfile: filename of the benchmark
-        - benchname: name of the current benchmark function
-        - benchsetup: setup code for ``timeit`` for current ``benchfile``
+        - benchname: name of the current benchmark
+        - benchsetup: setup code for ``timeit`` for current benchmark
         - benchmark: string of the current benchmark for ``timeit``
+        - benchfunc: name of the current benchmark function
+        - benchdata: name of the input data of the benchmark (or None)
 
     **Warning:** this imports the benchmark files.
     """
-    # Uses: getbenchsetup, getbenchstrings
+    # Uses: getbenchsetup, getbenchstrings, getbenchdata, getdatasetup,
+    #       _getbenchargspec
     # Used by: runbenchmarks
     benchlist = []
     for benchfile, funcnames in benchdict.items():
         benchsetup = getbenchsetup(benchfile)
         stringdict = getbenchstrings(benchfile, funcnames)
-        for benchname, benchstring in stringdict.items():
-            benchlist.append((benchfile, benchname, benchsetup, benchstring))
-    # Sort benchmarks by filename and benchmark function name
-    benchlist = nsorted(benchlist)
+        for benchfunc, benchstring in stringdict.items():
+            argspec = _getbenchargspec(benchfile, benchfunc)
+            if argspec is None:
+                benchlist.append((benchfile, benchfunc, benchsetup,
+                                  benchstring, benchfunc, None))
+                continue
+            if sizes is None:
+                argname, data = getbenchdata(benchfile, benchfunc)
+            else:
+                argname = argspec.args[0]
+                data = dict((str(size), size) for size in sizes)
+            for dataname in data:
+                benchname = '%s[%s]' % (benchfunc, dataname)
+                if sizes is None:
+                    datasetup = getdatasetup(benchfile, benchfunc, argname,
+                                             dataname)
+                else:
+                    datasetup = 'globals()[%r] = %r\n' % (argname,
+                                                          data[dataname])
+                benchlist.append((benchfile, benchname, benchsetup + datasetup,
+                                  benchstring, benchfunc, dataname))
+    # Sort benchmarks by filename and benchmark name
+    benchlist = sorted(benchlist, key=lambda x: numericstringkey(x[:2]))
     return benchlist
 
 
+def maketimer(statements, setup, itersetup=None, timer=default_timer,
+              loopfactory=None):
+    """ Return a timer for ``statements`` with a fresh global namespace.
+
+    If ``loopfactory`` is None, this is a ``timerutils.BenchTimer``, which
+    runs ``itersetup`` (if given) before every iteration without timing it.
+    Otherwise, ``statements`` are the body of a coroutine (such as of an
+    ``async def`` benchmark function) and may use ``await``, and this is an
+    ``asyncutils.AsyncTimer`` that runs batches of loops in an event loop
+    from ``loopfactory`` (see ``asyncutils.getloopfactory``).
+    """
+    # Used by: bettertimeit, interleavedtimeit, memoryit, _gettrialinfo
+    if loopfactory is None:
+        return BenchTimer(statements, setup, timer=timer, globals={},
+                          itersetup=itersetup)
+    if itersetup is not None:
+        raise ValueError('Async benchmarks can\'t have a per-iteration setup')
+    return AsyncTimer(statements, setup, timer=timer, globals={},
+                      loopfactory=loopfactory)
+
+
 def bettertimeit(statements, setup, mintime=default_mintime,
-                 numrepeat=default_numrepeat, timer=default_timer):
+                 numrepeat=default_numrepeat, timer=default_timer, rtol=None,
+                 maxtime=default_maxtime, confidence=default_confidence,
+                 calibrate=True, loopfactory=None, itersetup=None):
     """ A better way to use ``timeit`` when comparing benchmarks and functions.
 
     Like ``timeit`` when run as main and ``%timeit`` in IPython, this function
@@ -470,11 +969,59 @@ def bettertimeit(statements, setup, mintime=default_mintime,
 
     The arguments ``statements``, ``setup``, ``timer``, and ``numrepeat`` are
     passed directly to ``timeit.Timer`` and ``timeit.Timer.repeat``.
+    ``timer`` may also be the name of a timer, such as "perf_counter_ns" or
+    "process_time_ns" (see ``timerutils.timernames``).
+
+    If ``calibrate`` is True, then the overhead of the timing loop, which is
+    measured by timing an empty statement with the same timer and number of
+    loops, is subtracted from the times (see ``timerutils.getlooptimes``).
+
+    If ``loopfactory`` is given, then ``statements`` may use ``await`` and
+    are run in an event loop (see ``maketimer``).
+
+    If ``itersetup`` is given, then it is run before every iteration to
+    create fresh inputs for ``statements``, and its cost is not included in
+    the times (see ``timerutils.BenchTimer``).
+
+    If ``rtol`` is given, then sampling is adaptive: after the first
+    ``numrepeat`` repeats, more repeats are taken until the half-width of the
+    confidence interval of the median (see ``statutils.medianci``) relative
+    to the median is at most ``rtol``, or until the total time spent on the
+    repeats exceeds ``maxtime`` seconds.  Hence, stable benchmarks finish
+    quickly while noisy benchmarks are sampled more.
+
+    Each call uses a fresh global namespace, so the names created by the
+    setup of one benchmark never leak into another benchmark.
 
     Returns a list of times (in seconds) and the number of loop iterations.
     """
+    # Uses: maketimer, getloops, getlooptimes
     # Used by: runbenchmarks
-    timer = timeit.Timer(statements, setup, timer=timer)
+    benchtimer = maketimer(statements, setup, itersetup=itersetup,
+                           timer=timer, loopfactory=loopfactory)
+    loops, runtime = getloops(benchtimer, mintime)
+    # Should we use the previous run as "burn in", or should we include it?
+    results = benchtimer.repeat(numrepeat - 1, loops)
+    results.append(runtime)
+    if rtol is not None:
+        elapsed = sum(results)
+        while elapsed < maxtime:
+            if _isprecise(results, rtol, confidence):
+                break
+            runtime = benchtimer.timeit(loops)
+            results.append(runtime)
+            elapsed += runtime
+    results = getlooptimes(results, loops, benchtimer, calibrate=calibrate)
+    return results, loops
+
+
+def getloops(timer, mintime=default_mintime):
+    """ Return the number of loops for a ``timeit.Timer`` to run ``mintime``.
+
+    The number of loops is a power of two (see ``bettertimeit``).  Returns
+    the number of loops and the time of the last run with that many loops.
+    """
+    # Used by: bettertimeit, interleavedtimeit
     # Use powers of two so tests are likely to use comparable iteration
     # numbers if they have comparable performance.
     loops = 1
@@ -499,16 +1046,599 @@ def bettertimeit(statements, setup, mintime=default_mintime,
             loops *= 8  # aim short (to x8)
         else:
             loops *= 2
-    # Should we use the previous run as "burn in", or should we include it?
-    results = timer.repeat(numrepeat - 1, loops)
-    results.append(runtime)
-    results = [x / loops for x in results]
-    return results, loops
+    return loops, runtime
+
+
+def _isprecise(results, rtol, confidence=default_confidence):
+    """ Return whether the confidence interval of the median is within rtol
+    """
+    cilow, cihigh = medianci(results, confidence=confidence)
+    return cihigh - cilow <= 2.0 * rtol * median(results)
+
+
+def interleavedtimeit(benchmarks, mintime=default_mintime,
+                      numrepeat=default_numrepeat, timer=default_timer,
+                      rtol=None, maxtime=default_maxtime,
+                      confidence=default_confidence, seed=0,
+                      calibrate=True, loopfactory=None):
+    """ Like ``bettertimeit``, but time several benchmarks in interleaved order.
+
+    ``benchmarks`` is a list of ``(statements, setup)`` tuples, or of
+    ``(statements, setup, itersetup)`` tuples (see ``bettertimeit``), such
+    as one benchmark run with each function being compared.  After the
+    number of loops of each benchmark is determined, the benchmarks are
+    repeated in rounds, and each round runs every benchmark once in a random
+    order (such as BCA, ACB, CAB, ... instead of AAA, BBB, CCC).  Hence, slow
+    drifts of the machine, such as from heating up or from cpu frequency
+    scaling, affect all benchmarks equally instead of favoring the
+    benchmarks that run first.  Garbage is collected before every repeat,
+    so garbage created by one benchmark is not collected while timing
+    another.
+
+    ``numrepeat`` rounds are always run, and, if ``rtol`` is given, rounds
+    continue with the benchmarks that are not yet precise enough (see
+    ``bettertimeit``).  ``seed`` seeds the random order of each round.
+    ``timer``, ``calibrate``, and ``loopfactory`` are the same as for
+    ``bettertimeit``.
+
+    Returns a list of ``(times, loops)`` tuples, one for each benchmark.
+    """
+    # Uses: maketimer, getloops, getlooptimes
+    # Used by: runbenchmarks
+    import gc
+    import random
+    timers = [maketimer(*benchmark, timer=timer, loopfactory=loopfactory)
+              for benchmark in benchmarks]
+    # The runs used to determine the loops are not interleaved, so they are
+    # only used as "burn in".
+    loops = [getloops(t, mintime)[0] for t in timers]
+    results = [[] for t in timers]
+    rng = random.Random(seed)
+
+    def runround(indices):
+        rng.shuffle(indices)
+        for i in indices:
+            gc.collect()
+            results[i].append(timers[i].timeit(loops[i]))
+
+    for i in range(numrepeat):
+        runround(list(range(len(timers))))
+    if rtol is not None:
+        while True:
+            active = [i for i, times in enumerate(results)
+                      if sum(times) < maxtime and
+                      not _isprecise(times, rtol, confidence)]
+            if not active:
+                break
+            runround(active)
+    return [(getlooptimes(times, n, benchtimer, calibrate=calibrate), n)
+            for times, n, benchtimer in zip(results, loops, timers)]
+
+
+def racetimeit(benchmarks, mintime=default_mintime,
+               numrepeat=default_numrepeat, timer=default_timer, rtol=None,
+               maxtime=default_maxtime, confidence=default_confidence,
+               margin=default_racingmargin, seed=0, calibrate=True,
+               loopfactory=None, collect=False):
+    """ Time several benchmarks as a race and stop timing the clear losers.
+
+    ``benchmarks`` is a list of ``(statements, setup)`` or ``(statements,
+    setup, itersetup)`` tuples (see ``interleavedtimeit``), such as one
+    benchmark run with each function being compared.  All benchmarks are
+    first timed coarsely with ``default_racingrepeat`` repeats (in rounds of
+    random order like ``interleavedtimeit``).  Then, a benchmark is
+    eliminated when the lower bound of the confidence interval of its median
+    time is greater than the upper bound of the leader (the benchmark with
+    the smallest median) by more than ``margin``, such as 0.25 for 25%.
+    The remaining budget of ``numrepeat`` repeats per benchmark is spent
+    refining the benchmarks that are still contending, which are checked
+    for elimination after every round.  If ``rtol`` is given, rounds then
+    continue with contenders that aren't yet precise enough (see
+    ``bettertimeit``).  If ``collect`` is True, garbage is collected before
+    every repeat.
+
+    ``timer``, ``calibrate``, and ``loopfactory`` are the same as for
+    ``bettertimeit``.
+
+    Returns a list of ``(times, loops, eliminated)`` tuples, one for each
+    benchmark, where ``eliminated`` is True if the benchmark was dropped
+    from the race (so its times are coarse).
+    """
+    # Uses: maketimer, getloops, getlooptimes, medianci
+    # Used by: runbenchmarks
+    import gc
+    import random
+    timers = [maketimer(*benchmark, timer=timer, loopfactory=loopfactory)
+              for benchmark in benchmarks]
+    loops = [getloops(t, mintime)[0] for t in timers]
+    results = [[] for t in timers]
+    # Compare times per loop, since benchmarks may use different loops
+    looptimes = [[] for t in timers]
+    eliminated = [False] * len(timers)
+    rng = random.Random(seed)
+
+    def runround(indices):
+        rng.shuffle(indices)
+        for i in indices:
+            if collect:
+                gc.collect()
+            runtime = timers[i].timeit(loops[i])
+            results[i].append(runtime)
+            looptimes[i].append(runtime / loops[i])
+
+    def contenders():
+        return [i for i, out in enumerate(eliminated) if not out]
+
+    def eliminate():
+        indices = contenders()
+        bounds = dict((i, medianci(looptimes[i], confidence=confidence))
+                      for i in indices)
+        leader = min(indices, key=lambda i: median(looptimes[i]))
+        limit = bounds[leader][1] * (1.0 + margin)
+        for i in indices:
+            if bounds[i][0] > limit:
+                eliminated[i] = True
+
+    for i in range(min(numrepeat, default_racingrepeat)):
+        runround(list(range(len(timers))))
+    eliminate()
+    budget = numrepeat * len(timers)
+    while sum(len(times) for times in results) < budget:
+        runround(contenders())
+        eliminate()
+    if rtol is not None:
+        while True:
+            active = [i for i in contenders()
+                      if sum(results[i]) < maxtime and
+                      not _isprecise(results[i], rtol, confidence)]
+            if not active:
+                break
+            runround(active)
+            eliminate()
+    return [(getlooptimes(times, n, benchtimer, calibrate=calibrate), n, out)
+            for times, n, benchtimer, out in zip(results, loops, timers,
+                                                 eliminated)]
+
+
+def budgettimeit(benchmarks, budget, mintime=default_mintime,
+                 numrepeat=default_numrepeat, timer=default_timer, rtol=None,
+                 maxtime=default_maxtime, confidence=default_confidence,
+                 seed=0, calibrate=True, loopfactories=None, collect=False):
+    """ Time several benchmarks within a total wall-clock ``budget`` in seconds.
+
+    ``benchmarks`` is a list of ``(statements, setup)`` or ``(statements,
+    setup, itersetup)`` tuples (see ``interleavedtimeit``), such as every
+    trial of a benchmark run, and ``loopfactories`` is an optional list of
+    the event loop factory of each benchmark (None if not async; see
+    ``maketimer``).  Timing is done in two phases:
+
+    1. Calibration: each benchmark in turn determines its number of loops
+       (see ``getloops``) and is run twice, which estimates the cost of one
+       repeat and the spread of its times.  The time left is shared equally
+       by the benchmarks that are left to calibrate, and if a share is too
+       small to calibrate and run ``numrepeat`` repeats with ``mintime``,
+       then ``mintime`` is lowered for that benchmark.
+    2. Allocation: the remaining repeats are allocated so that the total
+       variance of the medians is as small as possible for the time left
+       (Neyman allocation): the number of repeats of each benchmark is
+       proportional to the relative standard deviation of its times divided
+       by the square root of its cost.  No benchmark gets more than
+       ``numrepeat`` repeats, or, if ``rtol`` is given, more than needed to
+       be precise or than ``maxtime`` seconds (see ``bettertimeit``).  The
+       repeats are run in rounds of random order like
+       ``interleavedtimeit``, and a repeat is skipped if it would not finish
+       before the deadline.
+
+    ``default_budgetreserve`` of the budget is kept for the work after
+    timing, such as measuring the overhead of the timing loop and memory.
+    Hence, all benchmarks finish within the budget unless a single run of a
+    benchmark takes longer than its share.  If ``collect`` is True, then
+    garbage is collected before every repeat.
+
+    Returns a list of ``(times, loops, reduced)`` tuples, one for each
+    benchmark, where ``reduced`` is True if the benchmark got less precision
+    than without a budget (i.e., its repeats ran for less than ``mintime``,
+    it got fewer than ``numrepeat`` repeats, or, with ``rtol``, it isn't
+    precise enough).
+    """
+    # Uses: maketimer, getloops, getlooptimes, stdev
+    # Used by: _runbudget
+    import gc
+    import random
+    if loopfactories is None:
+        loopfactories = [None] * len(benchmarks)
+    start = time.perf_counter()
+    usable = budget * (1.0 - default_budgetreserve)
+    deadline = start + usable
+    timers = []
+    loops = []
+    costs = []
+    results = []
+    reduced = []
+    for i, (benchmark, loopfactory) in enumerate(zip(benchmarks,
+                                                     loopfactories)):
+        share = max(deadline - time.perf_counter(), 0.0)
+        share /= len(benchmarks) - i
+        # ``getloops`` takes about twice its final run, and every run takes
+        # between ``mintime`` and twice ``mintime``
+        trialmintime = min(mintime, share / (3.0 + 1.5 * numrepeat))
+        benchtimer = maketimer(*benchmark, timer=timer,
+                               loopfactory=loopfactory)
+        n, runtime = getloops(benchtimer, trialmintime)
+        times = [runtime]
+        # The cost of a repeat is the wall time, which includes the overhead
+        # of the timer and of the event loop
+        cost = time.perf_counter()
+        if numrepeat > 1 and cost + runtime < deadline:
+            times.append(benchtimer.timeit(n))
+            cost = time.perf_counter() - cost
+        else:
+            cost = runtime
+        timers.append(benchtimer)
+        loops.append(n)
+        costs.append(max(cost, 1e-9))
+        results.append(times)
+        # A benchmark isn't reduced if its runs take ``mintime`` anyway
+        reduced.append(runtime < mintime)
+
+    def getwanted(i):
+        if rtol is None:
+            return max(numrepeat - len(results[i]), 0)
+        if sum(results[i]) >= maxtime or (
+                len(results[i]) >= numrepeat and
+                _isprecise(results[i], rtol, confidence)):
+            return 0
+        # More repeats may be needed than ``numrepeat``
+        wanted = int((maxtime - sum(results[i])) / costs[i]) + 1
+        return max(wanted, numrepeat - len(results[i]))
+
+    # Relative spread of the times, which can be zero with only two times
+    spreads = []
+    for times in results:
+        if len(times) > 1 and median(times) > 0:
+            spreads.append(max(stdev(times) / median(times), 1e-3))
+        else:
+            spreads.append(1e-3)
+    # Give every benchmark its share of the time left, and give the time
+    # that benchmarks don't need to the others
+    wanted = [getwanted(i) for i in range(len(timers))]
+    allocated = [0] * len(timers)
+    remaining = deadline - time.perf_counter()
+    active = [i for i, n in enumerate(wanted) if n > 0]
+    while active and remaining > 0:
+        total = sum(spreads[i] * math.sqrt(costs[i]) for i in active)
+        shares = dict((i, remaining * spreads[i] / math.sqrt(costs[i]) / total)
+                      for i in active)
+        capped = [i for i in active if shares[i] >= wanted[i]]
+        if not capped:
+            for i in active:
+                allocated[i] = int(shares[i])
+            break
+        for i in capped:
+            allocated[i] = wanted[i]
+            remaining -= wanted[i] * costs[i]
+            active.remove(i)
+
+    rng = random.Random(seed)
+    while True:
+        indices = [i for i, n in enumerate(allocated) if n > 0]
+        if not indices:
+            break
+        rng.shuffle(indices)
+        for i in indices:
+            if collect:
+                gc.collect()
+            if time.perf_counter() + costs[i] > deadline:
+                allocated[i] = 0
+                continue
+            results[i].append(timers[i].timeit(loops[i]))
+            allocated[i] -= 1
+            if rtol is not None and getwanted(i) == 0:
+                allocated[i] = 0
+    for i, times in enumerate(results):
+        if len(times) < numrepeat or rtol is not None and getwanted(i) > 0:
+            reduced[i] = True
+    return [(getlooptimes(times, n, benchtimer, calibrate=calibrate), n, out)
+            for times, n, benchtimer, out in zip(results, loops, timers,
+                                                 reduced)]
+
+
+def memoryit(statements, setup, loopfactory=None, itersetup=None):
+    """ Measure the memory allocated by running ``statements`` once.
+
+    ``setup`` is run first, then ``statements`` is run once to warm up (such
+    as to fill caches and create lazily initialized objects), and then
+    ``statements`` is run once more while tracing memory allocations with
+    ``tracemalloc``.  This is separate from (and is never done during) the
+    timing of the benchmarks.  If ``loopfactory`` is given, ``statements``
+    are run in an event loop (see ``maketimer``).  If ``itersetup`` is
+    given, it creates fresh inputs before each run, which are not traced.
+
+    Returns a dict with the following items:
+
+        - memblocks: number of memory blocks retained after the run
+        - netmemory: number of bytes retained after the run
+        - peakmemory: peak number of bytes allocated during the run
+    """
+    # Uses: maketimer, compilesetup
+    # Used by: runbenchmarks
+    import gc
+    import tracemalloc
+    names = []
+    if loopfactory is None:
+        namespace = {}
+        exec(compile(setup, '<setup>', 'exec'), namespace)
+        if itersetup is not None:
+            names = compilesetup(itersetup, namespace)
+        code = compile(statements, '<benchmark>', 'exec')
+
+        def run():
+            exec(code, namespace)
+    else:
+        asynctimer = maketimer(statements, setup, loopfactory=loopfactory)
+
+        def run():
+            asynctimer.timeit(1)
+
+    def prepare():
+        if names:
+            namespace.update(zip(names, namespace['_benchsetup']()))
+
+    prepare()
+    run()
+    gc.collect()
+    prepare()
+    wastracing = tracemalloc.is_tracing()
+    if not wastracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        start = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+            run()
+            current, peak = tracemalloc.get_traced_memory()
+        else:
+            # Without ``reset_peak``, the peak may include earlier allocations
+            run()
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, current)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not wastracing:
+            tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(ignore).compare_to(
+        before.filter_traces(ignore), 'filename')
+    return dict(
+        memblocks=sum(stat.count_diff for stat in stats),
+        netmemory=current - start,
+        peakmemory=max(0, peak - start),
+    )
+
+
+def getworkercpus():
+    """ Return a sorted list of the cpus available to this process.
+
+    Returns None if cpu affinity is not supported on this platform.
+    """
+    # Used by: runbenchmarks
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return None
+
+
+def pincpus(cpus=True):
+    """ Pin the current process to ``cpus`` and return the previous cpus.
+
+    ``cpus`` is a list of cpu ids, or True to choose a single cpu.  The
+    last available cpu is chosen, because the first cpu often handles more
+    interrupts from the operating system.  Returns None (and does nothing)
+    if cpu affinity is not supported on this platform.
+    """
+    # Uses: getworkercpus
+    # Used by: runbenchmarks
+    available = getworkercpus()
+    if available is None:
+        return None
+    if cpus is True:
+        cpus = available[-1:]
+    os.sched_setaffinity(0, cpus)
+    return available
+
+
+def _initworker(cpus, counter):
+    """ Initialize a worker process, pinning it to its own cpu if possible"""
+    # Used by: runbenchmarks
+    sys.dont_write_bytecode = True
+    if not cpus:
+        return
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    os.sched_setaffinity(0, [cpus[index % len(cpus)]])
+
+
+def _runtrial(args):
+    """ Run a trial and return a dict of results to add to the trial dict.
+
+    ``args`` is a tuple of the trial dict and a dict of options, so it can be
+    sent to worker processes.
+    """
+    # Uses: bettertimeit, _gettrialinfo
+    # Used by: runbenchmarks
+    trial, options = args
+    times, loops = bettertimeit(trial['benchstring'], trial['setupstring'],
+                                mintime=options['mintime'],
+                                numrepeat=options['numrepeat'],
+                                timer=options['timer'], rtol=options['rtol'],
+                                maxtime=options['maxtime'],
+                                calibrate=options['calibrate'],
+                                loopfactory=_getloopfactory(trial, options),
+                                itersetup=trial['itersetupstring'])
+    return _gettrialinfo(trial, options, times, loops)
+
+
+def _runtrials(args):
+    """ Run a group of trials one after another and return their info.
+
+    ``args`` is a tuple of a list of trial dicts and a dict of options.
+    Returns a list of dicts of results, one for each trial.
+    """
+    # Uses: _runtrial
+    # Used by: runbenchmarks
+    trials, options = args
+    return [_runtrial((trial, options)) for trial in trials]
+
+
+def _rungroup(args):
+    """ Run a group of trials with interleaved repeats and return their info.
+
+    ``args`` is a tuple of a list of trial dicts and a dict of options.  The
+    trials are raced (see ``racetimeit``) if the "racing" option is given.
+    Returns a list of dicts of results, one for each trial.
+    """
+    # Uses: interleavedtimeit, racetimeit, _gettrialinfo
+    # Used by: runbenchmarks
+    trials, options = args
+    benchmarks = [(trial['benchstring'], trial['setupstring'],
+                   trial['itersetupstring']) for trial in trials]
+    loopfactory = _getloopfactory(trials[0], options)
+    if options['racing']:
+        timings = racetimeit(benchmarks, mintime=options['mintime'],
+                             numrepeat=options['numrepeat'],
+                             timer=options['timer'], rtol=options['rtol'],
+                             maxtime=options['maxtime'],
+                             margin=options['racing'],
+                             calibrate=options['calibrate'],
+                             loopfactory=loopfactory,
+                             collect=options['lownoise'])
+    else:
+        timings = [(times, loops, False) for times, loops in
+                   interleavedtimeit(benchmarks, mintime=options['mintime'],
+                                     numrepeat=options['numrepeat'],
+                                     timer=options['timer'],
+                                     rtol=options['rtol'],
+                                     maxtime=options['maxtime'],
+                                     calibrate=options['calibrate'],
+                                     loopfactory=loopfactory)]
+    return [_gettrialinfo(trial, options, times, loops, eliminated=out)
+            for trial, (times, loops, out) in zip(trials, timings)]
+
+
+def _runbudget(args):
+    """ Run all trials within the "budget" option and return their info.
+
+    ``args`` is a tuple of a list of trial dicts and a dict of options.
+    Returns a list of dicts of results, one for each trial.
+    """
+    # Uses: budgettimeit, _gettrialinfo
+    # Used by: runbenchmarks
+    trials, options = args
+    if not trials:
+        return []
+    benchmarks = [(trial['benchstring'], trial['setupstring'],
+                   trial['itersetupstring']) for trial in trials]
+    loopfactories = [_getloopfactory(trial, options) for trial in trials]
+    timings = budgettimeit(benchmarks, options['budget'],
+                           mintime=options['mintime'],
+                           numrepeat=options['numrepeat'],
+                           timer=options['timer'], rtol=options['rtol'],
+                           maxtime=options['maxtime'],
+                           calibrate=options['calibrate'],
+                           loopfactories=loopfactories,
+                           collect=options['lownoise'])
+    infos = []
+    for trial, (times, loops, reduced) in zip(trials, timings):
+        info = _gettrialinfo(trial, options, times, loops)
+        info['reduced'] = reduced
+        infos.append(info)
+    return infos
+
+
+def _getloopfactory(trial, options):
+    """ Return the event loop factory of an async trial, or None"""
+    if not trial['benchasync']:
+        return None
+    return options['loopfactory'] or default_loopfactory
+
+
+def _gettrialinfo(trial, options, times, loops, eliminated=False):
+    """ Return dict of results of a timed trial to add to the trial dict.
+
+    This adds statistics of the times and the output of the trial, and it
+    measures memory, profiles the trial, measures its scaling with
+    concurrency, and samples its latency if requested in ``options``.
+    Trials that were ``eliminated`` from a race are not profiled, and their
+    scaling and latency are not measured.
+    """
+    # Uses: maketimer, outputit, memoryit, profiletrial, measurescaling,
+    #       getlatency
+    # Used by: _runtrial, _rungroup, _runbudget
+    statements = trial['benchstring']
+    setup = trial['setupstring']
+    itersetup = trial['itersetupstring']
+    loopfactory = _getloopfactory(trial, options)
+    if options['calibrate']:
+        # The setup isn't run, but its inputs are passed to the empty loop
+        emptytimer = maketimer('pass', 'pass', itersetup=itersetup,
+                               timer=options['timer'],
+                               loopfactory=loopfactory)
+        overhead = emptytimer.getoverhead(loops) / loops
+    else:
+        overhead = 0.0
+    info = describe(times)
+    info.update(
+        eliminated=eliminated,
+        loops=loops,
+        machine=getfingerprint(),
+        mintime=min(times),
+        overhead=overhead,
+        timername=gettimer(options['timer'])[0],
+        times=times,
+    )
+    if options['checkoutput'] and trial['outputstring'] is not None:
+        info['benchoutput'] = outputit(trial['outputstring'], setup,
+                                       loopfactory=loopfactory,
+                                       itersetup=itersetup)
+    if options['memory']:
+        info.update(memoryit(statements, setup, loopfactory=loopfactory,
+                             itersetup=itersetup))
+    # The profilers can't run coroutines
+    if options['profile'] and loopfactory is None and not eliminated:
+        profiled = dict(trial, loops=loops)
+        info.update(profiletrial(profiled, method=options['profile'],
+                                 profiledir=options['profiledir'],
+                                 profiletime=options['profiletime']))
+    # Async benchmarks use one event loop per process, so they can't be
+    # run in several threads at once.  Threads would share the inputs of a
+    # per-iteration setup, so those benchmarks aren't run concurrently.
+    if (options['concurrency'] and loopfactory is None and
+            itersetup is None and not eliminated):
+        modes = getconcurrencymodes(options['concurrencymode'])
+        info['scaling'] = measurescaling(statements, setup, loops,
+                                         options['concurrency'], modes=modes,
+                                         numrepeat=options['numrepeat'],
+                                         timer=options['timer'])
+    if options['latency'] and loopfactory is None and not eliminated:
+        info['latency'], info['latencysamples'] = getlatency(
+            statements, setup, info['median'], numsamples=options['latency'],
+            timer=options['timer'], calibrate=options['calibrate'],
+            itersetup=itersetup)
+    return info
 
 
 def runbenchmarks(name, arenadict, benchdict, verbose=True, cython=False,
                   mintime=default_mintime, numrepeat=default_numrepeat,
-                  timer=default_timer, trialfilter=None, trialcallback=None):
+                  timer=default_timer, trialfilter=None, trialcallback=None,
+                  workers=None, rtol=None, maxtime=default_maxtime,
+                  memory=False, profile=None, profiledir=default_profiledir,
+                  profiletime=default_profiletime, sizes=None, cache=None,
+                  coordinator=None, lownoise=False, calibrate=True,
+                  loopfactory=None, concurrency=None,
+                  concurrencymode='threads', racing=None, budget=None,
+                  latency=None, checkoutput=True):
     """ Run all benchmarks in ``benchdict`` with functions from ``arenadict``.
 
     ``arenadict`` and ``benchdict`` should be dicts of filenames to lists of
@@ -518,9 +1648,14 @@ def runbenchmarks(name, arenadict, benchdict, verbose=True, cython=False,
 
         - verbose: if True, print benchmark results to stdout in real-time.
         - cython: run the tests on Python (if False) or Cython files (if True).
+          Cython files are compiled concurrently before running benchmarks
+          and are only recompiled when they change (see ``cythonutils``).
         - mintime: minimum amount of time for each benchmark to run.
         - numrepeat: number of times to repeat each benchmark.
-        - timer: the timer to use during the benchmarks.
+        - timer: the timer to use during the benchmarks.  This may be a timer
+          function or the name of one, such as "perf_counter_ns" for wall
+          time or "process_time_ns" or "thread_time_ns" for cpu time (see
+          ``timerutils.timernames``).
         - trialfilter: a callback function that allows the user to inspect the
           benchmark that is about to be run.  If it returns False, then the
           benchmark is skipped.  The callback function should accept a single
@@ -529,6 +1664,108 @@ def runbenchmarks(name, arenadict, benchdict, verbose=True, cython=False,
           is given the same dict as ``trialfilter``.  If it returns False,
           then *all* benchmarking is stopped.  This can be used, for example,
           to print or save benchmark results in real-time.
+        - workers: number of worker processes used to run the benchmarks.  If
+          None (the default), the benchmarks are run serially in the current
+          process.  Each worker is pinned to its own cpu when the platform
+          supports it, so ``workers`` should not exceed the number of cpus.
+          ``timer`` must be picklable when using workers.
+        - rtol: if given, adaptively repeat each benchmark until the relative
+          confidence interval of the median is at most ``rtol``.  ``numrepeat``
+          is then the minimum number of repeats.  See ``bettertimeit``.
+        - maxtime: with ``rtol``, the maximum time in seconds to spend
+          repeating each benchmark.
+        - memory: if True, measure the memory allocated by each benchmark
+          with ``tracemalloc`` after it is timed.  See ``memoryit``.
+        - profile: if given, profile each benchmark after it is timed.  Use
+          "cprofile" to save ``cProfile`` stats, "sample" to save collapsed
+          stacks (for flamegraphs) from a sampling profiler, or True for both.
+          See ``profileutils.profiletrial``.
+        - profiledir: directory where profiles are saved.
+        - profiletime: time in seconds to spend profiling each benchmark.
+        - sizes: list of integer sizes, or True for the default sizes given by
+          ``scaleutils.geometricsizes``.  If given, benchmark functions that
+          accept an argument are run with each size as the argument (see
+          ``getbenchlist``).  Use ``scaleutils.estimatecomplexity`` or the
+          complexity tables of ``BenchPrinter`` to analyze the results.
+        - cache: a ``ResultCache``, the filename of one, or True to use the
+          default file.  If given, trials whose code, data, interpreter,
+          and options haven't changed since they were last run are not run
+          again; their results are taken from the cache instead.  See
+          ``cacheutils.gettrialkey`` for what determines whether a trial
+          has changed.
+        - coordinator: a ``clusterutils.BenchCoordinator``.  If given, the
+          benchmarks are run by the workers of the coordinator, which may be
+          on other hosts, instead of in this process or in ``workers``.
+          All functions of a benchmark are run by the same worker, so they
+          are compared on the same machine.
+        - lownoise: if True (or a list of cpu ids), reduce the noise of the
+          measurements: the process is pinned to a single cpu (or to the
+          given cpus), garbage is collected before every repeat, and the
+          repeats of the functions of each benchmark are interleaved in
+          random order so that drift of the machine doesn't favor the
+          functions that run first (see ``interleavedtimeit``).  With
+          ``workers``, each worker is pinned to one of the given cpus.
+        - calibrate: if True (the default), subtract the overhead of the
+          timing loop from the times.  See ``bettertimeit``.
+        - loopfactory: function that creates the event loop used to run
+          ``async def`` benchmark functions, or a string such as
+          "uvloop:new_event_loop" (see ``asyncutils.getloopfactory``).  The
+          default is ``asyncio.new_event_loop``.  One event loop is reused
+          for all benchmarks in a process, and batches of loops are run in a
+          single coroutine, so benchmarks may ``await`` arena functions that
+          are coroutines.  The times are the latencies of one run of the
+          benchmark, and the overhead of scheduling a batch in the event loop
+          is subtracted if ``calibrate``.  Async benchmarks aren't profiled.
+        - concurrency: if given, also run each benchmark in 1, 2, 4, ... up
+          to ``concurrency`` threads at once (or in each number of threads
+          of a list), and measure the total throughput and the latency of
+          each thread.  This shows contention for the GIL and for locks
+          (and the gains of free-threaded builds of Python).  See
+          ``concurrencyutils.measurescaling`` and the scaling tables of
+          ``BenchPrinter``.  Async benchmarks and benchmarks with a
+          per-iteration setup (see ``getitersetupstring``) are not run
+          concurrently.
+        - concurrencymode: "threads" (the default), "processes", or "both".
+          Processes can't be started by ``workers``, which are also pinned
+          to a single cpu, so don't use ``workers`` with ``concurrency``.
+        - racing: if given, race the functions of each benchmark and stop
+          timing the functions that are clearly slower than the fastest.
+          After a few coarse repeats of every function, a function is
+          eliminated when the lower bound of the confidence interval of its
+          time is worse than the upper bound of the fastest function by more
+          than ``racing`` (such as 0.25 for 25%, or True for
+          ``default_racingmargin``).  The remaining repeats are spent on the
+          functions that are still contending.  See ``racetimeit``.
+          Eliminated functions are marked in the tables.
+        - budget: if given, the total time in seconds to spend timing all
+          trials, such as 600 to finish in ten minutes.  Each trial is first
+          calibrated to estimate its cost and noise, and then the remaining
+          repeats are allocated to the noisiest trials relative to their
+          cost, up to ``numrepeat`` repeats (or ``rtol`` and ``maxtime``).
+          Trials that got less precision than without a budget are marked
+          by the "reduced" item.  All trials are timed together in one
+          process (or one worker), so the budget includes setting up every
+          trial.  See ``budgettimeit``.  ``budget`` can't be used with
+          ``racing``, ``profile``, ``concurrency``, or ``latency``, which
+          take time that isn't budgeted.
+        - latency: if given, also time individual calls of each benchmark
+          after it is timed, and report the percentiles of their times
+          (p50, p90, p99, and max).  ``latency`` is the number of calls to
+          sample, or True for ``latencyutils.default_latencysamples``.
+          Benchmarks faster than a microsecond are sampled in small batches
+          of calls, and sampling stops after a second.  Garbage collection
+          is left enabled, so its pauses are included in the tail.  See
+          ``latencyutils.getlatency`` and the latency tables of
+          ``BenchPrinter``.  Async benchmarks are not sampled.
+        - checkoutput: if True (the default), run each benchmark once more
+          with each function, separately from timing, to check that the
+          functions return the same output.  The reference output is from
+          the function of the same name defined in (or imported into) the
+          benchmark file, if any, else from the first function.  Functions
+          with different output are marked by the "outputmatch" item, and
+          ``BenchPrinter`` doesn't rank them.  Outputs are compared by their
+          canonical repr, or by its hash if it is long (see
+          ``outpututils.getoutputdigest``).
 
     The trial dict passed to trialfilter and trialcallback has these items:
 
@@ -537,27 +1774,98 @@ def runbenchmarks(name, arenadict, benchdict, verbose=True, cython=False,
         - arenaname: name of the function being benchmarked
         - arenaprefix: string prefix of arenaname
         - arenasuffix: string suffix of arenaname
+        - benchasync: True if the benchmark function is ``async def``
+        - benchdata: name of the input data of a parametrized benchmark
         - benchfile: filename that contains the current benchmark function
+        - benchfunc: name of the current benchmark function
         - benchindex: integer index like a row id of current benchmark
-        - benchname: name of the current benchmark function
+        - benchname: name of the current benchmark, such as "bench_func" or
+          "bench_func[dataname]" for parametrized benchmarks
+        - benchoutput: canonical repr (or hash) of the value returned by the
+          benchmark (if ``checkoutput`` and the benchmark returns a value
+          that can be compared, see ``outpututils.canonicalrepr``)
+        - benchsize: the size passed to the benchmark (if ``sizes``)
         - benchstring: string used by timeit to perform the benchmark
+        - cached: True if the results were taken from ``cache``
+        - cihigh: upper bound of the confidence interval of the median time
+        - cilow: lower bound of the confidence interval of the median time
+        - eliminated: True if the function was eliminated from a race (see
+          ``racing``), so its times are coarse
+        - itersetupstring: string run before every iteration of the
+          benchmark to create its inputs without timing it, or None if the
+          benchmark has no setup function (see ``getitersetupstring``)
+        - latency: dict of the percentiles of the time of one call, with
+          keys "p50", "p90", "p99", "max", and "batch", the number of calls
+          per sample (if ``latency``)
+        - latencysamples: ``array.array`` of the sampled times in seconds
+          of one call (if ``latency``)
         - loops: number of loops used during the benchmark
+        - machine: fingerprint of the machine that ran the benchmark (see
+          ``historyutils.getfingerprint``)
+        - median: the median benchmark result
+        - memblocks: number of memory blocks retained (if ``memory``)
         - mintime: the minimum benchmark result; i.e., min(times)
+        - netmemory: number of bytes retained by one run (if ``memory``)
+        - outputmatch: True if ``benchoutput`` is the same as the output of
+          the reference, else False (None if not checked)
+        - outputstring: string used to compute ``benchoutput``, or None if
+          the benchmark doesn't return a value
+        - overhead: time in seconds of the timing loop that was subtracted
+          from each time (0.0 if not ``calibrate``)
+        - peakmemory: peak bytes allocated by one run (if ``memory``)
+        - profilestacks: filename of collapsed stacks (if ``profile``)
+        - profilestats: filename of ``cProfile`` stats (if ``profile``)
+        - reduced: True if the trial got less precision because of
+          ``budget``, such as fewer than ``numrepeat`` repeats or repeats
+          shorter than ``mintime``
+        - relci: half-width of the confidence interval relative to the median
+        - scaling: list of dicts of throughput, latency, speedup, and
+          efficiency for each number of threads or processes (if
+          ``concurrency``; see ``concurrencyutils.measurescaling``)
         - setupstring: string used by timeit to setup the benchmark
+        - stdev: standard deviation of the benchmark results
+        - timername: name of the timer, such as "perf_counter_ns"
         - times: list of times in seconds of the benchmark results
 
-    Note that when the trial dict is passed to ``trialfilter``, loops,
-    mintime, and times will all be None.
+    Note that when the trial dict is passed to ``trialfilter``, benchoutput,
+    cached, cihigh, cilow, eliminated, loops, machine, median, mintime,
+    outputmatch, overhead, relci, stdev, timername, and times will all be
+    None, and the memory, profile, budget, scaling, and latency items will
+    be None if not used.  All trials are passed to ``trialfilter`` before
+    any benchmark is run.  Trials are always passed to ``trialcallback`` in
+    order, even when using workers.
 
     Returns a list of trial dictionaries (described above).
     """
-    # Uses: getarenalist, getbenchlist, bettertimeit
+    # Uses: getarenalist, getbenchlist, getworkercpus, _runtrial
     # Used by: BenchRunner, quickstart
     sys.dont_write_bytecode = True
+    if concurrency is not None:
+        concurrency = getconcurrencylevels(concurrency)
+        if workers and 'processes' in getconcurrencymodes(concurrencymode):
+            raise ValueError('"workers" can\'t be used with '
+                             'concurrencymode=%r' % (concurrencymode,))
+    if racing is True:
+        racing = default_racingmargin
+    if budget is not None and (racing or profile or concurrency or latency):
+        raise ValueError('"budget" can\'t be used with "racing", "profile", '
+                         '"concurrency", or "latency"')
+    if latency is True:
+        latency = default_latencysamples
     if verbose is True and trialcallback is None:
         trialcallback = ProgressPrinter(arenadict=arenadict, benchdict=benchdict)
+    if sizes is True:
+        sizes = geometricsizes()
+    if sizes is None:
+        sizemap = {}
+    else:
+        sizemap = dict((str(size), size) for size in sizes)
+    if cython:
+        # Compile Cython files concurrently up front.  Worker processes and
+        # setup strings then load the compiled modules from the build cache.
+        buildall(list(arenadict), workers=workers)
     arenalist = getarenalist(name, arenadict, cython=cython)
-    benchlist = getbenchlist(benchdict)
+    benchlist = getbenchlist(benchdict, sizes=sizes)
 
     # create nested dicts of indices {filename: {funcname: index}}
     arenaindices = {}
@@ -565,12 +1873,30 @@ def runbenchmarks(name, arenadict, benchdict, verbose=True, cython=False,
         d = dict((item, i) for i, item in enumerate(nsorted(funcnames)))
         arenaindices[filename] = d
     benchindices = {}
-    for filename, funcnames in benchdict.items():
-        d = dict((item, i) for i, item in enumerate(nsorted(funcnames)))
-        benchindices[filename] = d
-
-    results = []
-    for benchfile, benchname, benchsetup, benchstring in benchlist:
+    for benchfile, benchname, _, _, _, _ in benchlist:
+        d = benchindices.setdefault(benchfile, {})
+        d[benchname] = len(d)
+
+    trials = []
+    outputstrings = {}
+    itersetupstrings = {}
+    # {(benchfile, benchname): output digest of the reference}
+    references = {}
+    for (benchfile, benchname, benchsetup, benchstring, benchfunc,
+            benchdata) in benchlist:
+        benchasync = isasyncbench(benchfile, benchfunc)
+        if (benchfile, benchfunc) not in outputstrings:
+            outputstrings[benchfile, benchfunc] = getoutputstring(benchfile,
+                                                                  benchfunc)
+        outputstring = outputstrings[benchfile, benchfunc]
+        if (benchfile, benchfunc) not in itersetupstrings:
+            itersetupstrings[benchfile, benchfunc] = getitersetupstring(
+                benchfile, benchfunc)
+        itersetupstring = itersetupstrings[benchfile, benchfunc]
+        if benchasync and itersetupstring is not None:
+            raise ValueError('Async benchmark function %r in %r can\'t have a '
+                             'per-iteration setup function'
+                             % (benchfunc, benchfile))
         for arenafile, arenaname, arenasetup in arenalist:
             setupstring = benchsetup + arenasetup
             arenaprefix, arenasuffix = arenaname.split(name, 1)
@@ -581,36 +1907,155 @@ def runbenchmarks(name, arenadict, benchdict, verbose=True, cython=False,
                 arenaname=arenaname,
                 arenaprefix=arenaprefix,
                 arenasuffix=arenasuffix,
+                benchasync=benchasync,
+                benchdata=benchdata,
                 benchfile=benchfile,
+                benchfunc=benchfunc,
                 benchindex=benchindices[benchfile][benchname],
                 benchname=benchname,
+                benchoutput=None,
+                benchsize=sizemap.get(benchdata),
                 benchstring=benchstring,
+                cached=None,
+                cihigh=None,
+                cilow=None,
+                eliminated=None,
+                itersetupstring=itersetupstring,
+                latency=None,
+                latencysamples=None,
                 loops=None,
+                machine=None,
+                median=None,
+                memblocks=None,
                 mintime=None,
+                netmemory=None,
+                outputmatch=None,
+                outputstring=outputstring,
+                overhead=None,
+                peakmemory=None,
+                profilestacks=None,
+                profilestats=None,
+                reduced=None,
+                relci=None,
+                scaling=None,
                 setupstring=setupstring,
+                stdev=None,
+                timername=None,
                 times=None,
                 # TODO: we plan to add the following:
                 # arenafunc=arenafunc,
                 # benchargs=benchargs,
-                # benchfunc=benchfunc,
                 # benchkwargs=benchkwargs,
-                # benchoutput=benchoutput,
             )
             # Give the user a chance to skip this benchmark
             if trialfilter is not None and trialfilter(trial) is False:
                 continue
-            times, loops = bettertimeit(benchstring, setupstring, timer=timer,
-                                        mintime=mintime, numrepeat=numrepeat)
-            trial.update(
-                loops=loops,
-                mintime=min(times),
-                times=times,
-            )
+            trials.append(trial)
+            # The reference output is computed once per benchmark in this
+            # process, from the function defined in the benchmark file
+            key = (benchfile, benchname)
+            if (checkoutput and outputstring is not None and
+                    key not in references and
+                    name in loadbenchfile(benchfile).__dict__):
+                benchloop = loopfactory or default_loopfactory
+                references[key] = outputit(
+                    outputstring, benchsetup,
+                    loopfactory=benchloop if benchasync else None,
+                    itersetup=itersetupstring)
+
+    options = dict(mintime=mintime, numrepeat=numrepeat, timer=timer,
+                   rtol=rtol, maxtime=maxtime, memory=memory, profile=profile,
+                   profiledir=profiledir, profiletime=profiletime,
+                   lownoise=bool(lownoise), calibrate=calibrate,
+                   loopfactory=loopfactory, concurrency=concurrency,
+                   concurrencymode=concurrencymode, racing=racing,
+                   budget=budget, latency=latency, checkoutput=checkoutput)
+    cachedinfo = [None] * len(trials)
+    if cache is not None:
+        if cache is True:
+            cache = ResultCache(default_cachefile)
+        elif not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+        for i, trial in enumerate(trials):
+            key = gettrialkey(trial, options, benchdict[trial['benchfile']],
+                              arenadict[trial['arenafile']], cython=cython)
+            trial['cachekey'] = key
+            cachedinfo[i] = cache.get(key)
+    jobs = [(trial, options) for trial, info in zip(trials, cachedinfo)
+            if info is None]
+    runjob = _runtrial
+    grouped = True
+    if budget is not None:
+        # The trials share the budget, so they are all timed by one job
+        jobs = [([trial for trial, _ in jobs], options)]
+        runjob = _runbudget
+    elif lownoise or racing or coordinator is not None:
+        # Time all functions of each benchmark together so their repeats
+        # can be interleaved (or raced), and so workers of a coordinator
+        # never compare functions timed on different hosts.  Trials of a
+        # benchmark are always adjacent.
+        groups = []
+        for trial, _ in jobs:
+            key = (trial['benchfile'], trial['benchname'])
+            if groups and groups[-1][0] == key:
+                groups[-1][1].append(trial)
+            else:
+                groups.append((key, [trial]))
+        jobs = [(group, options) for _, group in groups]
+        runjob = _rungroup if lownoise or racing else _runtrials
+    else:
+        grouped = False
+    pool = None
+    prevcpus = None
+    if coordinator is not None:
+        timings = coordinator.imap(runjob, jobs)
+    elif workers:
+        cpus = getworkercpus()
+        if cpus is not None and lownoise and lownoise is not True:
+            cpus = sorted(lownoise)
+        counter = multiprocessing.Value('i', 0)
+        pool = multiprocessing.Pool(workers, initializer=_initworker,
+                                    initargs=(cpus, counter))
+        # ``imap`` yields results in order as soon as they are ready
+        timings = pool.imap(runjob, jobs, chunksize=1)
+    else:
+        if lownoise:
+            prevcpus = pincpus(lownoise)
+        timings = (runjob(job) for job in jobs)
+    if grouped:
+        timings = (info for infos in timings for info in infos)
+
+    results = []
+    try:
+        for trial, info in zip(trials, cachedinfo):
+            if info is None:
+                info = next(timings)
+                if cache is not None:
+                    cache.add(trial.pop('cachekey'), info)
+                info['cached'] = False
+            else:
+                trial.pop('cachekey')
+                info['cached'] = True
+            trial.update(info)
+            if trial['benchoutput'] is not None:
+                # Without a reference (or if its output can't be compared),
+                # compare with the first function
+                key = (trial['benchfile'], trial['benchname'])
+                reference = references.get(key)
+                if reference is None:
+                    reference = references[key] = trial['benchoutput']
+                trial['outputmatch'] = trial['benchoutput'] == reference
             results.append(trial)
             # Give the user a chance to do something (such as printing output)
             # during the benchmarks.  They can also cancel benchmarking.
             if trialcallback is not None and trialcallback(trial) is False:
-                return results
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if prevcpus is not None:
+            os.sched_setaffinity(0, prevcpus)
     return results
 
 
@@ -628,10 +2073,30 @@ def quickstart(name, verbose=True, cython=False, mintime=default_mintime,
         - benchdict: see ``findbenchmarks`` function.
         - benchpaths: see ``findbenchmarks`` function.
         - benchprefixes: see ``findbenchmarks`` function.
+        - budget: see ``runbenchmarks`` function.
+        - cache: see ``runbenchmarks`` function.
+        - calibrate: see ``runbenchmarks`` function.
+        - checkoutput: see ``runbenchmarks`` function.
+        - concurrency: see ``runbenchmarks`` function.
+        - concurrencymode: see ``runbenchmarks`` function.
+        - coordinator: see ``runbenchmarks`` function.
         - dirs: see ``getpaths`` function.
+        - index: see ``findarenas`` function.
+        - latency: see ``runbenchmarks`` function.
+        - loopfactory: see ``runbenchmarks`` function.
+        - lownoise: see ``runbenchmarks`` function.
+        - maxtime: see ``runbenchmarks`` function.
+        - memory: see ``runbenchmarks`` function.
+        - profile: see ``runbenchmarks`` function.
+        - profiledir: see ``runbenchmarks`` function.
+        - profiletime: see ``runbenchmarks`` function.
+        - racing: see ``runbenchmarks`` function.
+        - rtol: see ``runbenchmarks`` function.
+        - sizes: see ``runbenchmarks`` function.
         - sourcedir: see ``getsourcedir`` function.
         - trialcallback: see ``runbenchmarks`` function.
         - trialfilter: see ``runbenchmarks`` function.
+        - workers: see ``runbenchmarks`` function.
     """
     # Uses: getpaths, findarenas, findbenchmarks, runbenchmarks
     class QuickDict(dict):
@@ -645,6 +2110,7 @@ def quickstart(name, verbose=True, cython=False, mintime=default_mintime,
             self[name] = val
 
     kwargs = QuickDict(kwargs)
+    kwargs.index = getindex(kwargs.index)
     if kwargs.arenaprefixes is None:
         kwargs.arenaprefixes = default_arenaprefixes
     if kwargs.arenapaths is None:
@@ -653,7 +2119,9 @@ def quickstart(name, verbose=True, cython=False, mintime=default_mintime,
                                      dirs=kwargs.dirs)
     if kwargs.arenadict is None:
         kwargs.arenadict = findarenas(name, prefixes=kwargs.arenaprefixes,
-                                      paths=kwargs.arenapaths, cython=cython)
+                                      paths=kwargs.arenapaths, cython=cython,
+                                      index=kwargs.index,
+                                      workers=kwargs.workers)
 
     if kwargs.benchprefixes is None:
         kwargs.benchprefixes = default_benchprefixes
@@ -663,13 +2131,43 @@ def quickstart(name, verbose=True, cython=False, mintime=default_mintime,
                                      dirs=kwargs.dirs)
     if kwargs.benchdict is None:
         kwargs.benchdict = findbenchmarks(name, prefixes=kwargs.benchprefixes,
-                                          paths=kwargs.benchpaths)
+                                          paths=kwargs.benchpaths,
+                                          index=kwargs.index,
+                                          workers=kwargs.workers)
+
+    if kwargs.calibrate is None:
+        kwargs.calibrate = True
+    if kwargs.checkoutput is None:
+        kwargs.checkoutput = True
+    if kwargs.concurrencymode is None:
+        kwargs.concurrencymode = 'threads'
+    if kwargs.maxtime is None:
+        kwargs.maxtime = default_maxtime
+    if kwargs.profiledir is None:
+        kwargs.profiledir = default_profiledir
+    if kwargs.profiletime is None:
+        kwargs.profiletime = default_profiletime
 
     results = runbenchmarks(name, kwargs.arenadict, kwargs.benchdict,
                             verbose=verbose, cython=cython,
                             timer=timer, mintime=mintime, numrepeat=numrepeat,
                             trialfilter=kwargs.trialfilter,
-                            trialcallback=kwargs.trialcallback)
+                            trialcallback=kwargs.trialcallback,
+                            workers=kwargs.workers, rtol=kwargs.rtol,
+                            maxtime=kwargs.maxtime, memory=kwargs.memory,
+                            profile=kwargs.profile,
+                            profiledir=kwargs.profiledir,
+                            profiletime=kwargs.profiletime,
+                            sizes=kwargs.sizes, cache=kwargs.cache,
+                            coordinator=kwargs.coordinator,
+                            lownoise=kwargs.lownoise,
+                            calibrate=kwargs.calibrate,
+                            loopfactory=kwargs.loopfactory,
+                            concurrency=kwargs.concurrency,
+                            concurrencymode=kwargs.concurrencymode,
+                            racing=kwargs.racing, budget=kwargs.budget,
+                            latency=kwargs.latency,
+                            checkoutput=kwargs.checkoutput)
     if not verbose:
         return results
 
@@ -677,27 +2175,56 @@ def quickstart(name, verbose=True, cython=False, mintime=default_mintime,
     printer = BenchPrinter(results, arenaprefixes=arenaprefixes,
                            benchprefixes=kwargs.benchprefixes)
     resultlist = []
-    for (benchfile, arenafile), table in sorted(printer.tables.items()):
-        times = printer.to_gfm(table)
-        reltimes = printer.to_gfm(table, relative=True)
-        rank = printer.to_gfm(table, rank=True)
-        resultlist.append((arenafile, benchfile, times, reltimes, rank))
-
-    for arenafile, benchfile, times, reltimes, ranks in resultlist:
+    for key in printer.tablekeys:
+        benchfile, arenafile = key
+        # show errors when the user asked for a target precision
+        sections = [
+            ('Time', printer.to_gfm(key, error=kwargs.rtol is not None)),
+            ('Relative time', printer.to_gfm(key, relative=True,
+                                             summary=True)),
+            ('Rank', printer.to_gfm(key, rank=True)),
+        ]
+        if any(trial['benchasync'] for trial in printer.resultdict[key]):
+            sections.append(('Throughput',
+                             printer.to_gfm(key, throughput=True)))
+        if kwargs.memory:
+            sections.extend([
+                ('Peak memory', printer.to_gfm(key, memory=True)),
+                ('Relative peak memory',
+                 printer.to_gfm(key, memory=True, relative=True,
+                                summary=True)),
+                ('Peak memory rank',
+                 printer.to_gfm(key, memory=True, rank=True)),
+            ])
+        if kwargs.sizes is not None:
+            sections.extend([
+                ('Complexity', printer.to_gfm_complexity(key)),
+                ('Crossovers', printer.to_gfm_crossovers(key)),
+            ])
+        if kwargs.concurrency is not None:
+            for arenaname, arenashort in printer.getarenas(key):
+                sections.append(('Scaling of %s' % arenashort,
+                                 printer.to_gfm_scaling(key, arenaname)))
+        wrong = ['%s (%s)' % names for names in printer.getmismatches(key)]
+        if wrong:
+            sections.append(('Wrong output',
+                             'Functions marked "!" returned a different output '
+                             'than the reference and are not ranked: %s'
+                             % ', '.join(wrong)))
+        if kwargs.latency:
+            for arenaname, arenashort in printer.getarenas(key):
+                sections.append(('Latency of %s' % arenashort,
+                                 printer.to_gfm_latency(key, arenaname)))
+        resultlist.append((arenafile, benchfile, sections))
+
+    for arenafile, benchfile, sections in resultlist:
         print()
         print('**Benchmarks:** %s' % benchfile)
         print('**Functions:** %s' % arenafile)
-        print()
-        print('**Time:**')
-        print()
-        print(times)
-        print()
-        print('**Relative time:**')
-        print()
-        print(reltimes)
-        print()
-        print('**Rank:**')
-        print()
-        print(rank)
+        for title, gfm in sections:
+            print()
+            print('**%s:**' % title)
+            print()
+            print(gfm)
 
     return results
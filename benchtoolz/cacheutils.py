@@ -0,0 +1,205 @@
+from __future__ import print_function
+import ast
+import hashlib
+import json
+import os
+import sys
+from array import array
+from .historyutils import getfingerprint
+
+default_cachefile = '.benchtoolz_cache.jsonl'
+
+# Options of ``runbenchmarks`` that change the results of a trial
+keyoptions = ['budget', 'calibrate', 'checkoutput', 'concurrency',
+              'concurrencymode', 'latency', 'loopfactory', 'lownoise',
+              'maxtime', 'memory', 'mintime', 'numrepeat', 'profile',
+              'profiledir', 'profiletime', 'racing', 'rtol', 'timer']
+# Items of trial results that are ``array.array('d')``, which are saved as
+# JSON lists
+arrayitems = ['latencysamples']
+
+# {(filename, mtime, size, funcnames): (globalshash, {funcname: hash})}
+_filehashcache = {}
+_functypes = (ast.FunctionDef,)
+if hasattr(ast, 'AsyncFunctionDef'):
+    _functypes += (ast.AsyncFunctionDef,)
+
+
+def hashtext(text):
+    """ Return the sha1 hex digest of a string or bytes"""
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return hashlib.sha1(text).hexdigest()
+
+
+def hashfile(filename):
+    """ Return the sha1 hex digest of the contents of a file"""
+    with open(filename, 'rb') as f:
+        return hashtext(f.read())
+
+
+def getcodehashes(filename, funcnames):
+    """ Return hashes of the functions and remaining code of a Python file.
+
+    The file is parsed, *not* imported.  Returns a tuple of the hash of the
+    file without the top-level functions named in ``funcnames`` and a dict
+    that maps each name in ``funcnames`` to the hash of its function.  The
+    hashes are of the syntax trees, so changes to comments and formatting
+    do not change the hashes.
+
+    The hash of a function includes the functions in ``funcnames`` that it
+    uses, directly or through each other, such as a variant that calls
+    another variant as a helper.  Hence, editing one function changes its
+    own hash and the hashes of the functions that use it, while editing
+    anything else in the file (such as global data or helper functions)
+    changes the first hash.
+    """
+    # Used by: gettrialkey
+    stat = os.stat(filename)
+    key = (filename, stat.st_mtime, stat.st_size, tuple(sorted(funcnames)))
+    if key in _filehashcache:
+        return _filehashcache[key]
+    with open(filename, 'rb') as f:
+        tree = ast.parse(f.read(), filename)
+    funcnodes = {}
+    body = []
+    for node in tree.body:
+        if isinstance(node, _functypes) and node.name in funcnames:
+            funcnodes[node.name] = node
+        else:
+            body.append(node)
+    tree.body = body
+    globalshash = hashtext(ast.dump(tree))
+    # {name: names of the other functions in ``funcnames`` it refers to}
+    uses = dict((name, set(child.id for child in ast.walk(node)
+                           if isinstance(child, ast.Name) and
+                           child.id in funcnodes and child.id != name))
+                for name, node in funcnodes.items())
+    funchashes = {}
+    for name in funcnodes:
+        used = set([name])
+        stack = [name]
+        while stack:
+            for other in uses[stack.pop()]:
+                if other not in used:
+                    used.add(other)
+                    stack.append(other)
+        funchashes[name] = hashtext('\0'.join(
+            ast.dump(funcnodes[other]) for other in sorted(used)))
+    _filehashcache[key] = (globalshash, funchashes)
+    return globalshash, funchashes
+
+
+def getinterpreter():
+    """ Return a string that identifies the Python interpreter and machine"""
+    return '%s|%s|%s' % (sys.executable, sys.version, getfingerprint())
+
+
+def _optionstring(options):
+    items = []
+    for key in keyoptions:
+        val = options.get(key)
+        if callable(val):
+            val = '%s.%s' % (getattr(val, '__module__', ''),
+                             getattr(val, '__name__', repr(val)))
+        items.append('%s=%r' % (key, val))
+    return ','.join(items)
+
+
+def gettrialkey(trial, options, benchfuncs, arenafuncs, cython=False):
+    """ Return a key that identifies the inputs of a trial.
+
+    The key is a hash of the following:
+
+        - the benchmark string and setup string of the trial
+        - the benchmark function and the rest of the benchmark file
+        - the arena function and the rest of the arena file (or the
+          compiled extension module for Cython files)
+        - the interpreter and machine (see ``getinterpreter``)
+        - the options that affect the results (see ``keyoptions``)
+
+    ``benchfuncs`` and ``arenafuncs`` are the lists of benchmark and arena
+    function names in the trial's benchmark and arena files.  If the key of
+    a trial doesn't change, then the results of the trial may be reused.
+    """
+    # Uses: getcodehashes, hashfile, getinterpreter
+    # Used by: runbenchmarks
+    benchglobals, benchhashes = getcodehashes(trial['benchfile'], benchfuncs)
+    if cython:
+        from .benchutils import loadarenafile
+        mod = loadarenafile(trial['arenafile'], cython=True)
+        arenaglobals = hashfile(mod.__file__)
+        arenahash = ''
+    else:
+        arenaglobals, arenahashes = getcodehashes(trial['arenafile'],
+                                                  arenafuncs)
+        arenahash = arenahashes.get(trial['arenaname'], '')
+    parts = [
+        trial['benchstring'],
+        trial['setupstring'],
+        benchglobals,
+        benchhashes.get(trial['benchfunc'], ''),
+        arenaglobals,
+        arenahash,
+        getinterpreter(),
+        _optionstring(options),
+    ]
+    return hashtext('\0'.join(parts))
+
+
+class ResultCache(object):
+    """ An on-disk cache of trial results keyed by ``gettrialkey``.
+
+    The cache file has one line of JSON per result and new results are
+    appended, so results are saved immediately after each trial is run.
+    If a key appears more than once, the last result is used.
+    """
+    def __init__(self, filename=default_cachefile):
+        self.filename = filename
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = {}
+            if os.path.exists(self.filename):
+                with open(self.filename) as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            record = json.loads(line)
+                            self._data[record['key']] = record['info']
+        return self._data
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        """ Return a copy of the cached result of ``key``"""
+        info = self.data.get(key)
+        if info is None:
+            return default
+        info = dict(info)
+        for name in arrayitems:
+            if info.get(name) is not None:
+                info[name] = array('d', info[name])
+        return info
+
+    def add(self, key, info):
+        """ Add the result of a trial to the cache (and save it to disk)"""
+        self.data[key] = dict(info)
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.filename, 'a') as f:
+            f.write(json.dumps(dict(key=key, info=info), sort_keys=True,
+                               separators=(',', ':'), default=list) + '\n')
+
+    def clear(self):
+        """ Remove all results from the cache"""
+        self._data = {}
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
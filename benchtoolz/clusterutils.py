@@ -0,0 +1,238 @@
+from __future__ import print_function
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from multiprocessing.managers import BaseManager
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+default_unitsize = 4
+default_authkey = b'benchtoolz'
+# How often idle workers check whether the coordinator is still alive
+default_pollinterval = 1.0
+
+
+def getauthkey(authkey=None):
+    """ Return the authentication key shared by a coordinator and its workers.
+
+    Defaults to the environment variable BENCHTOOLZ_AUTHKEY if it is set.
+    Use a secret key when the coordinator is reachable from other hosts,
+    because workers run whatever benchmarks they are sent.
+    """
+    if authkey is None:
+        authkey = os.environ.get('BENCHTOOLZ_AUTHKEY', default_authkey)
+    if not isinstance(authkey, bytes):
+        authkey = authkey.encode('utf-8')
+    return authkey
+
+
+def parseaddress(address):
+    """ Return ``(host, port)`` from a string such as "host:port" or "port"
+    """
+    if isinstance(address, tuple):
+        return address
+    host, sep, port = str(address).rpartition(':')
+    return host or 'localhost', int(port)
+
+
+class _WorkerManager(BaseManager):
+    pass
+
+
+_WorkerManager.register('getjobs')
+_WorkerManager.register('getresults')
+
+
+def runworker(address, authkey=None, pollinterval=default_pollinterval):
+    """ Run trials from a ``BenchCoordinator`` until it shuts down.
+
+    The worker connects to the coordinator at ``address``, then repeatedly
+    takes a work unit (a list of jobs), runs each job, and sends the
+    result of each job back as soon as it is done.  Results are tagged
+    with the machine fingerprint of the worker (see ``getfingerprint``).
+
+    Benchmark and arena files are loaded by filename, so each worker must
+    have the same files at the same paths as the coordinator (such as a
+    checkout of the same commit on a shared or identical filesystem).
+
+    Returns the number of jobs run.
+    """
+    # Used by: BenchCoordinator.startworkers
+    sys.dont_write_bytecode = True
+    manager = _WorkerManager(address=parseaddress(address),
+                             authkey=getauthkey(authkey))
+    manager.connect()
+    jobs = manager.getjobs()
+    results = manager.getresults()
+    count = 0
+    while True:
+        try:
+            unit = jobs.get(timeout=pollinterval)
+        except queue.Empty:
+            continue
+        except (EOFError, IOError, OSError):
+            # the coordinator went away
+            break
+        if unit is None:
+            # Shutting down.  Pass it on to the other workers.
+            jobs.put(None)
+            break
+        runid, func, items = unit
+        for index, job in items:
+            try:
+                info = func(job)
+            except Exception:
+                results.put((runid, index, None, traceback.format_exc()))
+            else:
+                results.put((runid, index, info, None))
+            count += 1
+    return count
+
+
+class BenchCoordinator(object):
+    """ Distribute trials to worker processes on this and other hosts.
+
+    The coordinator serves two queues over TCP: work units of trials are put
+    in one, and workers (see ``runworker``) put results in the other.  Pass
+    the coordinator to ``runbenchmarks`` (or ``BenchRunner.runbenchmarks``)
+    to run the trials on the workers, which may connect at any time and may
+    be reused for several runs.  For example::
+
+        with BenchCoordinator(address=('', 50123)) as coordinator:
+            coordinator.startworkers(2)  # local workers for this host
+            runner.runbenchmarks(coordinator=coordinator)
+
+    and on each of the other hosts::
+
+        python -m benchtoolz.clusterutils coordinatorhost:50123
+
+    Jobs (such as all trials of one benchmark, see ``runbenchmarks``) are
+    sent in units of ``unitsize`` jobs, and the results are merged in the
+    order of the jobs.  If ``timeout`` is given, a
+    RuntimeError is raised if no result is received for ``timeout`` seconds
+    (such as when all workers died).
+    """
+    def __init__(self, address=('localhost', 0), authkey=None,
+                 unitsize=default_unitsize, timeout=None):
+        self.address = parseaddress(address)
+        self.authkey = getauthkey(authkey)
+        self.unitsize = unitsize
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.workers = []
+        self._server = None
+        self._runid = 0
+
+    def start(self):
+        """ Start serving the queues in a background thread"""
+        if self._server is not None:
+            return self
+        jobs = self.jobs
+        results = self.results
+        # A new class for each coordinator, because ``register`` modifies
+        # the class.
+        manager = type('_CoordinatorManager', (BaseManager,), {})
+        manager.register('getjobs', callable=lambda: jobs)
+        manager.register('getresults', callable=lambda: results)
+        self._server = manager(address=self.address,
+                               authkey=self.authkey).get_server()
+        self.address = self._server.address
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def startworkers(self, count):
+        """ Start ``count`` worker processes on this host"""
+        self.start()
+        host, port = self.address
+        if host in ('', '0.0.0.0'):
+            host = 'localhost'
+        for i in range(count):
+            worker = multiprocessing.Process(target=runworker,
+                                             args=((host, port), self.authkey))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+        return self.workers
+
+    def imap(self, func, jobs):
+        """ Send jobs to the workers and yield their results in order.
+
+        Like ``multiprocessing.Pool.imap``, the workers call ``func`` on each
+        job, which is a tuple of trials and options for ``runbenchmarks``
+        (see ``benchutils._runtrials``).  ``func`` must be a module-level
+        function that can be imported by the workers.
+        """
+        # Used by: runbenchmarks
+        self.start()
+        # Results of previous runs that were stopped early are ignored
+        self._runid += 1
+        runid = self._runid
+        jobs = list(jobs)
+        for start in range(0, len(jobs), self.unitsize):
+            unit = list(enumerate(jobs[start:start + self.unitsize], start))
+            self.jobs.put((runid, func, unit))
+        done = {}
+        try:
+            for index in range(len(jobs)):
+                while index not in done:
+                    try:
+                        result = self.results.get(timeout=self.timeout)
+                    except queue.Empty:
+                        raise RuntimeError('No results from workers in %s '
+                                           'seconds' % self.timeout)
+                    resultid, i, info, error = result
+                    if resultid != runid:
+                        continue
+                    if error is not None:
+                        raise RuntimeError('Trial failed on worker:\n%s'
+                                           % error)
+                    done[i] = info
+                yield done.pop(index)
+        finally:
+            # Remove units that haven't been taken by workers
+            while True:
+                try:
+                    self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+
+    def shutdown(self):
+        """ Tell the workers to exit and stop the local workers"""
+        if self._server is None:
+            return
+        self.jobs.put(None)
+        for worker in self.workers:
+            worker.join(5 * default_pollinterval)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        self._server.stop_event.set()
+        self._server = None
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Run benchmarks sent by a benchtoolz coordinator')
+    parser.add_argument('address', help='address of coordinator: host:port')
+    parser.add_argument('--authkey', default=None,
+                        help='shared secret (default: $BENCHTOOLZ_AUTHKEY)')
+    args = parser.parse_args()
+    count = runworker(args.address, authkey=args.authkey)
+    print('Ran %d jobs' % count)
@@ -0,0 +1,232 @@
+from __future__ import print_function
+from .historyutils import HistoryStore, getfingerprint
+from .statutils import mannwhitneyu, median
+
+default_alpha = 0.05
+
+
+def loadresults(filename, commit=None, machine=None):
+    """ Return the records of a result set saved by ``HistoryStore``.
+
+    Results are saved with ``HistoryStore.append`` (or
+    ``BenchRunner.savehistory``), which keeps the times of every repeat.
+    If ``commit`` or ``machine`` is given, then only the matching records
+    are returned, so one history file may hold both result sets.  Only the
+    records of the latest run of each benchmark and function on each
+    machine are returned (see ``latestresults``).
+    """
+    # Uses: latestresults
+    # Used by: main
+    records = HistoryStore(filename).query(commit=commit, machine=machine)
+    return latestresults(records)
+
+
+def _getkey(trial):
+    """ Return (benchfile, benchname, arenafile, arenaname) of a trial"""
+    return (trial['benchfile'], trial['benchname'], trial['arenafile'],
+            trial['arenaname'])
+
+
+def latestresults(records):
+    """ Return the records of the latest run of each benchmark and function.
+
+    Records of ``HistoryStore`` are kept for every run, and times of
+    different runs of the same commit (such as a run before and after a
+    reboot) differ by more than the noise of a single run.  Pooling them
+    makes a significance test report changes that aren't there, so only
+    the records with the latest timestamp of each benchmark, function, and
+    machine are kept.
+    """
+    # Uses: _getkey
+    # Used by: loadresults, selectbaseline
+    latest = {}
+    for record in records:
+        key = _getkey(record) + (record.get('machine'),)
+        timestamp = record.get('timestamp')
+        if key not in latest or timestamp > latest[key]:
+            latest[key] = timestamp
+    return [record for record in records
+            if record.get('timestamp') == latest[_getkey(record) +
+                                                 (record.get('machine'),)]]
+
+
+def selectbaseline(records, results, machine=None):
+    """ Return the records of ``HistoryStore`` that are comparable to
+    ``results``.
+
+    Times are only comparable when they were measured on the same machine,
+    so by default each trial of ``results`` is compared to the records of
+    its own machine (the "machine" item of the trial, or the fingerprint of
+    the current machine).  Comparing machines is opt-in: if ``machine`` is
+    given, then the records of that machine fingerprint are used for every
+    trial instead.  Only the latest run of each benchmark and function is
+    kept (see ``latestresults``).
+    """
+    # Uses: getfingerprint, latestresults, _getkey
+    # Used by: benchutils.BenchRunner.comparehistory
+    if machine is None:
+        current = getfingerprint()
+        machines = dict((_getkey(trial), trial.get('machine') or current)
+                        for trial in results)
+        records = [record for record in records
+                   if machines.get(_getkey(record)) == record.get('machine')]
+    else:
+        records = [record for record in records
+                   if record.get('machine') == machine]
+    return latestresults(records)
+
+
+def _groupsamples(results):
+    """ Return dict that maps (benchfile, benchname, arenafile, arenaname)
+    to the times of all repeats of all matching trials.
+    """
+    # Uses: _getkey
+    # Used by: compareresults
+    samples = {}
+    for trial in results:
+        times = trial.get('times')
+        if not times:
+            continue
+        samples.setdefault(_getkey(trial), []).extend(times)
+    return samples
+
+
+def compareresults(baseline, candidate, alpha=default_alpha):
+    """ Compare the times of two result sets with a significance test.
+
+    ``baseline`` and ``candidate`` are lists of trial dicts from
+    ``runbenchmarks`` or of records from ``HistoryStore`` (see
+    ``loadresults`` and ``selectbaseline``), which should be from the same
+    machine.  The times of every repeat (not only ``mintime``) of each pair
+    of benchmark and function are compared with the Mann-Whitney U test
+    (see ``statutils.mannwhitneyu``), which doesn't assume that times are
+    normally distributed.  When a result set has several trials of the
+    same benchmark and function, their times are pooled.  Use more repeats
+    (such as ``numrepeat=10``) to detect small changes; with three repeats
+    each, the smallest possible p-value is 0.1.
+
+    Returns a list of dicts, one for each benchmark and function in both
+    result sets, with the following items:
+
+        - arenafile, arenaname, benchfile, benchname: identify the trials
+        - baseline: median time in seconds of ``baseline``
+        - candidate: median time in seconds of ``candidate``
+        - change: "faster" or "slower" if the change is significant (i.e.,
+          ``pvalue < alpha``), else "unchanged"
+        - delta: Cliff's delta effect size, which is the probability that a
+          time of ``candidate`` is greater than a time of ``baseline`` minus
+          the probability that it is smaller.  It is between -1 (all
+          candidate times are faster) and 1 (all are slower).
+        - nbaseline: number of times of ``baseline``
+        - ncandidate: number of times of ``candidate``
+        - pvalue: two-sided p-value of the Mann-Whitney U test
+        - ratio: ``candidate / baseline``, the ratio of the medians
+    """
+    # Uses: _groupsamples, mannwhitneyu
+    basesamples = _groupsamples(baseline)
+    candsamples = _groupsamples(candidate)
+    comparisons = []
+    for key in sorted(set(basesamples) & set(candsamples)):
+        basetimes = basesamples[key]
+        candtimes = candsamples[key]
+        u, pvalue = mannwhitneyu(candtimes, basetimes)
+        delta = 2.0 * u / (len(candtimes) * len(basetimes)) - 1.0
+        basemedian = median(basetimes)
+        candmedian = median(candtimes)
+        if basemedian > 0:
+            ratio = candmedian / basemedian
+        else:
+            ratio = 1.0 if candmedian == basemedian else float('inf')
+        if pvalue >= alpha:
+            change = 'unchanged'
+        elif delta < 0:
+            change = 'faster'
+        else:
+            change = 'slower'
+        benchfile, benchname, arenafile, arenaname = key
+        comparisons.append(dict(
+            arenafile=arenafile,
+            arenaname=arenaname,
+            baseline=basemedian,
+            benchfile=benchfile,
+            benchname=benchname,
+            candidate=candmedian,
+            change=change,
+            delta=delta,
+            nbaseline=len(basetimes),
+            ncandidate=len(candtimes),
+            pvalue=pvalue,
+            ratio=ratio,
+        ))
+    return comparisons
+
+
+def main(args=None):
+    """ Compare two result sets and print gfm tables of the changes"""
+    # Uses: loadresults, compareresults, ComparePrinter
+    import argparse
+    from .benchutils import default_benchprefixes
+    from .printutils import ComparePrinter
+    parser = argparse.ArgumentParser(
+        description='Compare two sets of benchmark results saved by '
+                    'benchtoolz.HistoryStore')
+    parser.add_argument('baseline', help='file of the baseline results')
+    parser.add_argument('candidate', nargs='?', default=None,
+                        help='file of the candidate results (default: same '
+                             'file as baseline)')
+    parser.add_argument('--baseline-commit', default=None,
+                        help='only use baseline results of this commit')
+    parser.add_argument('--candidate-commit', default=None,
+                        help='only use candidate results of this commit')
+    parser.add_argument('--machine', default=None,
+                        help='only use results of this machine fingerprint '
+                             '(needed if the results are from several '
+                             'machines)')
+    parser.add_argument('--baseline-machine', default=None,
+                        help='only use baseline results of this machine '
+                             '(default: --machine)')
+    parser.add_argument('--candidate-machine', default=None,
+                        help='only use candidate results of this machine '
+                             '(default: --machine)')
+    parser.add_argument('--alpha', type=float, default=default_alpha,
+                        help='significance level (default: %(default)s)')
+    parser.add_argument('--name', default=None,
+                        help='name of the functions, which is removed from '
+                             'the column names')
+    args = parser.parse_args(args)
+    if args.baseline_machine is None:
+        args.baseline_machine = args.machine
+    if args.candidate_machine is None:
+        args.candidate_machine = args.machine
+    if args.candidate is None:
+        if (args.baseline_commit == args.candidate_commit and
+                args.baseline_machine == args.candidate_machine):
+            parser.error('the baseline and candidate results are the same; '
+                         'give a candidate file, or different commits or '
+                         'machines of the baseline file')
+        args.candidate = args.baseline
+    baseline = loadresults(args.baseline, commit=args.baseline_commit,
+                           machine=args.baseline_machine)
+    candidate = loadresults(args.candidate, commit=args.candidate_commit,
+                            machine=args.candidate_machine)
+    for label, results in [('baseline', baseline), ('candidate', candidate)]:
+        machines = set(record['machine'] for record in results)
+        if len(machines) > 1:
+            parser.error('%s results are from several machines (%s); use '
+                         '--machine or --%s-machine to choose one'
+                         % (label, ', '.join(sorted(machines)), label))
+    comparisons = compareresults(baseline, candidate, alpha=args.alpha)
+    arenaprefixes = None if args.name is None else [args.name]
+    printer = ComparePrinter(comparisons, arenaprefixes=arenaprefixes,
+                             benchprefixes=default_benchprefixes)
+    for benchfile, arenafile in sorted(printer.tables):
+        print()
+        print('**Benchmarks:** %s' % benchfile)
+        print('**Functions:** %s' % arenafile)
+        print()
+        print(printer.to_gfm((benchfile, arenafile)))
+    return comparisons
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+from __future__ import division, print_function
+import gc
+import multiprocessing
+import threading
+import time
+import timeit
+from .statutils import median
+from .timerutils import BenchTimer
+
+concurrencymodes = ['threads', 'processes']
+
+
+def getconcurrencylevels(concurrency):
+    """ Return a sorted list of the numbers of threads or processes to use.
+
+    ``concurrency`` is the maximum number, in which case the powers of two
+    up to it (and the number itself) are used, or a list of numbers.
+
+    >>> getconcurrencylevels(6)
+    [1, 2, 4, 6]
+    """
+    # Used by: runbenchmarks, measurescaling
+    if isinstance(concurrency, int):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        levels = []
+        level = 1
+        while level < concurrency:
+            levels.append(level)
+            level *= 2
+        levels.append(concurrency)
+        return levels
+    levels = sorted(set(int(level) for level in concurrency))
+    if not levels or levels[0] < 1:
+        raise ValueError('concurrency levels must be at least 1')
+    return levels
+
+
+def getconcurrencymodes(mode):
+    """ Return a list of modes from "threads", "processes", or "both"."""
+    # Used by: runbenchmarks
+    if mode == 'both':
+        return list(concurrencymodes)
+    if mode not in concurrencymodes:
+        raise ValueError('Unknown concurrency mode: %r.  Must be one of %s or '
+                         '"both"' % (mode, concurrencymodes))
+    return [mode]
+
+
+def _timeworker(benchtimer, loops, numrepeat, barrier):
+    """ Time ``loops`` loops ``numrepeat`` times in step with ``barrier``.
+
+    The barrier is waited on before and after each repeat, so every worker
+    starts each repeat at the same time.  Returns the list of times and the
+    list of ``(start, stop)`` wall clock times of each repeat.  The wall
+    clock is ``time.perf_counter``, which is the same for all processes.
+    """
+    # Used by: _runthread, _runprocess
+    times = []
+    spans = []
+    for i in range(numrepeat):
+        barrier.wait()
+        start = time.perf_counter()
+        times.append(benchtimer.timeit(loops))
+        spans.append((start, time.perf_counter()))
+        barrier.wait()
+    return times, spans
+
+
+def _runthread(benchtimer, loops, numrepeat, barrier, results, index):
+    # Uses: _timeworker
+    # Used by: concurrenttimeit
+    results[index] = _timeworker(benchtimer, loops, numrepeat, barrier)
+
+
+def _runprocess(statements, setup, timer, loops, numrepeat, barrier, queue):
+    # Uses: _timeworker
+    # Used by: concurrenttimeit
+    benchtimer = BenchTimer(statements, setup, timer=timer, globals={})
+    gc.disable()
+    queue.put(_timeworker(benchtimer, loops, numrepeat, barrier))
+
+
+def concurrenttimeit(statements, setup, nworkers, loops, numrepeat=3,
+                     timer=timeit.default_timer, mode='threads'):
+    """ Run ``statements`` in ``nworkers`` threads or processes at once.
+
+    Each worker runs ``setup`` in its own namespace and then times ``loops``
+    loops of ``statements``, which is repeated ``numrepeat`` times.  The
+    workers wait for each other with a barrier before every repeat, so they
+    always run simultaneously and contend for the GIL, locks, and caches
+    like they would in a pool in production.  ``mode`` is "threads" or
+    "processes".  The processes are started (and their setup is run) before
+    the first repeat, so this cost is not measured.  Garbage collection is
+    disabled while timing.
+
+    Returns a tuple of the list of wall times in seconds for all workers to
+    finish each repeat and the list of times of each worker to run one loop
+    (i.e., the latencies of every worker for every repeat).
+    """
+    # Uses: _runthread, _runprocess
+    # Used by: measurescaling
+    if mode not in concurrencymodes:
+        raise ValueError('Unknown concurrency mode: %r' % (mode,))
+    if mode == 'processes' and multiprocessing.current_process().daemon:
+        raise ValueError('Worker processes (such as of "workers") can\'t '
+                         'start processes.  Use mode="threads" instead.')
+    if mode == 'threads':
+        barrier = threading.Barrier(nworkers)
+        results = [None] * nworkers
+        workers = [
+            threading.Thread(
+                target=_runthread,
+                args=(BenchTimer(statements, setup, timer=timer, globals={}),
+                      loops, numrepeat, barrier, results, i))
+            for i in range(nworkers)
+        ]
+    else:
+        barrier = multiprocessing.Barrier(nworkers)
+        queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=_runprocess,
+                args=(statements, setup, timer, loops, numrepeat, barrier,
+                      queue))
+            for i in range(nworkers)
+        ]
+    gcold = gc.isenabled()
+    gc.disable()
+    try:
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        if mode == 'processes':
+            results = [queue.get() for worker in workers]
+        for worker in workers:
+            worker.join()
+    finally:
+        if gcold:
+            gc.enable()
+    # The wall time of a repeat is from when the first worker started until
+    # the last worker finished.
+    walltimes = []
+    for i in range(numrepeat):
+        spans = [result[1][i] for result in results]
+        walltimes.append(max(stop for _, stop in spans) -
+                         min(start for start, _ in spans))
+    latencies = [t / loops for times, _ in results for t in times]
+    return walltimes, latencies
+
+
+def measurescaling(statements, setup, loops, concurrency, modes=('threads',),
+                   numrepeat=3, timer=timeit.default_timer):
+    """ Measure how the throughput of a benchmark scales with concurrency.
+
+    The benchmark is run by ``concurrenttimeit`` with each number of workers
+    given by ``concurrency`` (see ``getconcurrencylevels``) in each of
+    ``modes``.  Every worker runs ``loops`` loops per repeat.
+
+    Returns a list of dicts with the following items:
+
+        - efficiency: ``speedup`` divided by the number of workers; 1.0 is
+          perfect scaling, and 1 / workers means no gain at all
+        - latency: median time in seconds of one run in one worker
+        - maxlatency: slowest time in seconds of one run in one worker
+        - mode: "threads" or "processes"
+        - speedup: throughput relative to the throughput of one worker
+        - throughput: runs per second of all workers together (from the
+          fastest repeat)
+        - workers: the number of threads or processes
+    """
+    # Uses: concurrenttimeit, getconcurrencylevels
+    # Used by: runbenchmarks
+    levels = getconcurrencylevels(concurrency)
+    scaling = []
+    for mode in modes:
+        base = None
+        for nworkers in levels:
+            walltimes, latencies = concurrenttimeit(
+                statements, setup, nworkers, loops, numrepeat=numrepeat,
+                timer=timer, mode=mode)
+            walltime = min(walltimes)
+            throughput = (nworkers * loops / walltime if walltime > 0
+                          else float('inf'))
+            if base is None:
+                # One worker is the baseline even if it isn't in ``levels``
+                if nworkers == 1:
+                    base = throughput
+                else:
+                    onetimes = concurrenttimeit(
+                        statements, setup, 1, loops, numrepeat=numrepeat,
+                        timer=timer, mode=mode)[0]
+                    base = loops / min(onetimes)
+            speedup = throughput / base
+            scaling.append(dict(
+                efficiency=speedup / nworkers,
+                latency=median(latencies),
+                maxlatency=max(latencies),
+                mode=mode,
+                speedup=speedup,
+                throughput=throughput,
+                workers=nworkers,
+            ))
+    return scaling
@@ -0,0 +1,171 @@
+from __future__ import print_function
+import glob
+import imp
+import multiprocessing
+import os
+import shutil
+import sys
+import sysconfig
+import tempfile
+from .cacheutils import hashfile, hashtext
+
+default_builddir = '.benchtoolz_build'
+# Environment variables that change how extension modules are compiled
+flagvariables = ['CC', 'CFLAGS', 'CPPFLAGS', 'LDFLAGS', 'LDSHARED']
+
+
+def getdeps(filename):
+    """ Return sorted list of files that a Cython file depends on.
+
+    These are the ".pxd" and ".pyxbld" files that share the base name of
+    ``filename``, and the files that match the patterns in its ".pyxdep"
+    file (one glob pattern per line relative to the directory of
+    ``filename``), which is how ``pyximport`` declares dependencies.
+    """
+    # Used by: getbuildkey
+    base = os.path.splitext(filename)[0]
+    deps = set()
+    for ext in ['.pxd', '.pyxbld', '.pyxdep']:
+        if os.path.exists(base + ext):
+            deps.add(base + ext)
+    if base + '.pyxdep' in deps:
+        dirname = os.path.dirname(filename)
+        with open(base + '.pyxdep') as f:
+            for line in f:
+                pattern = line.strip()
+                if pattern and not pattern.startswith('#'):
+                    deps.update(glob.glob(os.path.join(dirname, pattern)))
+    deps.discard(filename)
+    return sorted(deps)
+
+
+def getcompiler():
+    """ Return a string that identifies the compiler toolchain and flags"""
+    # Used by: getbuildkey
+    try:
+        import Cython
+        version = Cython.__version__
+    except ImportError:
+        version = None
+    items = ['cython=%s' % version, 'python=%s' % sys.version,
+             'suffix=%s' % getsuffix()]
+    items.extend('%s=%s' % (var, os.environ.get(var, ''))
+                 for var in flagvariables)
+    return '\n'.join(items)
+
+
+def getsuffix():
+    """ Return the filename extension of extension modules, such as ".so"
+    """
+    suffix = sysconfig.get_config_var('EXT_SUFFIX')
+    if suffix is None:  # Python 2
+        suffix = sysconfig.get_config_var('SO')
+    return suffix
+
+
+def getbuildkey(filename):
+    """ Return a hash of a Cython file, its dependencies, and the compiler.
+
+    If the key of a file doesn't change, then its compiled extension module
+    may be reused.
+    """
+    # Uses: getdeps, getcompiler
+    # Used by: getbuildpath
+    parts = [hashfile(filename)]
+    for dep in getdeps(filename):
+        parts.append('%s=%s' % (os.path.basename(dep), hashfile(dep)))
+    parts.append(getcompiler())
+    return hashtext('\0'.join(parts))
+
+
+def getbuildpath(filename, builddir=default_builddir):
+    """ Return the path of the cached extension module of a Cython file.
+
+    Extension modules are saved in directories named by ``getbuildkey``, so
+    a path exists only if the file was built with the same contents,
+    dependencies, and compiler flags.
+    """
+    # Uses: getbuildkey
+    # Used by: buildextension, buildall
+    name = os.path.splitext(os.path.basename(filename))[0]
+    key = getbuildkey(filename)
+    return os.path.join(os.path.abspath(builddir), key[:2], key[2:],
+                        name + getsuffix())
+
+
+def _compile(args):
+    """ Compile a Cython file with ``pyximport`` and save it to ``buildpath``
+    """
+    filename, buildpath = args
+    import pyximport
+    name = os.path.splitext(os.path.basename(filename))[0]
+    dirname = os.path.dirname(buildpath)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # another process may have just created it
+            if not os.path.isdir(dirname):
+                raise
+    tmpdir = tempfile.mkdtemp(dir=dirname)
+    try:
+        sopath = pyximport.build_module(name, filename, pyxbuild_dir=tmpdir)
+        # Rename is atomic, so other processes never see a partial file
+        tmpname = '%s.%d.tmp' % (buildpath, os.getpid())
+        shutil.copyfile(sopath, tmpname)
+        os.rename(tmpname, buildpath)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return buildpath
+
+
+def buildextension(filename, builddir=default_builddir):
+    """ Return the path to the extension module of a Cython file.
+
+    The file is only compiled if it isn't already in the build cache (see
+    ``getbuildpath``).
+    """
+    # Uses: getbuildpath
+    # Used by: loadextension
+    buildpath = getbuildpath(filename, builddir=builddir)
+    if not os.path.exists(buildpath):
+        _compile((filename, buildpath))
+    return buildpath
+
+
+def buildall(filenames, builddir=default_builddir, workers=None):
+    """ Compile Cython files that aren't in the build cache.
+
+    Files are compiled concurrently in a pool of ``workers`` processes,
+    which defaults to the number of cpus.  Returns a dict that maps each
+    filename to the path of its extension module.
+    """
+    # Uses: getbuildpath
+    # Used by: findarenas, runbenchmarks
+    buildpaths = dict((filename, getbuildpath(filename, builddir=builddir))
+                      for filename in filenames)
+    jobs = [(filename, buildpath) for filename, buildpath
+            in sorted(buildpaths.items()) if not os.path.exists(buildpath)]
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if len(jobs) > 1 and workers > 1:
+        pool = multiprocessing.Pool(min(workers, len(jobs)))
+        try:
+            pool.map(_compile, jobs, chunksize=1)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        for job in jobs:
+            _compile(job)
+    return buildpaths
+
+
+def loadextension(filename, builddir=default_builddir):
+    """ Build (if necessary) and import a Cython file and return the module
+    """
+    # Uses: buildextension
+    # Used by: loadarenafile
+    name = os.path.splitext(os.path.basename(filename))[0]
+    buildpath = buildextension(filename, builddir=builddir)
+    return imp.load_dynamic(name, buildpath)
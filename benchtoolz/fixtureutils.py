@@ -0,0 +1,193 @@
+from __future__ import print_function
+import glob
+import json
+import mmap
+import os
+import pickle
+import sys
+from array import array
+from .cacheutils import hashfile, hashtext
+
+default_fixturedir = '.benchtoolz_fixtures'
+
+
+class Fixture(object):
+    """ A value of a benchmark file that is built once and shared via mmap.
+
+    Create fixtures with the ``fixture`` decorator.  When the benchmark file
+    is loaded (see ``benchutils.loadbenchfile``), each fixture is replaced
+    by its value, which is built by calling ``func`` only if it isn't saved
+    in ``fixturedir`` yet.  Values are saved in a format that is loaded
+    without copying by mapping the file into memory, so every process
+    (such as every worker) shares the same pages instead of building and
+    holding its own copy:
+
+        - bytes, bytearray, and memoryview are loaded as a read-only
+          ``memoryview`` of the file
+        - ``array.array`` is loaded as a read-only ``memoryview`` with the
+          same format (i.e., typecode), which supports ``len``, indexing,
+          slicing, and iteration
+        - numpy arrays (if numpy is installed) are loaded as read-only
+          ``numpy.memmap`` arrays
+
+    Other values are pickled, so they are built once but loaded (copied)
+    by every process.  The saved value is rebuilt when the benchmark file
+    or the interpreter version changes.
+    """
+    def __init__(self, func, fixturedir=default_fixturedir):
+        self.func = func
+        self.name = func.__name__
+        self.fixturedir = fixturedir
+
+    def __repr__(self):
+        return 'Fixture(%s)' % self.name
+
+    def getprefix(self, filename, name=None):
+        """ Return the path prefix of the saved files of this fixture.
+
+        The prefix identifies the benchmark file and the name of the
+        fixture, and the saved files of a fixture all share it.
+        """
+        base = os.path.splitext(os.path.basename(filename))[0]
+        pathhash = hashtext(os.path.abspath(filename))[:8]
+        return os.path.join(self.fixturedir, '%s-%s.%s' % (
+            base, pathhash, name or self.name))
+
+    def getpath(self, filename, name=None):
+        """ Return the path (without extension) of the saved value.
+
+        This changes when the contents of the benchmark file or the version
+        of Python change.
+        """
+        # Uses: getprefix
+        key = hashtext('%s|%d.%d' % (hashfile(filename),
+                                     sys.version_info[0],
+                                     sys.version_info[1]))
+        return '%s.%s' % (self.getprefix(filename, name), key[:12])
+
+    def build(self, path):
+        """ Build the value and save it as ``path + ".bin"`` (or ".npy") with
+        its metadata in ``path + ".json"``.
+
+        Files are written to temporary files first and then renamed, so
+        processes that build the same fixture at once don't see partial
+        files.  The metadata is written last, so its file marks a complete
+        fixture.
+        """
+        # Used by: load
+        value = self.func()
+        tmp = '.%d.tmp' % os.getpid()
+        meta = dict(name=self.name)
+        if _isndarray(value):
+            import numpy
+            meta['kind'] = 'numpy'
+            with open(path + '.npy' + tmp, 'wb') as f:
+                numpy.save(f, value, allow_pickle=False)
+            os.rename(path + '.npy' + tmp, path + '.npy')
+        else:
+            if isinstance(value, (bytes, bytearray)):
+                meta['kind'] = 'bytes'
+                data = memoryview(value)
+            elif isinstance(value, (array, memoryview)):
+                data = memoryview(value)
+                meta.update(kind='buffer', format=data.format,
+                            shape=list(data.shape))
+                data = data.cast('B') if data.nbytes else b''
+            else:
+                meta['kind'] = 'pickle'
+                data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(path + '.bin' + tmp, 'wb') as f:
+                f.write(data)
+            os.rename(path + '.bin' + tmp, path + '.bin')
+        with open(path + '.json' + tmp, 'w') as f:
+            json.dump(meta, f)
+        os.rename(path + '.json' + tmp, path + '.json')
+
+    def load(self, filename, name=None):
+        """ Return the value of the fixture of benchmark file ``filename``.
+
+        The value is built and saved the first time (see ``build``), and
+        saved values of older versions of the benchmark file are removed.
+        ``name`` is the global name of the fixture in the benchmark file
+        (the name of the function by default).
+        """
+        # Uses: getpath, build, cleanup
+        # Used by: loadfixtures
+        path = self.getpath(filename, name)
+        if not os.path.exists(path + '.json'):
+            if not os.path.isdir(self.fixturedir):
+                try:
+                    os.makedirs(self.fixturedir)
+                except OSError:
+                    # another worker process may have just created it
+                    if not os.path.isdir(self.fixturedir):
+                        raise
+            self.build(path)
+            self.cleanup(filename, name, keep=path)
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        if meta['kind'] == 'numpy':
+            import numpy
+            return numpy.load(path + '.npy', mmap_mode='r')
+        with open(path + '.bin', 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files can't be mapped
+                view = memoryview(b'')
+            else:
+                view = memoryview(mmap.mmap(f.fileno(), 0,
+                                            access=mmap.ACCESS_READ))
+        if meta['kind'] == 'bytes':
+            return view
+        if meta['kind'] == 'buffer':
+            if not view.nbytes:
+                # Views with zeros in their shape can't be cast
+                return view.cast(meta['format'])
+            return view.cast(meta['format'], meta['shape'])
+        return pickle.loads(view)
+
+    def cleanup(self, filename, name=None, keep=None):
+        """ Remove the saved values of this fixture except for ``keep``"""
+        # Uses: getprefix
+        # Used by: load
+        for path in glob.glob(self.getprefix(filename, name) + '.*'):
+            if keep is None or not path.startswith(keep + '.'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def fixture(func=None, fixturedir=default_fixturedir):
+    """ Decorator that turns a function of a benchmark file into a fixture.
+
+    The function is called without arguments to build the value, such as a
+    large input of the benchmarks, which is saved and shared by every
+    process (see ``Fixture``):
+
+        @fixture
+        def data_large():
+            return array('d', range(10**8))
+
+    The name of the function is the global name of the value when the
+    benchmarks are run, so fixtures may also be the input data of
+    parametrized benchmarks (see ``benchutils.getbenchdata``).  Use
+    ``@fixture(fixturedir=...)`` to save values in another directory.
+    """
+    if func is None:
+        return lambda func: Fixture(func, fixturedir=fixturedir)
+    return Fixture(func, fixturedir=fixturedir)
+
+
+def loadfixtures(mod, filename):
+    """ Replace the fixtures in the globals of a module by their values"""
+    # Uses: Fixture.load
+    # Used by: benchutils.loadbenchfile
+    for name, val in list(vars(mod).items()):
+        if isinstance(val, Fixture):
+            setattr(mod, name, val.load(filename, name))
+
+
+def _isndarray(value):
+    """ Return True if ``value`` is a numpy array (without importing numpy)"""
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and isinstance(value, numpy.ndarray)
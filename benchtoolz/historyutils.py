@@ -0,0 +1,215 @@
+from __future__ import print_function
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import time
+from .statutils import mad, median
+
+# Items of each trial dict that are saved in the history.  Strings such as
+# ``benchstring`` and ``setupstring`` are not saved to keep the store compact.
+historykeys = [
+    'arenafile', 'arenaname', 'benchfile', 'benchname', 'cihigh', 'cilow',
+    'loops', 'median', 'mintime', 'relci', 'stdev', 'times',
+]
+default_nsigma = 3.0
+default_minhistory = 3
+default_rtol = 0.02
+
+
+def getcommit(path=None):
+    """ Return the git commit hash of the repository at ``path``.
+
+    Returns None if ``path`` is not in a git repository or if git is not
+    available.
+    """
+    # Used by: BenchRunner
+    if not path:
+        path = os.getcwd()
+    try:
+        with open(os.devnull, 'w') as devnull:
+            commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                             cwd=path, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit.decode('ascii').strip()
+
+
+def getmachine():
+    """ Return a dict that describes the current machine and interpreter"""
+    # Used by: getfingerprint
+    return dict(
+        implementation=platform.python_implementation(),
+        machine=platform.machine(),
+        node=platform.node(),
+        processor=platform.processor(),
+        python=platform.python_version(),
+        system=platform.system(),
+    )
+
+
+def getfingerprint(machine=None):
+    """ Return a short string that identifies the current machine.
+
+    Benchmark results are only comparable when they were run on the same
+    machine with the same Python interpreter, so the fingerprint is a hash
+    of the info returned by ``getmachine``.
+    """
+    # Uses: getmachine
+    # Used by: HistoryStore
+    if machine is None:
+        machine = getmachine()
+    text = json.dumps(machine, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+class HistoryStore(object):
+    """ An append-only, on-disk store of benchmark results.
+
+    Each record is a single line of JSON with the items of ``historykeys``
+    from a trial dict as well as the following items:
+
+        - commit: git commit of the code being benchmarked (or None)
+        - machine: machine fingerprint (see ``getfingerprint``)
+        - timestamp: time when the record was added (seconds since epoch)
+
+    Records are keyed by benchmark, function, commit, and machine, and may be
+    retrieved with ``query``.  Records are never modified or removed, so it is
+    safe to append to the same file from several runs.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+    def append(self, results, commit=None, machine=None, timestamp=None):
+        """ Append trial dicts from ``runbenchmarks`` to the store.
+
+        Each record is filed under the ``machine`` item of its trial, which
+        is the fingerprint of the machine that ran it (such as a worker of
+        a ``BenchCoordinator``).  ``machine`` is the fingerprint of trials
+        without one, which defaults to the fingerprint of the current
+        machine.  Returns the number of records added.
+        """
+        if machine is None:
+            machine = getfingerprint()
+        if timestamp is None:
+            timestamp = time.time()
+        lines = []
+        for trial in results:
+            record = dict((key, trial.get(key)) for key in historykeys)
+            record.update(commit=commit,
+                          machine=trial.get('machine') or machine,
+                          timestamp=timestamp)
+            lines.append(json.dumps(record, sort_keys=True,
+                                    separators=(',', ':')))
+        if not lines:
+            return 0
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(self.filename, 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+        return len(lines)
+
+    def __iter__(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def query(self, benchfile=None, benchname=None, arenafile=None,
+              arenaname=None, commit=None, machine=None):
+        """ Return a list of records that match all the given arguments.
+
+        Arguments that are None match all records.
+        """
+        criteria = dict(arenafile=arenafile, arenaname=arenaname,
+                        benchfile=benchfile, benchname=benchname,
+                        commit=commit, machine=machine)
+        criteria = dict((key, val) for key, val in criteria.items()
+                        if val is not None)
+        return [record for record in self
+                if all(record.get(key) == val
+                       for key, val in criteria.items())]
+
+    def commits(self, machine=None):
+        """ Return a list of commits in the store in the order they were added
+        """
+        commits = []
+        for record in self:
+            if machine is not None and record['machine'] != machine:
+                continue
+            if record['commit'] not in commits:
+                commits.append(record['commit'])
+        return commits
+
+
+def findregressions(store, results, commit=None, machine=None,
+                    nsigma=default_nsigma, rtol=default_rtol,
+                    minhistory=default_minhistory):
+    """ Compare ``results`` to their history and return those that changed.
+
+    For each trial in ``results``, the ``mintime`` of the matching records
+    in ``store`` (same benchmark, function, and machine, but different commit)
+    determine the historical noise band: the median plus or minus ``nsigma``
+    robust standard deviations (estimated from the median absolute
+    deviation).  The band is at least ``rtol`` relative to the median, which
+    prevents flagging tiny changes when the history is very consistent.
+    Trials with fewer than ``minhistory`` historical records are skipped.
+
+    Returns a list of dicts with the following items:
+
+        - arenafile, arenaname, benchfile, benchname: identify the trial
+        - baseline: median historical time in seconds
+        - change: "regression" if slower than the band, else "improvement"
+        - high: upper bound of the noise band in seconds
+        - low: lower bound of the noise band in seconds
+        - mintime: time of the trial in seconds
+        - numhistory: number of historical records used
+        - ratio: ``mintime / baseline``
+    """
+    # Uses: getfingerprint, HistoryStore
+    # Used by: BenchRunner
+    if machine is None:
+        machine = getfingerprint()
+    history = {}
+    for record in store.query(machine=machine):
+        if commit is not None and record['commit'] == commit:
+            continue
+        key = (record['benchfile'], record['benchname'],
+               record['arenafile'], record['arenaname'])
+        if key not in history:
+            history[key] = []
+        history[key].append(record['mintime'])
+
+    changes = []
+    for trial in results:
+        key = (trial['benchfile'], trial['benchname'],
+               trial['arenafile'], trial['arenaname'])
+        times = history.get(key, [])
+        if len(times) < minhistory:
+            continue
+        baseline = median(times)
+        halfwidth = max(nsigma * 1.4826 * mad(times), rtol * baseline)
+        low = baseline - halfwidth
+        high = baseline + halfwidth
+        mintime = trial['mintime']
+        if low <= mintime <= high:
+            continue
+        changes.append(dict(
+            arenafile=trial['arenafile'],
+            arenaname=trial['arenaname'],
+            baseline=baseline,
+            benchfile=trial['benchfile'],
+            benchname=trial['benchname'],
+            change='regression' if mintime > high else 'improvement',
+            high=high,
+            low=low,
+            mintime=mintime,
+            numhistory=len(times),
+            ratio=mintime / baseline,
+        ))
+    return changes
@@ -0,0 +1,174 @@
+from __future__ import division, print_function
+import math
+import timeit
+from array import array
+from .statutils import percentile
+from .timerutils import (compilecached, compileloop, compilesetup,
+                         getinputnames, gettimer)
+
+default_latencysamples = 10000
+# Minimum time in seconds of one sample.  Faster benchmarks are timed in
+# small batches of calls, so the cost of calling the timer stays small.
+default_latencybatchtime = 1e-6
+# Maximum time in seconds to spend sampling each benchmark
+default_latencytime = 1.0
+default_latencybins = 16
+latencypercentiles = [50, 90, 99]
+
+_sampletemplate = '''
+def _benchsample(_benchsamples, _benchbatch, _benchtimer):
+    _benchrange = range(_benchbatch)
+    for _benchi in range(len(_benchsamples)):
+        _benchstart = _benchtimer()
+        for _benchj in _benchrange:
+{statements}
+        _benchsamples[_benchi] = _benchtimer() - _benchstart
+'''
+
+# Like ``_sampletemplate``, but the inputs of each batch are created by a
+# per-iteration setup (see ``timerutils.compilesetup``) before timing it
+_itersampletemplate = '''
+def _benchsample(_benchsamples, _benchbatch, _benchtimer):
+    for _benchi in range(len(_benchsamples)):
+        _benchinputs = [_benchsetup() for _benchj in range(_benchbatch)]
+        _benchstart = _benchtimer()
+        for {names}, in _benchinputs:
+{statements}
+        _benchsamples[_benchi] = _benchtimer() - _benchstart
+        del _benchinputs
+'''
+
+
+def getbatch(looptime, batchtime=default_latencybatchtime):
+    """ Return the number of calls per sample for calls that take ``looptime``.
+
+    This is the smallest power of two such that a batch takes at least
+    ``batchtime`` seconds, and it is 1 for benchmarks slower than that.
+    """
+    # Used by: getlatency
+    batch = 1
+    while batch * looptime < batchtime and batch < 2 ** 20:
+        batch *= 2
+    return batch
+
+
+def _compilesampler(statements, setup, itersetup=None):
+    """ Return the sampling function of ``statements`` in a fresh namespace"""
+    # Uses: compilecached, compileloop, compilesetup
+    # Used by: latencyit
+    namespace = {}
+    exec(compilecached(setup, '<setup>'), namespace)
+    if itersetup is None:
+        exec(compileloop(statements, template=_sampletemplate, indent=12,
+                         filename='<latency-src>'), namespace)
+    else:
+        names = compilesetup(itersetup, namespace)
+        exec(compileloop(statements, template=_itersampletemplate,
+                         indent=12, filename='<latency-src>',
+                         names=', '.join(names)), namespace)
+    return namespace['_benchsample']
+
+
+def latencyit(statements, setup, numsamples=default_latencysamples, batch=1,
+              timer=timeit.default_timer, calibrate=True, itersetup=None):
+    """ Return an array of the times in seconds of individual calls.
+
+    Unlike ``timeit``, which returns the total time of many loops, every
+    call of ``statements`` (or every batch of ``batch`` calls) is timed
+    separately, so the distribution of the times shows the occasional slow
+    calls, such as from dict resizes or cache misses.  Garbage collection
+    is left enabled, so its pauses are included too.  Each sample is the
+    time of a batch divided by ``batch``.
+
+    ``setup`` is run once in a fresh global namespace, and one batch is run
+    before sampling as a warm up.  If ``itersetup`` is given, it creates
+    fresh inputs for every call before its batch is timed.  If
+    ``calibrate`` is True, then the time of timing an empty batch is
+    subtracted from each sample.  Returns an ``array.array('d')`` of
+    ``numsamples`` times.
+    """
+    # Uses: _compilesampler, getinputnames
+    # Used by: getlatency
+    timername, func, scale = gettimer(timer)
+    sampler = _compilesampler(statements, setup, itersetup=itersetup)
+    sampler(array('d', [0.0]), batch, func)
+    samples = array('d', [0.0]) * numsamples
+    sampler(samples, batch, func)
+    overhead = 0.0
+    if calibrate:
+        empty = array('d', [0.0]) * min(numsamples, 1000)
+        emptysetup = None
+        if itersetup is not None:
+            emptysetup = ''.join('%s = None\n' % name
+                                 for name in getinputnames(itersetup))
+        _compilesampler('pass', 'pass', itersetup=emptysetup)(empty, batch,
+                                                              func)
+        overhead = min(empty)
+    for i, sample in enumerate(samples):
+        samples[i] = max(sample - overhead, 0.0) * scale / batch
+    return samples
+
+
+def describelatency(samples):
+    """ Return dict of the percentiles and the maximum of latency samples.
+
+    The keys are "max" and "p50", "p90", and "p99" (see
+    ``latencypercentiles``).
+    """
+    # Uses: percentile
+    # Used by: getlatency
+    samples = sorted(samples)
+    info = dict(('p%g' % q, percentile(samples, q))
+                for q in latencypercentiles)
+    info['max'] = samples[-1]
+    return info
+
+
+def getlatency(statements, setup, looptime, numsamples=default_latencysamples,
+               timer=timeit.default_timer, calibrate=True,
+               maxtime=default_latencytime, itersetup=None):
+    """ Sample the latency of a benchmark that takes ``looptime`` per call.
+
+    The number of calls per sample is chosen by ``getbatch``, and fewer than
+    ``numsamples`` samples are taken if they would take more than
+    ``maxtime`` seconds.  ``itersetup`` is passed to ``latencyit``.  Returns
+    a tuple of a dict of the percentiles (see
+    ``describelatency``) with the number of calls per sample as "batch",
+    and the array of samples (see ``latencyit``).
+    """
+    # Uses: getbatch, latencyit, describelatency
+    # Used by: _gettrialinfo
+    batch = getbatch(looptime)
+    if looptime > 0:
+        numsamples = min(numsamples,
+                         max(int(maxtime / (batch * looptime)), 1))
+    samples = latencyit(statements, setup, numsamples=numsamples, batch=batch,
+                        timer=timer, calibrate=calibrate, itersetup=itersetup)
+    info = describelatency(samples)
+    info['batch'] = batch
+    return info, samples
+
+
+def histogram(samples, bins=default_latencybins):
+    """ Return a histogram of latency samples with log-spaced bins.
+
+    Log-spaced bins show both the typical calls and the slow tail, which
+    may be many times slower.  Returns a list of ``(low, high, count)``
+    tuples of each bin.  Zero samples are counted in the first bin.
+    """
+    # Used by: BenchPrinter.to_gfm_latency
+    positive = [x for x in samples if x > 0]
+    if not positive:
+        return [(0.0, 0.0, len(samples))]
+    lo = min(positive)
+    hi = max(positive)
+    if lo == hi:
+        return [(lo, hi, len(samples))]
+    loglo = math.log(lo)
+    width = (math.log(hi) - loglo) / bins
+    counts = [0] * bins
+    for x in samples:
+        i = int((math.log(x) - loglo) / width) if x > lo else 0
+        counts[min(i, bins - 1)] += 1
+    return [(math.exp(loglo + i * width), math.exp(loglo + (i + 1) * width),
+             count) for i, count in enumerate(counts)]
@@ -0,0 +1,120 @@
+from __future__ import print_function
+import hashlib
+from .asyncutils import geteventloop
+from .timerutils import compilecached, compileloop, compilesetup
+
+# Outputs with longer canonical reprs are saved as hashes
+default_maxoutput = 64
+
+# The inputs of a per-iteration setup are passed as ``names``
+_outputtemplate = '''
+def _benchoutput({names}):
+{statements}
+'''
+
+_asyncoutputtemplate = '''
+async def _benchoutput({names}):
+{statements}
+'''
+
+
+def canonicalrepr(value):
+    """ Return a repr of ``value`` that is the same for equal outputs.
+
+    Items of dicts and sets are sorted, so their order doesn't matter, and
+    iterators (such as generators) are consumed and shown as lists.  Objects
+    with a ``tobytes`` method (such as ``array.array`` and numpy arrays) are
+    shown by their type, shape, and a hash of their bytes, because their
+    repr may be truncated.
+
+    Returns None if ``value`` (or any item of it) has no repr that can be
+    compared, such as an object with the default repr, which shows its
+    address (e.g., "<Foo object at 0x7f...>") and differs in every process.
+    """
+    # Used by: getoutputdigest
+    if isinstance(value, dict):
+        items = [(canonicalrepr(key), canonicalrepr(val))
+                 for key, val in value.items()]
+        if any(key is None or val is None for key, val in items):
+            return None
+        return '{%s}' % ', '.join(sorted('%s: %s' % item for item in items))
+    if isinstance(value, (set, frozenset, list, tuple)):
+        items = [canonicalrepr(item) for item in value]
+        if None in items:
+            return None
+        if isinstance(value, (set, frozenset)):
+            return '%s({%s})' % (type(value).__name__,
+                                 ', '.join(sorted(items)))
+        if isinstance(value, list):
+            return '[%s]' % ', '.join(items)
+        if len(items) == 1:
+            return '(%s,)' % items[0]
+        return '(%s)' % ', '.join(items)
+    if isinstance(value, (str, bytes, bytearray)):
+        return repr(value)
+    if hasattr(value, 'tobytes'):
+        digest = hashlib.sha1(value.tobytes()).hexdigest()
+        shape = getattr(value, 'shape', None)
+        if shape is None:
+            shape = len(value)
+        dtype = getattr(value, 'dtype', getattr(value, 'typecode', ''))
+        return '%s(%s, %s, sha1:%s)' % (type(value).__name__, shape, dtype,
+                                       digest)
+    if hasattr(value, '__next__'):
+        return canonicalrepr(list(value))
+    if type(value).__repr__ is object.__repr__:
+        return None
+    text = repr(value)
+    if ' at 0x' in text:
+        return None
+    return text
+
+
+def getoutputdigest(value, maxoutput=default_maxoutput):
+    """ Return a short string that identifies the output of a benchmark.
+
+    This is the canonical repr of ``value`` (see ``canonicalrepr``) if it
+    has at most ``maxoutput`` characters, else "sha1:" and its hash, so
+    large outputs are compared without being kept.  Returns None if the
+    output can't be compared.
+    """
+    # Uses: canonicalrepr
+    # Used by: outputit
+    text = canonicalrepr(value)
+    if text is None or len(text) <= maxoutput:
+        return text
+    return 'sha1:' + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def outputit(statements, setup, loopfactory=None, itersetup=None):
+    """ Run ``statements`` once and return the digest of their output.
+
+    ``statements`` are the body of a benchmark function that ends with a
+    return statement (see ``benchutils.getbenchparts``), and ``setup`` is
+    run in a fresh global namespace first.  This is separate from timing,
+    so it adds no cost to the timed loops.  If ``loopfactory`` is given, the
+    statements may use ``await`` and are run in its event loop (see
+    ``asyncutils.geteventloop``).  If ``itersetup`` is given, it creates the
+    inputs of the statements (see ``timerutils.compilesetup``).  Returns the
+    digest from ``getoutputdigest``, which is None if the output can't be
+    compared.
+    """
+    # Uses: compilecached, compileloop, compilesetup, geteventloop,
+    #       getoutputdigest
+    # Used by: runbenchmarks, _gettrialinfo
+    namespace = {}
+    exec(compilecached(setup, '<setup>'), namespace)
+    names = []
+    if itersetup is not None:
+        names = compilesetup(itersetup, namespace)
+    template = _outputtemplate if loopfactory is None else _asyncoutputtemplate
+    exec(compileloop(statements, template=template, indent=4,
+                     filename='<output-src>', names=', '.join(names)),
+         namespace)
+    inputs = namespace['_benchsetup']() if names else ()
+    if loopfactory is None:
+        value = namespace['_benchoutput'](*inputs)
+    else:
+        value = geteventloop(loopfactory).run_until_complete(
+            namespace['_benchoutput'](*inputs))
+    return getoutputdigest(value)
@@ -4,6 +4,10 @@ import math
 import os
 import re
 import sys
+from array import array
+from .latencyutils import histogram, latencypercentiles
+from .scaleutils import estimatecomplexity, findcrossovers, predict
+from .tableutils import ResultTable, isnull
 
 
 def best_units(num):
@@ -44,6 +48,21 @@ def numericstringkey(sval):
 nsorted = functools.partial(sorted, key=numericstringkey)
 
 
+def sparkline(counts):
+    """ Return a string of bars, one for each count, such as of a histogram.
+
+    The heights are logarithmic, so any nonzero count, such as a few slow
+    calls in the tail of a histogram, is visible.
+    """
+    bars = ' \u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588'
+    top = max(counts) if counts else 0
+    if top <= 0:
+        return ' ' * len(counts)
+    return ''.join(
+        bars[int(math.ceil(8 * math.log1p(count) / math.log1p(top)))]
+        for count in counts)
+
+
 class ProgressPrinter(object):
     def __init__(self, arenadict=None, benchdict=None, outfile=sys.stdout):
         self.outfile = outfile
@@ -90,8 +109,31 @@ class ProgressPrinter(object):
         if self.timescale is None:
             self.timescale, self.timeunits = best_units(mintime)
             self.timeunits += 'sec'
-        self.print('    %4.3g %s - %s - (2^%d = %d loops)' % (
-            mintime * self.timescale, self.timeunits, arenaname, twopow, loops))
+        relci = trial.get('relci')
+        if relci is None:
+            serror = ''
+        else:
+            serror = ' \u00b1%.2g%%' % (100 * relci)
+        peakmemory = trial.get('peakmemory')
+        if peakmemory is None:
+            smemory = ''
+        else:
+            scale, units = best_units(peakmemory) if peakmemory >= 1 else (1, '')
+            smemory = ' - %.3g %sB peak' % (peakmemory * scale, units)
+        latency = trial.get('latency')
+        if latency is not None:
+            smemory += ' - %.3g %s p99' % (latency['p99'] * self.timescale,
+                                           self.timeunits)
+        scached = ' (cached)' if trial.get('cached') else ''
+        if trial.get('eliminated'):
+            scached += ' (eliminated)'
+        if trial.get('reduced'):
+            scached += ' (reduced)'
+        if trial.get('outputmatch') is False:
+            scached += ' (output mismatch)'
+        self.print('    %4.3g %s%s - %s - (2^%d = %d loops)%s%s' % (
+            mintime * self.timescale, self.timeunits, serror, arenaname,
+            twopow, loops, smemory, scached))
 
 
 # This is very basic and a little hacky.  We should probably try to
@@ -104,6 +146,16 @@ class BenchPrinter(object):
             - arenaprefixes: list of prefixes to strip from function names
             - benchprefixes: list of prefixes to strip from benchmark names
 
+        The results are stored in columnar form in ``self.resulttable`` (a
+        ``tableutils.ResultTable``), from which relative times, ranks, and
+        summaries are computed and ``to_gfm`` renders tables directly, so
+        this is fast even for 100k+ trials.  The datum dicts of
+        ``self.tables`` are only built when they are used.
+
+        Functions whose output didn't match the reference (see the
+        ``checkoutput`` keyword of ``runbenchmarks``) are not ranked, and
+        their relative values are relative to the best matching function.
+
         The dicts used as table elements have the following items:
             - arenaindex: integer index of the function (i.e., a column id)
             - arenaname: the full name of the function being benchmarked
@@ -111,14 +163,36 @@ class BenchPrinter(object):
             - benchindex: integer index of the benchmark (i.e., a row id)
             - benchname: the full name of the benchmark function
             - benchshort: name of benchmark with prefix (e.g., 'bench_') removed
+            - bytes: original data, peak memory in bytes (None if not measured)
+            - error: half-width of the confidence interval of the median,
+              in scaled units of `time` (None if not available)
+            - eliminated: True if function was eliminated from a race, so
+              its time is coarse
             - isbest: True if function had the best time for this test
             - loops: number of loops used by timeit
+            - memory: scaled data, memory = memscale * bytes
+            - memrank: rank of peak memory; tied values share the same rank
+            - memscale: scale factor used to change units of memory
+            - memunits: memory units for `memory`, such as "kB" for kilobytes
+            - mismatch: True if the output of the function didn't match the
+              reference, so it isn't ranked (rank and memrank are 0)
             - rank: 1 is the fastest, 2 is the second fasted, etc.
+            - relerror: `error` relative to the best time
+            - relmemory: peak memory relative to the smallest peak memory
+            - relthroughput: throughput relative to the best throughput
             - reltime: relative time to the best time, reltime = time / besttime
             - scale: scale factor used to change units of time
             - seconds: original data, duration in seconds of benchmark
+            - serror: string version of `error`
+            - smemory: string version of `memory`
+            - srelerror: string version of `relerror`
+            - srelmemory: string version of `relmemory`
+            - srelthroughput: string version of `relthroughput`
             - sreltime: string version of `reltime`
             - stime: string version of `time`
+            - sthroughput: string version of `throughput`
+            - throughput: scaled data, number of runs per second
+            - throughputunits: units for `throughput`, such as "k/s"
             - time: scaled data, time = scale * seconds
             - trialdata: original data dictionary of this trial run
             - units: time units for `time`, such as "ms" for milliseconds
@@ -126,17 +200,168 @@ class BenchPrinter(object):
         self.results = results
         self.arenaprefixes = arenaprefixes
         self.benchprefixes = benchprefixes
-        self.tables = {}
-        # groupby benchfile, arenafile
+        # Relative values, ranks, and summaries are computed for all trials
+        # at once from columnar results, which is fast even for very many
+        # trials.  See ``tableutils.ResultTable``.
+        rt = self.resulttable = ResultTable(results)
+        bybench = rt.groupby(['benchfile', 'arenafile', 'benchindex'])
+        # Functions with the wrong output are missing (NaN) when ranking
+        self.mismatches = [trial.get('outputmatch') is False
+                           for trial in results]
+        mintimes = rt.columns['mintime']
+        memory = rt.columns['peakmemory']
+        if any(self.mismatches):
+            mintimes = self._mask(mintimes)
+            memory = self._mask(memory)
+        self.reltimes = rt.relative(mintimes, bybench)
+        self.ranks = rt.rank(mintimes, bybench)
+        # Memory is only compared when it was measured for every function
+        measured = rt.columns['peakmemory']
+        memgroups = dict((key, group) for key, group in bybench.items()
+                         if not any(isnull(measured[i]) for i in group))
+        self.relmemory = rt.relative(memory, memgroups)
+        self.memranks = rt.rank(memory, memgroups)
+        if any(self.mismatches):
+            self._relate_mismatches(bybench, memgroups)
+        self._summaries = None
+
+        # Strip prefixes once per label instead of once per trial
+        self._arenashortlabels = [self._strip_prefix(name, arenaprefixes)
+                                  for name in rt.labels['arenaname']]
+        self._benchshortlabels = [self._strip_prefix(name, benchprefixes)
+                                  for name in rt.labels['benchname']]
+
+        # groupby benchfile, arenafile (which are the first two columns of
+        # the groups of each benchmark)
+        keygroups = {}
+        for key, group in bybench.items():
+            keygroups.setdefault(key[:2], []).append(group)
         self.resultdict = {}
-        for trial in results:
-            key = (trial['benchfile'], trial['arenafile'])
-            if key not in self.resultdict:
-                self.resultdict[key] = []
-            self.resultdict[key].append(trial)
+        self._keyrows = {}
+        names = ['benchfile', 'arenafile']
+        for key, groups in keygroups.items():
+            rows = sorted(i for group in groups for i in group)
+            key = rt.decode(names, key)
+            self._keyrows[key] = rows
+            self.resultdict[key] = [results[i] for i in rows]
+        self.tablekeys = sorted(self._keyrows)
+        self._grids = {}
+        self._tables = None
+
+        # fits of complexity models for results of size sweeps
+        self.complexity = estimatecomplexity(results)
+
+    @property
+    def tables(self):
+        """ Dict that maps ``(benchfile, arenafile)`` to a table of datums.
+
+        A table is a list of rows, one for each benchmark, of the datum
+        dicts of each function (see ``__init__``).  ``to_gfm`` renders from
+        the columns of ``self.resulttable``, so the datums are only built
+        the first time this is used.
+        """
+        if self._tables is None:
+            self._tables = {}
+            for key in self.tablekeys:
+                grid = self._getgrid(key)[2]
+                self._tables[key] = [
+                    self._build_row([i for i in row if i is not None])
+                    for row in grid]
+        return self._tables
+
+    @tables.setter
+    def tables(self, tables):
+        self._tables = tables
+
+    def _mask(self, values):
+        """ Return a copy of a float column with NaN for mismatched outputs
+        """
+        values = array('d', values)
+        for i, mismatch in enumerate(self.mismatches):
+            if mismatch:
+                values[i] = float('nan')
+        return values
+
+    def _relate_mismatches(self, bybench, memgroups):
+        """ Make relative values of functions with the wrong output relative
+        to the best function of their benchmark with the right output.
+        """
+        rt = self.resulttable
+        for values, relvalues, groups in [
+                (rt.columns['mintime'], self.reltimes, bybench),
+                (rt.columns['peakmemory'], self.relmemory, memgroups)]:
+            for group in groups.values():
+                wrong = [i for i in group if self.mismatches[i]]
+                if not wrong:
+                    continue
+                matched = [values[i] for i in group if not self.mismatches[i]]
+                best = min(matched) if matched else None
+                for i in wrong:
+                    if best is None:
+                        relvalues[i] = float('nan')
+                    elif best > 0:
+                        relvalues[i] = values[i] / best
+                    else:
+                        relvalues[i] = (1.0 if values[i] == best
+                                        else float('inf'))
+
+    def _getgrid(self, key):
+        """ Return the grid of benchmarks by functions of a table.
+
+        ``key`` is a ``(benchfile, arenafile)`` key of ``self.tables``.
+        Returns a tuple of the benchmark indices, the function indices, and
+        a list of lists of row indices of ``self.resulttable`` (None where
+        a function wasn't run for a benchmark).  See ``ResultTable.pivot``.
+        """
+        grid = self._grids.get(key)
+        if grid is None:
+            rt = self.resulttable
+            grid = rt.pivot(range(len(rt)), 'benchindex', 'arenaindex',
+                            self._keyrows[key])
+            self._grids[key] = grid
+        return grid
+
+    def getarenas(self, key):
+        """ Return sorted list of (arenaname, arenashort) of a table"""
+        return self._arenashorts(self.resultdict[key])
+
+    def getmismatches(self, key):
+        """ Return list of (arenashort, benchshort) of the functions of a
+        table whose output didn't match the reference.
+        """
+        rt = self.resulttable
+        arenacodes = rt.columns['arenaname']
+        benchcodes = rt.columns['benchname']
+        return [(self._arenashortlabels[arenacodes[i]],
+                 self._benchshortlabels[benchcodes[i]])
+                for row in self._getgrid(key)[2] for i in row
+                if i is not None and self.mismatches[i]]
+
+    def getsummary(self, key):
+        """ Return geometric means of the relative values of each function.
 
-        for key, trials in self.resultdict.items():
-            self.tables[key] = self._build_table(trials)
+        ``key`` is a ``(benchfile, arenafile)`` key of ``self.tables``.
+        Returns a dict with items "reltime" and "relmemory", which are dicts
+        that map ``arenaindex`` to the geometric mean over all benchmarks of
+        the relative time or relative peak memory of the function.  Results
+        with the wrong output are not included.
+        """
+        if self._summaries is None:
+            rt = self.resulttable
+            self._summaries = dict((key, dict(relmemory={}, reltime={}))
+                                   for key in self.tablekeys)
+            rows = None
+            if any(self.mismatches):
+                rows = [i for i, mismatch in enumerate(self.mismatches)
+                        if not mismatch]
+            names = ['benchfile', 'arenafile', 'arenaindex']
+            for item, values in [('reltime', self.reltimes),
+                                 ('relmemory', self.relmemory)]:
+                for code, val in rt.geomean(values, names, rows).items():
+                    benchfile, arenafile, arenaindex = rt.decode(names, code)
+                    self._summaries[benchfile, arenafile][item][
+                        arenaindex] = val
+        return self._summaries[key]
 
     def _strip_prefix(self, sval, prefix):
         if prefix is None:
@@ -149,96 +374,288 @@ class BenchPrinter(object):
                 return sval[len(pre):]
         return sval
 
-    def _build_table(self, trials):
-        bybench = {}
-        for trial in trials:
-            arenaindex = trial['arenaindex']
-            arenaname = trial['arenaname']
-            arenashort = self._strip_prefix(arenaname, self.arenaprefixes)
-            benchindex = trial['benchindex']
-            benchname = trial['benchname']
-            benchshort = self._strip_prefix(benchname, self.benchprefixes)
-            datum = dict(
-                arenaindex=arenaindex,
-                arenaname=arenaname,
-                arenashort=arenashort,
-                benchindex=benchindex,
-                benchname=benchname,
-                benchshort=benchshort,
-                loops=trial['loops'],
-                seconds=trial['mintime'],
-                trialdata=trial,
-            )
-            if benchindex not in bybench:
-                bybench[benchindex] = {}
-            bybench[benchindex][arenaindex] = datum
-
+    def _build_row(self, group):
+        """ Return the list of datums of a benchmark from its result rows"""
+        rt = self.resulttable
+        mintimes = rt.columns['mintime']
+        cilows = rt.columns['cilow']
+        cihighs = rt.columns['cihigh']
+        memory = rt.columns['peakmemory']
+        arenaindices = rt.columns['arenaindex']
+        arenacodes = rt.columns['arenaname']
+        benchcodes = rt.columns['benchname']
         # Determine units for each test such that the largest value
         # is between 1 and 1000.
-        for arenadict in bybench.values():
-            sortedvals = sorted(datum['seconds'] for datum in arenadict.values())
-            minval = sortedvals[0]
-            maxval = sortedvals[-1]
-            ranks = dict(zip(sortedvals, range(1, len(sortedvals) + 1)))
+        minval = min(mintimes[i] for i in group)
+        maxval = max(mintimes[i] for i in group)
+        scale, units = best_units(maxval)
+        units += 's'
+        # The best time of a function with the right output
+        matched = [mintimes[i] for i in group if not self.mismatches[i]]
+        bestval = min(matched) if matched else None
+        data = []
+        order = sorted(group, key=arenaindices.__getitem__)
+        for i in order:
+            seconds = mintimes[i]
+            arenacode = arenacodes[i]
+            benchcode = benchcodes[i]
+            reltime = self.reltimes[i]
+            if isnull(cilows[i]) or isnull(cihighs[i]):
+                error = relerror = None
+                serror = srelerror = ''
+            else:
+                halfwidth = (cihighs[i] - cilows[i]) / 2.0
+                error = halfwidth * scale
+                relerror = halfwidth / minval
+                serror = '%.2g' % error
+                srelerror = '%.2g' % relerror
+            data.append(dict(
+                arenaindex=arenaindices[i],
+                arenaname=rt.labels['arenaname'][arenacode],
+                arenashort=self._arenashortlabels[arenacode],
+                benchindex=rt.columns['benchindex'][i],
+                benchname=rt.labels['benchname'][benchcode],
+                benchshort=self._benchshortlabels[benchcode],
+                bytes=None if isnull(memory[i]) else int(memory[i]),
+                error=error,
+                eliminated=bool(rt.trials[i].get('eliminated')),
+                isbest=seconds == bestval and not self.mismatches[i],
+                loops=rt.columns['loops'][i],
+                mismatch=self.mismatches[i],
+                rank=self.ranks[i],
+                relerror=relerror,
+                reltime=reltime,
+                scale=scale,
+                seconds=seconds,
+                serror=serror,
+                srelerror=srelerror,
+                sreltime='%.3g' % reltime,
+                stime='%.3g' % (seconds * scale),
+                time=seconds * scale,
+                trialdata=rt.trials[i],
+                units=units,
+            ))
+        if any(isnull(memory[i]) for i in group):
+            self._add_memory(data, None, None)
+        else:
+            self._add_memory(data, [self.relmemory[i] for i in order],
+                             [self.memranks[i] for i in order])
+        self._add_throughput(data)
+        return data
+
+    def _add_memory(self, data, relmemory, memranks):
+        """ Add peak memory items to the data of a single benchmark.
+
+        ``relmemory`` and ``memranks`` are lists of the relative peak memory
+        and rank of each datum, or None if memory wasn't measured.
+        """
+        if relmemory is None:
+            for datum in data:
+                datum.update(memory=None, memrank=None, memscale=None,
+                             memunits=None, relmemory=None, smemory='',
+                             srelmemory='')
+            return
+        scale, units = self._memory_units(datum['bytes'] for datum in data)
+        for datum, rel, memrank in zip(data, relmemory, memranks):
+            datum.update(
+                memory=datum['bytes'] * scale,
+                memrank=memrank,
+                memscale=scale,
+                memunits=units,
+                relmemory=rel,
+            )
+            datum.update(
+                smemory='%.3g' % datum['memory'],
+                srelmemory='%.3g' % datum['relmemory'],
+            )
+
+    def _add_throughput(self, data):
+        """ Add throughput items (runs per second) to data of a benchmark"""
+        rates = [1.0 / datum['seconds'] if datum['seconds'] > 0
+                 else float('inf') for datum in data]
+        scale, units = self._throughput_units(rates)
+        for datum, rate in zip(data, rates):
+            datum.update(
+                relthroughput=1.0 / datum['reltime'],
+                srelthroughput='%.3g' % (1.0 / datum['reltime']),
+                sthroughput='%.3g' % (rate * scale),
+                throughput=rate * scale,
+                throughputunits=units,
+            )
+
+    def _memory_units(self, values):
+        """ Return scale factor and units of peak memory in bytes"""
+        maxval = max(values)
+        if maxval >= 1:
             scale, units = best_units(maxval)
-            units += 's'
-            for datum in arenadict.values():
-                seconds = datum['seconds']
-                datum.update(
-                    isbest=seconds == minval,
-                    rank=ranks[seconds],
-                    reltime=seconds / minval,
-                    scale=scale,
-                    time=seconds * scale,
-                    units=units,
-                )
-                datum.update(
-                    sreltime='%.3g' % datum['reltime'],
-                    stime='%.3g' % datum['time'],
-                )
-        table = []
-        for benchindex, arenadict in sorted(bybench.items()):
-            current = []
-            table.append(current)
-            for arenaindex, datum in sorted(arenadict.items()):
-                current.append(datum)
-        return table
+        else:
+            scale, units = 1.0, ''
+        return scale, units + 'B'
+
+    def _throughput_units(self, rates):
+        """ Return scale factor and units of throughputs (runs per second)"""
+        finite = [rate for rate in rates if rate != float('inf')]
+        scale, units = best_units(max(finite)) if finite else (1.0, '')
+        return scale, units + '/s'
+
+    def _format_row(self, cells, relative=False, memory=False,
+                    throughput=False):
+        """ Return the units and the value and error strings of a table row.
+
+        ``cells`` are the row indices in ``self.resulttable`` of the
+        functions of a benchmark.  Values are scaled such that the largest
+        value is between 1 and 1000, and errors are only given for times
+        and relative times.
+        """
+        rt = self.resulttable
+        mintimes = rt.columns['mintime']
+        noerrors = [''] * len(cells)
+        if memory:
+            values = rt.columns['peakmemory']
+            if any(isnull(values[i]) for i in cells):
+                return None, noerrors, noerrors
+            scale, units = self._memory_units(values[i] for i in cells)
+            if relative:
+                vals = ['%.3g' % self.relmemory[i] for i in cells]
+            else:
+                vals = ['%.3g' % (values[i] * scale) for i in cells]
+            return units, vals, noerrors
+        if throughput:
+            rates = [1.0 / mintimes[i] if mintimes[i] > 0 else float('inf')
+                     for i in cells]
+            scale, units = self._throughput_units(rates)
+            if relative:
+                vals = ['%.3g' % (1.0 / self.reltimes[i]) for i in cells]
+            else:
+                vals = ['%.3g' % (rate * scale) for rate in rates]
+            return units, vals, noerrors
+        cilows = rt.columns['cilow']
+        cihighs = rt.columns['cihigh']
+        minval = min(mintimes[i] for i in cells)
+        scale, units = best_units(max(mintimes[i] for i in cells))
+        if relative:
+            vals = ['%.3g' % self.reltimes[i] for i in cells]
+            # errors relative to the best time
+            scale = 1.0 / minval if minval > 0 else float('nan')
+        else:
+            vals = ['%.3g' % (mintimes[i] * scale) for i in cells]
+        errors = []
+        for i in cells:
+            if isnull(cilows[i]) or isnull(cihighs[i]):
+                errors.append('')
+            else:
+                halfwidth = (cihighs[i] - cilows[i]) / 2.0
+                errors.append('%.2g' % (halfwidth * scale))
+        return units + 's', vals, errors
 
     # Should we add a keyword to return a 2d table of strings?  Nah, probably not
-    def to_gfm(self, table, relative=False, rank=False):
-        """ Return a github-flavored markdown table of benchmark results"""
+    def to_gfm(self, table, relative=False, rank=False, error=False,
+               memory=False, throughput=False, summary=False):
+        """ Return a github-flavored markdown table of benchmark results
+
+        ``table`` is a ``(benchfile, arenafile)`` key of ``self.tables`` (or
+        one of its tables).  The table is rendered directly from the columns
+        of ``self.resulttable``: the benchmark by function grid is from
+        ``ResultTable.pivot``, so the datums of ``self.tables`` aren't built.
+
+        If ``error`` is True, then times and relative times are displayed
+        with their errors, such as "1.23 \u00b1 0.02".  Functions that were
+        eliminated from a race (see ``runbenchmarks``) are marked as coarse,
+        such as "~4.56", and functions whose output didn't match the
+        reference are marked as wrong, such as "!4.56".  If ``memory`` is
+        True, then peak memory is displayed instead of time.  If
+        ``throughput`` is True, then the number of runs per second is
+        displayed instead of time.  If ``summary`` is True (which requires
+        ``relative``), then a last row shows the geometric mean of the
+        relative values of each function over all benchmarks.
+        """
         if relative and rank:
             raise ValueError("'relative' and 'rank' keywords can't both be True")
+        if summary and not relative:
+            raise ValueError("'summary' keyword requires 'relative' keyword")
+        if memory and throughput:
+            raise ValueError("'memory' and 'throughput' keywords can't both be "
+                             "True")
+        if not isinstance(table, tuple):
+            trial = table[0][0]['trialdata']
+            table = (trial['benchfile'], trial['arenafile'])
+        key = table
+        rt = self.resulttable
+        arenaindices, grid = self._getgrid(key)[1:]
+        if memory:
+            peakmemory = rt.columns['peakmemory']
+            if all(isnull(peakmemory[i]) for i in self._keyrows[key]):
+                raise ValueError('Memory was not measured.  Use the "memory" '
+                                 'keyword of "runbenchmarks".')
+            ranks = self.memranks
+        else:
+            ranks = self.ranks
+        arenacodes = rt.columns['arenaname']
+        benchcodes = rt.columns['benchname']
         data = []
         column_names = ['__Bench__ \\ __Func__ ']
-        for datum in table[0]:
-            column_names.append(' __%s__ ' % datum['arenashort'])
+        for col in range(len(arenaindices)):
+            i = next(row[col] for row in grid if row[col] is not None)
+            column_names.append(' __%s__ '
+                                % self._arenashortlabels[arenacodes[i]])
         data.append(column_names)
-        for row in table:
-            datum = row[0]
+        for row in grid:
+            cells = [i for i in row if i is not None]
+            units, vals, errors = self._format_row(
+                cells, relative=relative, memory=memory,
+                throughput=throughput)
+            strings = dict(zip(cells, zip(vals, errors)))
+            benchshort = self._benchshortlabels[benchcodes[cells[0]]]
             if relative or rank:
-                sval = ' __%s__ ' % datum['benchshort']
+                sval = ' __%s__ ' % benchshort
             else:
-                sval = ' __%s__ (`%s`) ' % (datum['benchshort'], datum['units'])
+                sval = ' __%s__ (`%s`) ' % (benchshort, units)
             crow = [sval]
             data.append(crow)
-            for datum in row:
+            for i in row:
+                if i is None:
+                    crow.append(' ')
+                    continue
+                # Times of functions eliminated from a race are coarse
+                coarse = not memory and bool(rt.trials[i].get('eliminated'))
                 # set data string and emphasize first and second best
-                if relative:
-                    val = datum['sreltime']
-                elif rank:
-                    val = str(datum['rank'])
+                if rank:
+                    val = str(ranks[i])
                 else:
-                    val = datum['stime']
-                if datum['rank'] == 1:
+                    val, err = strings[i]
+                    if error and err and not coarse:
+                        val = '%s \u00b1 %s' % (val, err)
+                if coarse:
+                    val = '~%s' % val
+                if self.mismatches[i]:
+                    val = '!' if rank else '!%s' % val
+                if ranks[i] == 1:
                     sval = ' __%s__ ' % val
-                elif datum['rank'] == 2 and len(row) > 2:
+                elif ranks[i] == 2 and len(cells) > 2:
                     # Should we actually do this for the second best?
                     sval = ' *%s* ' % val
                 else:
                     sval = ' %s ' % val
                 crow.append(sval)
+        if summary:
+            means = self.getsummary(key)
+            means = means['relmemory' if memory else 'reltime']
+            crow = [' __geomean__ ']
+            data.append(crow)
+            vals = [means.get(arenaindex) for arenaindex in arenaindices]
+            best = min(val for val in vals if val is not None)
+            for val in vals:
+                if val is None:
+                    crow.append(' ')
+                    continue
+                # relative throughput is the inverse of relative time
+                sval = '%.3g' % (1.0 / val if throughput else val)
+                crow.append(' __%s__ ' % sval if val == best else ' %s ' % sval)
+        return self._format_gfm(data)
 
+    def _format_gfm(self, data):
+        """ Return a gfm table from a list of rows of strings (first is header)
+        """
         # get max widths
         maxwidths = [0] * len(data[0])
         for row in data:
@@ -268,3 +685,214 @@ class BenchPrinter(object):
         for row in data:
             gfm.append('|%s|' % '|'.join(row))
         return os.linesep.join(gfm)
+
+    def _arenashorts(self, trials):
+        """ Return sorted list of (arenaname, arenashort) for the trials"""
+        names = dict((trial['arenaindex'], trial['arenaname'])
+                     for trial in trials)
+        return [(name, self._strip_prefix(name, self.arenaprefixes))
+                for _, name in sorted(names.items())]
+
+    def to_gfm_complexity(self, key):
+        """ Return a gfm table of the best-fit complexity of each function.
+
+        ``key`` is a ``(benchfile, arenafile)`` key of ``self.tables``, and
+        the results must be from ``runbenchmarks(sizes=...)``.  Each cell
+        shows the complexity model and its constant factor, such as
+        "O(n) 2.5 ns".  The function predicted to be fastest at the largest
+        size is emphasized.  See ``scaleutils.fitcomplexity``.
+        """
+        benchfile, arenafile = key
+        trials = self.resultdict[key]
+        arenanames = self._arenashorts(trials)
+        benchfuncs = nsorted(set(trial['benchfunc'] for trial in trials
+                                 if trial.get('benchsize') is not None))
+        data = []
+        column_names = ['__Bench__ \\ __Func__ ']
+        for arenaname, arenashort in arenanames:
+            column_names.append(' __%s__ ' % arenashort)
+        data.append(column_names)
+        for benchfunc in benchfuncs:
+            benchshort = self._strip_prefix(benchfunc, self.benchprefixes)
+            fits = [self.complexity.get((benchfile, benchfunc, arenafile,
+                                         arenaname))
+                    for arenaname, _ in arenanames]
+            maxsize = max(max(fit['sizes']) for fit in fits if fit)
+            best = min(predict(fit, maxsize) for fit in fits if fit)
+            crow = [' __%s__ ' % benchshort]
+            data.append(crow)
+            for fit in fits:
+                if fit is None:
+                    crow.append(' ')
+                    continue
+                scale, units = best_units(fit['constant'])
+                val = '%s %.3g %ss' % (fit['model'], fit['constant'] * scale,
+                                       units)
+                if predict(fit, maxsize) == best:
+                    crow.append(' __%s__ ' % val)
+                else:
+                    crow.append(' %s ' % val)
+        return self._format_gfm(data)
+
+    def to_gfm_crossovers(self, key):
+        """ Return a gfm table of sizes where one function overtakes another.
+
+        ``key`` is a ``(benchfile, arenafile)`` key of ``self.tables``.  See
+        ``scaleutils.findcrossovers``.
+        """
+        benchfile, arenafile = key
+        estimates = dict((k, fit) for k, fit in self.complexity.items()
+                         if k[0] == benchfile and k[2] == arenafile)
+        data = [['__Bench__ ', ' __Faster below__ ', ' __Faster above__ ',
+                 ' __Size__ ']]
+        for crossover in findcrossovers(estimates):
+            data.append([
+                ' __%s__ ' % self._strip_prefix(crossover['benchfunc'],
+                                                self.benchprefixes),
+                ' %s ' % self._strip_prefix(crossover['below'],
+                                            self.arenaprefixes),
+                ' %s ' % self._strip_prefix(crossover['above'],
+                                            self.arenaprefixes),
+                ' %.3g ' % crossover['size'],
+            ])
+        return self._format_gfm(data)
+
+    def to_gfm_scaling(self, key, arenaname):
+        """ Return a gfm table of how a function scales with concurrency.
+
+        ``key`` is a ``(benchfile, arenafile)`` key of ``self.tables``, and
+        the results must be from ``runbenchmarks(concurrency=...)``.  There
+        is a row for each benchmark and number of threads (or processes)
+        that shows the total throughput, the median latency of each thread,
+        and the speedup and efficiency relative to a single thread.  The
+        highest throughput of each benchmark is emphasized.  See
+        ``concurrencyutils.measurescaling``.
+        """
+        data = [['__Bench__ ', ' __Workers__ ', ' __Throughput__ ',
+                 ' __Latency__ ', ' __Speedup__ ', ' __Efficiency__ ']]
+        trials = [trial for trial in self.resultdict[key]
+                  if trial['arenaname'] == arenaname and trial.get('scaling')]
+        trials.sort(key=lambda trial: trial['benchindex'])
+        for trial in trials:
+            benchshort = self._strip_prefix(trial['benchname'],
+                                            self.benchprefixes)
+            best = max(item['throughput'] for item in trial['scaling'])
+            for item in trial['scaling']:
+                scale, units = best_units(item['throughput'])
+                sthroughput = '%.3g %s/s' % (item['throughput'] * scale, units)
+                if item['throughput'] == best:
+                    sthroughput = '__%s__' % sthroughput
+                scale, units = best_units(item['latency'])
+                data.append([
+                    ' __%s__ ' % benchshort,
+                    ' %d %s ' % (item['workers'], item['mode']),
+                    ' %s ' % sthroughput,
+                    ' %.3g %ss ' % (item['latency'] * scale, units),
+                    ' %.3g ' % item['speedup'],
+                    ' %.0f%% ' % (100 * item['efficiency']),
+                ])
+        return self._format_gfm(data)
+
+    def to_gfm_latency(self, key, arenaname):
+        """ Return a gfm table of the distribution of the latency of a function.
+
+        ``key`` is a ``(benchfile, arenafile)`` key of ``self.tables``, and
+        the results must be from ``runbenchmarks(latency=...)``.  There is a
+        row for each benchmark that shows the percentiles and the maximum of
+        the time of one call, the number of samples (times the number of
+        calls per sample if they were batched), and a histogram with
+        log-spaced bins from the fastest to the slowest call (see
+        ``latencyutils.histogram``).
+        """
+        names = ['p%g' % q for q in latencypercentiles] + ['max']
+        data = [['__Bench__ '] + [' __%s__ ' % name for name in names] +
+                [' __Samples__ ', ' __Histogram__ ']]
+        trials = [trial for trial in self.resultdict[key]
+                  if trial['arenaname'] == arenaname and trial.get('latency')]
+        trials.sort(key=lambda trial: trial['benchindex'])
+        for trial in trials:
+            benchshort = self._strip_prefix(trial['benchname'],
+                                            self.benchprefixes)
+            latency = trial['latency']
+            cells = []
+            for name in names:
+                scale, units = best_units(latency[name])
+                cells.append('%.3g %ss' % (latency[name] * scale, units))
+            samples = trial['latencysamples']
+            if latency['batch'] > 1:
+                ssamples = '%d x %d' % (len(samples), latency['batch'])
+            else:
+                ssamples = '%d' % len(samples)
+            counts = [count for _, _, count in histogram(samples)]
+            data.append([' __%s__ ' % benchshort] +
+                        [' %s ' % cell for cell in cells] +
+                        [' %s ' % ssamples, ' `%s` ' % sparkline(counts)])
+        return self._format_gfm(data)
+
+
+class ComparePrinter(BenchPrinter):
+    def __init__(self, comparisons, arenaprefixes=None, benchprefixes=None):
+        """ Print comparisons of two result sets in table form
+
+        ``comparisons`` are from ``compareutils.compareresults``.  Tables
+        are keyed by ``(benchfile, arenafile)`` like for ``BenchPrinter``,
+        and each table is a list of rows of comparison dicts.
+        """
+        self.comparisons = comparisons
+        self.arenaprefixes = arenaprefixes
+        self.benchprefixes = benchprefixes
+        self.tables = {}
+        bykey = {}
+        for comparison in comparisons:
+            key = (comparison['benchfile'], comparison['arenafile'])
+            bykey.setdefault(key, []).append(comparison)
+        for key, items in bykey.items():
+            rows = {}
+            for comparison in items:
+                rows.setdefault(comparison['benchname'], []).append(comparison)
+            self.tables[key] = [
+                sorted(rows[benchname],
+                       key=lambda item: numericstringkey(item['arenaname']))
+                for benchname in nsorted(rows)
+            ]
+
+    def to_gfm(self, key, pvalue=False):
+        """ Return a github-flavored markdown table of the changes of times.
+
+        ``key`` is a ``(benchfile, arenafile)`` key of ``self.tables``.  Each
+        cell shows the ratio of the median times of candidate to baseline,
+        such as "0.8" for 20% faster.  Significant speedups are emphasized
+        like the best times of ``BenchPrinter.to_gfm`` (e.g., "__0.8__"),
+        and significant slowdowns are shown like "*1.2*".  If ``pvalue`` is
+        True, then the p-value of each change is shown too.
+        """
+        table = self.tables[key]
+        arenanames = nsorted(set(item['arenaname'] for row in table
+                                 for item in row))
+        data = []
+        column_names = ['__Bench__ \\ __Func__ ']
+        for arenaname in arenanames:
+            column_names.append(
+                ' __%s__ ' % self._strip_prefix(arenaname, self.arenaprefixes))
+        data.append(column_names)
+        for row in table:
+            benchshort = self._strip_prefix(row[0]['benchname'],
+                                            self.benchprefixes)
+            crow = [' __%s__ ' % benchshort]
+            data.append(crow)
+            byname = dict((item['arenaname'], item) for item in row)
+            for arenaname in arenanames:
+                item = byname.get(arenaname)
+                if item is None:
+                    crow.append(' ')
+                    continue
+                val = '%.3g' % item['ratio']
+                if pvalue:
+                    val = '%s (p=%.2g)' % (val, item['pvalue'])
+                if item['change'] == 'faster':
+                    crow.append(' __%s__ ' % val)
+                elif item['change'] == 'slower':
+                    crow.append(' *%s* ' % val)
+                else:
+                    crow.append(' %s ' % val)
+        return self._format_gfm(data)
@@ -0,0 +1,178 @@
+from __future__ import print_function
+import os
+import re
+import sys
+import threading
+import time
+from .timerutils import BenchTimer
+
+default_profiledir = 'benchprofiles'
+default_profiletime = 1.0
+default_interval = 0.0005
+profilemethods = ['cprofile', 'sample']
+
+
+def getprofilename(trial, profiledir=default_profiledir):
+    """ Return the base filename (without extension) of a trial's profiles.
+
+    This is unique for each pair of benchmark and function, such as
+    "benchprofiles/bench_zeros.bench_large--zeros.zeros_mul".
+    """
+    # Used by: profiletrial
+    benchbase = os.path.splitext(os.path.basename(trial['benchfile']))[0]
+    arenabase = os.path.splitext(os.path.basename(trial['arenafile']))[0]
+    name = '%s.%s--%s.%s' % (benchbase, trial['benchname'], arenabase,
+                             trial['arenaname'])
+    name = re.sub(r'[^\w.\-]+', '_', name)
+    return os.path.join(profiledir, name)
+
+
+def _runfor(timer, loops, duration):
+    """ Run the ``timeit.Timer`` repeatedly for at least ``duration`` seconds
+    """
+    start = time.time()
+    while True:
+        timer.timeit(loops)
+        if time.time() - start >= duration:
+            break
+
+
+def cprofileit(statements, setup, filename, loops=1,
+               profiletime=default_profiletime, itersetup=None):
+    """ Profile ``statements`` with ``cProfile`` and save stats to ``filename``
+
+    The statements are run in batches of ``loops`` iterations for about
+    ``profiletime`` seconds.  The saved stats may be loaded with ``pstats``
+    or viewed with tools such as SnakeViz.  If ``itersetup`` is given, it
+    creates the inputs of every iteration (see ``timerutils.BenchTimer``),
+    and its calls are shown as "_benchsetup".
+    """
+    # Used by: profiletrial
+    import cProfile
+    timer = BenchTimer(statements, setup, globals={}, itersetup=itersetup)
+    profiler = cProfile.Profile()
+    profiler.runcall(_runfor, timer, loops, profiletime)
+    profiler.dump_stats(filename)
+    return filename
+
+
+def _framelabel(frame):
+    code = frame.f_code
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename),
+                           code.co_firstlineno)
+
+
+def sampleit(statements, setup, filename, loops=1,
+             profiletime=default_profiletime, interval=default_interval,
+             rootname='benchmark', itersetup=None):
+    """ Profile ``statements`` by sampling stacks and save collapsed stacks.
+
+    The statements are run in batches of ``loops`` iterations for about
+    ``profiletime`` seconds while another thread samples the stack of the
+    running benchmark every ``interval`` seconds.  Only the frames called by
+    the benchmark are kept, and the benchmark itself is named ``rootname``.
+
+    The stacks are saved to ``filename`` in the "collapsed" format, which
+    has one line per unique stack, such as "root;func1;func2 42", and can be
+    converted to a flamegraph with ``flamegraph.pl`` or speedscope.  See
+    ``cprofileit`` for ``itersetup``.
+    """
+    # Used by: profiletrial
+    timer = BenchTimer(statements, setup, globals={}, itersetup=itersetup)
+    threadid = getattr(threading, 'get_ident', None)
+    if threadid is None:  # Python 2
+        import thread
+        threadid = thread.get_ident
+    target = threadid()
+    counts = {}
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                if frame.f_code.co_filename == '<timeit-src>':
+                    stack.append(rootname)
+                    break
+                stack.append(_framelabel(frame))
+                frame = frame.f_back
+            else:
+                # The benchmark is not running (such as between batches)
+                stack = None
+            if stack:
+                key = ';'.join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            time.sleep(interval)
+
+    # The sampler thread needs the GIL to take a sample, so let it switch in
+    # at about the sampling interval (Python 3 only).
+    switchinterval = getattr(sys, 'getswitchinterval', lambda: None)()
+    if switchinterval is not None:
+        sys.setswitchinterval(min(switchinterval, interval))
+    sampler = threading.Thread(target=sample)
+    sampler.daemon = True
+    sampler.start()
+    try:
+        _runfor(timer, loops, profiletime)
+    finally:
+        done.set()
+        sampler.join()
+        if switchinterval is not None:
+            sys.setswitchinterval(switchinterval)
+    with open(filename, 'w') as f:
+        for key, count in sorted(counts.items()):
+            f.write('%s %d\n' % (key, count))
+    return filename
+
+
+def profiletrial(trial, method=True, profiledir=default_profiledir,
+                 profiletime=default_profiletime):
+    """ Profile a trial that has been timed and return paths to the profiles.
+
+    ``method`` may be "cprofile", "sample", or True for both, in which case
+    ``profiletime`` is split between the two.  The number of loops used to
+    time the trial is used for each batch of the profiled runs.
+
+    Returns a dict with the following items:
+
+        - profilestacks: filename of collapsed stacks (see ``sampleit``)
+        - profilestats: filename of ``cProfile`` stats (see ``cprofileit``)
+
+    Values are None for methods that were not used.
+    """
+    # Uses: getprofilename, cprofileit, sampleit
+    # Used by: runbenchmarks
+    if method is True:
+        methods = profilemethods
+    elif method in profilemethods:
+        methods = [method]
+    else:
+        raise ValueError('Bad profile method: %r.  Must be True or one of %s'
+                         % (method, profilemethods))
+    if not os.path.isdir(profiledir):
+        try:
+            os.makedirs(profiledir)
+        except OSError:
+            # another worker process may have just created it
+            if not os.path.isdir(profiledir):
+                raise
+    basename = getprofilename(trial, profiledir=profiledir)
+    statements = trial['benchstring']
+    setup = trial['setupstring']
+    itersetup = trial.get('itersetupstring')
+    loops = trial['loops'] or 1
+    budget = profiletime / len(methods)
+    info = dict(profilestacks=None, profilestats=None)
+    if 'cprofile' in methods:
+        info['profilestats'] = cprofileit(statements, setup,
+                                          basename + '.pstats', loops=loops,
+                                          profiletime=budget,
+                                          itersetup=itersetup)
+    if 'sample' in methods:
+        info['profilestacks'] = sampleit(statements, setup,
+                                         basename + '.collapsed', loops=loops,
+                                         profiletime=budget,
+                                         rootname=trial['benchname'],
+                                         itersetup=itersetup)
+    return info
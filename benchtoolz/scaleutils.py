@@ -0,0 +1,213 @@
+from __future__ import division
+import math
+
+# Candidate models of how the time of a benchmark grows with its size ``n``.
+# Each is fit as ``time = intercept + constant * model(n)``.
+complexitymodels = [
+    ('O(1)', lambda n: 1.0),
+    ('O(log n)', lambda n: math.log(n) if n > 1 else 0.0),
+    ('O(n)', lambda n: float(n)),
+    ('O(n log n)', lambda n: n * math.log(n) if n > 1 else 0.0),
+    ('O(n^2)', lambda n: float(n) * n),
+]
+modelfuncs = dict(complexitymodels)
+default_crossoverpoints = 200
+
+
+def geometricsizes(start=1, stop=2 ** 16, factor=4):
+    """ Return a geometric series of integer sizes from ``start`` to ``stop``
+
+    >>> geometricsizes(1, 1000, 10)
+    [1, 10, 100, 1000]
+    """
+    if start < 1 or factor <= 1:
+        raise ValueError('start must be at least 1 and factor greater than 1')
+    sizes = []
+    size = start
+    while size <= stop:
+        if int(size) not in sizes:
+            sizes.append(int(size))
+        size *= factor
+    return sizes
+
+
+def _fitmodel(sizes, times, func):
+    """ Fit ``time = intercept + constant * func(n)`` by least squares.
+
+    Residuals are relative to the measured times (i.e., weighted by 1/t^2),
+    so small and large sizes are fit equally well.  The intercept and
+    constant are constrained to be non-negative.  Returns the intercept,
+    constant, and the sum of squared relative residuals, or None if the
+    model can't be fit.
+    """
+    f = [func(n) for n in sizes]
+    w = [1.0 / (t * t) if t > 0 else 1.0 for t in times]
+    sw = math.fsum(w)
+    swf = math.fsum(wi * fi for wi, fi in zip(w, f))
+    swff = math.fsum(wi * fi * fi for wi, fi in zip(w, f))
+    swt = math.fsum(wi * ti for wi, ti in zip(w, times))
+    swft = math.fsum(wi * fi * ti for wi, fi, ti in zip(w, f, times))
+    det = sw * swff - swf * swf
+    if det > 1e-12 * sw * swff:
+        constant = (sw * swft - swf * swt) / det
+        intercept = (swt - constant * swf) / sw
+    else:
+        constant = -1.0
+        intercept = 0.0
+    if intercept < 0 or constant < 0:
+        # refit without an intercept
+        if swff <= 0:
+            return None
+        intercept = 0.0
+        constant = swft / swff
+        if constant < 0:
+            return None
+    rss = math.fsum(wi * (ti - intercept - constant * fi) ** 2
+                    for wi, fi, ti in zip(w, f, times))
+    return intercept, constant, rss
+
+
+def fitcomplexity(sizes, times):
+    """ Determine which complexity model best describes ``times`` vs ``sizes``
+
+    Each model of ``complexitymodels`` is fit, and the best model is chosen by
+    the Bayesian information criterion, which prefers the simpler O(1) model
+    unless a growing model fits significantly better.
+
+    Returns a dict with the following items:
+
+        - constant: the constant factor of the best model in seconds
+        - fits: dict of model name to (intercept, constant, rms) of each fit
+        - intercept: constant overhead in seconds of the best model
+        - model: name of the best model, such as "O(n log n)"
+        - rms: root mean square of the relative residuals of the best model
+    """
+    # Used by: estimatecomplexity
+    m = len(sizes)
+    if m != len(times) or m < 2:
+        raise ValueError('At least two sizes and times are required')
+    fits = {}
+    best = None
+    for name, func in complexitymodels:
+        if name == 'O(1)':
+            w = [1.0 / (t * t) if t > 0 else 1.0 for t in times]
+            constant = (math.fsum(wi * ti for wi, ti in zip(w, times)) /
+                        math.fsum(w))
+            rss = math.fsum(wi * (ti - constant) ** 2
+                            for wi, ti in zip(w, times))
+            fit = 0.0, constant, rss
+            k = 1
+        else:
+            fit = _fitmodel(sizes, times, func)
+            if fit is None:
+                continue
+            k = 2
+        intercept, constant, rss = fit
+        fits[name] = (intercept, constant, math.sqrt(rss / m))
+        bic = m * math.log(rss / m + 1e-12) + k * math.log(m)
+        if best is None or bic < best[0]:
+            best = bic, name
+    name = best[1]
+    intercept, constant, rms = fits[name]
+    return dict(
+        constant=constant,
+        fits=fits,
+        intercept=intercept,
+        model=name,
+        rms=rms,
+    )
+
+
+def predict(fit, n):
+    """ Return the predicted time at size ``n`` from ``fitcomplexity`` result
+    """
+    return fit['intercept'] + fit['constant'] * modelfuncs[fit['model']](n)
+
+
+def estimatecomplexity(results):
+    """ Fit complexity models to the results of a size sweep.
+
+    ``results`` are trial dicts from ``runbenchmarks(sizes=...)``.  Trials
+    are grouped by benchmark function and arena function, and the
+    ``mintime`` of each size is used.
+
+    Returns a dict that maps ``(benchfile, benchfunc, arenafile, arenaname)``
+    to the dict returned by ``fitcomplexity`` with the additional items
+    ``sizes`` and ``times``.
+    """
+    # Uses: fitcomplexity
+    groups = {}
+    for trial in results:
+        if trial.get('benchsize') is None:
+            continue
+        key = (trial['benchfile'], trial['benchfunc'], trial['arenafile'],
+               trial['arenaname'])
+        groups.setdefault(key, []).append((trial['benchsize'],
+                                           trial['mintime']))
+    estimates = {}
+    for key, points in groups.items():
+        if len(points) < 2:
+            continue
+        points.sort()
+        sizes = [size for size, _ in points]
+        times = [t for _, t in points]
+        fit = fitcomplexity(sizes, times)
+        fit.update(sizes=sizes, times=times)
+        estimates[key] = fit
+    return estimates
+
+
+def findcrossovers(estimates, numpoints=default_crossoverpoints):
+    """ Find sizes where one arena function becomes faster than another.
+
+    ``estimates`` is the dict returned by ``estimatecomplexity``.  For each
+    benchmark function, the fitted models of each pair of arena functions
+    from the same arena file are compared on ``numpoints`` geometrically
+    spaced sizes within the measured sizes.
+
+    Returns a list of dicts with the following items:
+
+        - above: name of the faster arena function above the crossover
+        - arenafile: filename of the arena functions
+        - below: name of the faster arena function below the crossover
+        - benchfile: filename of the benchmark
+        - benchfunc: name of the benchmark function
+        - size: the (approximate) size of the crossover
+    """
+    # Uses: predict
+    groups = {}
+    for key, fit in estimates.items():
+        benchfile, benchfunc, arenafile, arenaname = key
+        groups.setdefault((benchfile, benchfunc, arenafile), []).append(
+            (arenaname, fit))
+    crossovers = []
+    for (benchfile, benchfunc, arenafile), fits in sorted(groups.items()):
+        fits.sort(key=lambda item: item[0])
+        lo = max(min(fit['sizes']) for _, fit in fits)
+        hi = min(max(fit['sizes']) for _, fit in fits)
+        if hi <= lo:
+            continue
+        ratio = (hi / lo) ** (1.0 / (numpoints - 1))
+        grid = [lo * ratio ** i for i in range(numpoints)]
+        for i, (name1, fit1) in enumerate(fits):
+            for name2, fit2 in fits[i + 1:]:
+                prevdiff = prevn = None
+                for n in grid:
+                    diff = predict(fit1, n) - predict(fit2, n)
+                    if prevdiff is not None and (diff < 0) != (prevdiff < 0):
+                        if diff < 0:
+                            below, above = name2, name1
+                        else:
+                            below, above = name1, name2
+                        crossovers.append(dict(
+                            above=above,
+                            arenafile=arenafile,
+                            below=below,
+                            benchfile=benchfile,
+                            benchfunc=benchfunc,
+                            size=math.sqrt(n * prevn),
+                        ))
+                    if diff != 0:
+                        prevdiff = diff
+                        prevn = n
+    return crossovers
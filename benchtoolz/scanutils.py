@@ -0,0 +1,187 @@
+from __future__ import print_function
+import ast
+import json
+import multiprocessing
+import os
+from .cacheutils import hashtext
+
+default_indexfile = '.benchtoolz_index.json'
+# Stale files are scanned in a process pool only if there are at least this
+# many per worker; otherwise, starting the pool takes longer than scanning.
+default_minpoolfiles = 8
+_indexversion = 1
+_functypes = (ast.FunctionDef,)
+if hasattr(ast, 'AsyncFunctionDef'):
+    _functypes += (ast.AsyncFunctionDef,)
+
+
+def scanfile(filename):
+    """ Return list of names of functions defined in global scope of a file.
+
+    The file is parsed with ``ast``, *not* imported, so this is safe to use
+    on any Python file.  Names are in the order they are defined, and both
+    regular and ``async`` functions are included.
+    """
+    with open(filename, 'rb') as f:
+        source = f.read()
+    return _scanfuncs(source, filename)
+
+
+def _scanfuncs(source, filename):
+    tree = ast.parse(source, filename)
+    funcnames = []
+    for node in tree.body:
+        if isinstance(node, _functypes) and node.name not in funcnames:
+            funcnames.append(node.name)
+    return funcnames
+
+
+def _scanentry(filename):
+    """ Return index entry of a file (a dict of mtime, size, hash and funcs)
+    """
+    stat = os.stat(filename)
+    with open(filename, 'rb') as f:
+        source = f.read()
+    return dict(
+        funcs=_scanfuncs(source, filename),
+        hash=hashtext(source),
+        mtime=stat.st_mtime,
+        size=stat.st_size,
+    )
+
+
+class ScanIndex(object):
+    """ An on-disk index of the functions defined in Python files.
+
+    The index maps the absolute path of each file to its modification time,
+    size, content hash, and list of functions (see ``scanfile``).  A file is
+    only parsed again if its modification time or size changed *and* its
+    content hash changed, so discovery of benchmarks in large source trees
+    is fast when few files have changed.
+
+    The index file is JSON and is written by ``save`` only if it changed.
+    """
+    def __init__(self, filename=default_indexfile):
+        self.filename = filename
+        self.dirty = False
+        self._entries = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.filename and os.path.exists(self.filename):
+                try:
+                    with open(self.filename) as f:
+                        data = json.load(f)
+                except ValueError:
+                    # A corrupt index is simply rebuilt
+                    data = {}
+                if data.get('version') == _indexversion:
+                    self._entries = data.get('files', {})
+        return self._entries
+
+    def _lookup(self, path):
+        """ Return the functions of ``path`` if known, else None"""
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        stat = os.stat(path)
+        if entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return entry['funcs']
+        with open(path, 'rb') as f:
+            digest = hashtext(f.read())
+        if digest != entry['hash']:
+            return None
+        # The file was touched, but not changed
+        entry['mtime'] = stat.st_mtime
+        entry['size'] = stat.st_size
+        self.dirty = True
+        return entry['funcs']
+
+    def update(self, path, entry):
+        self.entries[path] = entry
+        self.dirty = True
+
+    def getfuncs(self, filename):
+        """ Return list of names of global functions defined in ``filename``
+        """
+        path = os.path.abspath(filename)
+        funcs = self._lookup(path)
+        if funcs is None:
+            entry = _scanentry(path)
+            self.update(path, entry)
+            funcs = entry['funcs']
+        return list(funcs)
+
+    def save(self):
+        """ Write the index to disk if it changed and return whether it did
+        """
+        if not self.dirty or not self.filename:
+            return False
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # Write to a temporary file first so the index is never left
+        # half-written if we are interrupted.
+        tmpname = '%s.%d.tmp' % (self.filename, os.getpid())
+        with open(tmpname, 'w') as f:
+            json.dump(dict(version=_indexversion, files=self.entries), f,
+                      sort_keys=True, separators=(',', ':'))
+        os.rename(tmpname, self.filename)
+        self.dirty = False
+        return True
+
+
+def getindex(index):
+    """ Return a ``ScanIndex`` from ``index``, which may be a ``ScanIndex``,
+    the filename of an index, True to use the default file, or None.
+    """
+    # Used by: scanfiles
+    if index is None or isinstance(index, ScanIndex):
+        return index
+    if index is True:
+        return ScanIndex(default_indexfile)
+    return ScanIndex(index)
+
+
+def scanfiles(filenames, index=None, workers=None,
+              minpoolfiles=default_minpoolfiles):
+    """ Return dict that maps each filename to its list of global functions.
+
+    Files are looked up in ``index`` (see ``getindex``) if given, and the
+    files that are not in the index or have changed are parsed, then the
+    index is saved.  If ``workers`` is given and there are at least
+    ``minpoolfiles`` files per worker to parse, then the files are parsed in
+    a pool of ``workers`` processes.
+    """
+    # Uses: getindex, ScanIndex
+    # Used by: scanfuncs, findarenas, findbenchmarks
+    index = getindex(index)
+    if index is None:
+        index = ScanIndex(None)
+    results = {}
+    stale = []
+    for filename in filenames:
+        path = os.path.abspath(filename)
+        funcs = index._lookup(path)
+        if funcs is None:
+            stale.append((filename, path))
+        else:
+            results[filename] = list(funcs)
+    paths = [path for _, path in stale]
+    if workers and len(paths) >= minpoolfiles * workers:
+        pool = multiprocessing.Pool(workers)
+        try:
+            entries = pool.map(_scanentry, paths,
+                               chunksize=max(1, len(paths) // (4 * workers)))
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        entries = [_scanentry(path) for path in paths]
+    for (filename, path), entry in zip(stale, entries):
+        index.update(path, entry)
+        results[filename] = list(entry['funcs'])
+    index.save()
+    return results
@@ -0,0 +1,196 @@
+from __future__ import division
+import math
+
+default_confidence = 0.95
+
+
+def mean(data):
+    """ Return the arithmetic mean of ``data``"""
+    return math.fsum(data) / len(data)
+
+
+def median(data):
+    """ Return the median of ``data``"""
+    data = sorted(data)
+    n = len(data)
+    mid = n // 2
+    if n % 2:
+        return data[mid]
+    return (data[mid - 1] + data[mid]) / 2.0
+
+
+def percentile(data, q):
+    """ Return the ``q``-th percentile of ``data``, such as 99 for p99
+
+    Values between data points are linearly interpolated, so
+    ``percentile(data, 50) == median(data)``.
+    """
+    data = sorted(data)
+    if not 0 <= q <= 100:
+        raise ValueError('q must be between 0 and 100; got %r' % q)
+    pos = (len(data) - 1) * q / 100.0
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(data) - 1)
+    return data[lo] + (data[hi] - data[lo]) * (pos - lo)
+
+
+def stdev(data):
+    """ Return the sample standard deviation of ``data``
+
+    Returns 0.0 if there are fewer than two values.
+    """
+    n = len(data)
+    if n < 2:
+        return 0.0
+    mu = mean(data)
+    return math.sqrt(math.fsum((x - mu) ** 2 for x in data) / (n - 1))
+
+
+def mad(data):
+    """ Return the median absolute deviation of ``data``
+
+    Multiply by 1.4826 to estimate the standard deviation of normal data.
+    This is much less sensitive to outliers than ``stdev``.
+    """
+    med = median(data)
+    return median([abs(x - med) for x in data])
+
+
+def normalcdf(x):
+    """ Return the cumulative distribution function of the standard normal"""
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def normalquantile(p):
+    """ Return ``x`` such that ``normalcdf(x) == p`` (found by bisection)"""
+    if not 0.0 < p < 1.0:
+        raise ValueError('p must be between 0 and 1; got %r' % p)
+    lo, hi = -40.0, 40.0
+    for i in range(100):
+        mid = (lo + hi) / 2.0
+        if normalcdf(mid) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2.0
+
+
+def medianci(data, confidence=default_confidence):
+    """ Return a distribution-free confidence interval of the median.
+
+    The interval is given by order statistics of ``data``, whose ranks are
+    determined from the normal approximation of the binomial distribution.
+    This does not assume the data are normally distributed, which is good,
+    because benchmark times typically have a long tail.  When there is too
+    little data for the requested confidence, ``(min(data), max(data))`` is
+    returned.
+    """
+    data = sorted(data)
+    n = len(data)
+    z = normalquantile(0.5 + confidence / 2.0)
+    k = int(math.floor((n - z * math.sqrt(n)) / 2.0))
+    if k < 0:
+        k = 0
+    return data[k], data[n - 1 - k]
+
+
+def describe(data, confidence=default_confidence):
+    """ Return a dict of summary statistics of ``data``.
+
+    The dict has the following items:
+
+        - cihigh: upper bound of the confidence interval of the median
+        - cilow: lower bound of the confidence interval of the median
+        - median: the median
+        - relci: half-width of the confidence interval relative to the median
+        - stdev: sample standard deviation
+    """
+    med = median(data)
+    cilow, cihigh = medianci(data, confidence=confidence)
+    if med > 0:
+        relci = (cihigh - cilow) / (2.0 * med)
+    else:
+        relci = 0.0
+    return dict(
+        cihigh=cihigh,
+        cilow=cilow,
+        median=med,
+        relci=relci,
+        stdev=stdev(data),
+    )
+
+
+def _exactucounts(n1, n2):
+    """ Return the number of orderings of two samples that give each U value.
+
+    Element ``u`` of the returned list is the number of distinct orderings of
+    samples of sizes ``n1`` and ``n2`` (without ties) for which the U
+    statistic of the first sample is ``u``.
+    """
+    # Used by: mannwhitneyu
+    # counts[j] are the counts for sizes (i, j) of the current i
+    counts = [[1] for j in range(n2 + 1)]
+    for i in range(1, n1 + 1):
+        new = [[1]]
+        for j in range(1, n2 + 1):
+            # The largest value is either from the first sample, which then
+            # beats all j values of the second sample, or from the second.
+            first = [0] * j + counts[j]
+            second = new[j - 1]
+            size = i * j + 1
+            new.append([(first[u] if u < len(first) else 0) +
+                        (second[u] if u < len(second) else 0)
+                        for u in range(size)])
+        counts = new
+    return counts[n2]
+
+
+def mannwhitneyu(x, y, maxexact=20):
+    """ Return the U statistic of ``x`` and the two-sided p-value.
+
+    This is the Mann-Whitney U (or Wilcoxon rank-sum) test of whether values
+    of ``x`` tend to be larger or smaller than values of ``y``.  It doesn't
+    assume the data are normally distributed.  U is the number of pairs with
+    the value of ``x`` greater than the value of ``y`` (ties count one
+    half), so ``U / (len(x) * len(y))`` is the probability that a value of
+    ``x`` is greater.
+
+    The p-value is exact if both samples have at most ``maxexact`` values
+    and there are no ties.  Otherwise, the normal approximation with
+    corrections for ties and continuity is used.  Note that the smallest
+    possible p-value of samples of three values each is 0.1.
+    """
+    # Uses: _exactucounts, normalcdf
+    n1 = len(x)
+    n2 = len(y)
+    if n1 == 0 or n2 == 0:
+        raise ValueError('Both samples must have at least one value')
+    # Average the ranks of tied values
+    values = sorted([(val, 0) for val in x] + [(val, 1) for val in y])
+    n = n1 + n2
+    ranksum = 0.0
+    tieterm = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        rank = (i + j) / 2.0 + 1
+        ranksum += rank * sum(1 for val in values[i:j + 1] if val[1] == 0)
+        t = j - i + 1
+        tieterm += t * t * t - t
+        i = j + 1
+    u = ranksum - n1 * (n1 + 1) / 2.0
+    if tieterm == 0 and n1 <= maxexact and n2 <= maxexact:
+        counts = _exactucounts(n1, n2)
+        total = math.fsum(counts)
+        k = int(round(u))
+        low = math.fsum(counts[:k + 1]) / total
+        high = math.fsum(counts[k:]) / total
+        return u, min(1.0, 2.0 * min(low, high))
+    mu = n1 * n2 / 2.0
+    var = n1 * n2 / 12.0 * ((n + 1) - tieterm / (n * (n - 1)))
+    if var <= 0:
+        return u, 1.0
+    z = max(0.0, abs(u - mu) - 0.5) / math.sqrt(var)
+    return u, min(1.0, 2.0 * (1.0 - normalcdf(z)))
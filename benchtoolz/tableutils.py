@@ -0,0 +1,230 @@
+from __future__ import division
+import math
+from array import array
+
+# Columns of trial dicts that are stored as integer codes of their labels
+labelcolumns = ['arenafile', 'arenaname', 'benchfile', 'benchname']
+# Integer columns; None is stored as -1
+intcolumns = ['arenaindex', 'benchindex', 'loops']
+# Float columns; None is stored as NaN
+floatcolumns = ['cihigh', 'cilow', 'median', 'mintime', 'peakmemory']
+
+_nan = float('nan')
+
+
+def isnull(value):
+    """ Return True if ``value`` is NaN (i.e., a missing float value)"""
+    return value != value
+
+
+class ResultTable(object):
+    """ Compact columnar storage of the results of many trials.
+
+    Each column of ``labelcolumns``, ``intcolumns``, and ``floatcolumns`` is
+    stored in an ``array.array``, so a table of 100k trials takes a few
+    megabytes, and operations are simple loops over arrays.  Labels such as
+    filenames and function names are stored as integer codes into the list
+    of unique labels ``self.labels[name]``.  Missing values are stored as -1
+    in integer columns and as NaN in float columns.
+
+    The trial dicts are kept (by reference) in ``self.trials``, so row ``i``
+    of the table is ``self.trials[i]``.
+
+    Operations take the names of the columns to group by, and rows are only
+    compared within their group:
+
+        - groupby: row indices of each group
+        - pivot: a 2d table of a column, such as benchmarks vs functions
+        - relative: values relative to the smallest value of their group
+        - rank: tie-aware ranks within groups, such as ``[1, 2, 2, 4]``
+        - geomean: geometric mean of values of each group
+    """
+    def __init__(self, trials=()):
+        self.trials = []
+        self.labels = dict((name, []) for name in labelcolumns)
+        self._codes = dict((name, {}) for name in labelcolumns)
+        self.columns = {}
+        for name in labelcolumns + intcolumns:
+            self.columns[name] = array('l')
+        for name in floatcolumns:
+            self.columns[name] = array('d')
+        self.extend(trials)
+
+    def __len__(self):
+        return len(self.trials)
+
+    def append(self, trial):
+        """ Add a trial dict as a new row"""
+        self.trials.append(trial)
+        for name in labelcolumns:
+            codes = self._codes[name]
+            label = trial[name]
+            code = codes.get(label)
+            if code is None:
+                code = codes[label] = len(codes)
+                self.labels[name].append(label)
+            self.columns[name].append(code)
+        for name in intcolumns:
+            val = trial.get(name)
+            self.columns[name].append(-1 if val is None else val)
+        for name in floatcolumns:
+            val = trial.get(name)
+            self.columns[name].append(_nan if val is None else val)
+
+    def extend(self, trials):
+        """ Add trial dicts as new rows"""
+        trials = list(trials)
+        self.trials.extend(trials)
+        # Fill whole columns at a time, which is much faster than ``append``
+        for name in labelcolumns:
+            codes = self._codes[name]
+            labels = self.labels[name]
+            vals = [trial[name] for trial in trials]
+            for label in dict.fromkeys(vals):
+                if label not in codes:
+                    codes[label] = len(codes)
+                    labels.append(label)
+            self.columns[name].extend(array('l', map(codes.__getitem__,
+                                                     vals)))
+        for name, typecode, null in ([(name, 'l', -1) for name in intcolumns] +
+                                     [(name, 'd', _nan)
+                                      for name in floatcolumns]):
+            vals = [trial.get(name) for trial in trials]
+            if None in vals:
+                vals = [null if val is None else val for val in vals]
+            self.columns[name].extend(array(typecode, vals))
+
+    def getlabel(self, name, row):
+        """ Return the label of column ``name`` of a row"""
+        return self.labels[name][self.columns[name][row]]
+
+    def decode(self, names, key):
+        """ Return a tuple of labels from a group key of ``groupby``"""
+        return tuple(self.labels[name][code] if name in self.labels else code
+                     for name, code in zip(names, key))
+
+    def _getvalues(self, values):
+        if isinstance(values, str):
+            return self.columns[values]
+        return values
+
+    def _getgroups(self, by, rows):
+        if isinstance(by, dict):
+            return by
+        return self.groupby(by, rows)
+
+    def groupby(self, names, rows=None):
+        """ Return dict that maps group keys to arrays of row indices.
+
+        ``names`` is a list of column names, and a group key is a tuple of
+        the integer values (or label codes, see ``decode``) of those columns.
+        ``rows`` limits the table to the given row indices.  The rows of
+        each group are in table order.
+        """
+        columns = [self.columns[name] for name in names]
+        if rows is None:
+            rows = range(len(self))
+            keys = zip(*columns)
+        else:
+            keys = zip(*[[col[i] for i in rows] for col in columns])
+        groups = {}
+        for i, key in zip(rows, keys):
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = array('l')
+            group.append(i)
+        return groups
+
+    def relative(self, values, by, rows=None):
+        """ Return values relative to the smallest value of each group.
+
+        ``values`` is the name of a float column or an array of one value
+        per row.  ``by`` is a list of column names to group by (see
+        ``groupby``) or a dict of groups returned by ``groupby``, which is
+        faster when doing several operations on the same groups.  Missing
+        values stay NaN.  If the smallest value is zero,
+        then zero is 1.0 and other values are infinite.
+        """
+        # Uses: _getgroups
+        values = self._getvalues(values)
+        result = array('d', [_nan]) * len(self)
+        for group in self._getgroups(by, rows).values():
+            vals = [values[i] for i in group]
+            # NaN != NaN, so this skips missing values
+            present = [val for val in vals if val == val]
+            if not present:
+                continue
+            minval = min(present)
+            if minval > 0:
+                # NaN / minval is NaN
+                for i, val in zip(group, vals):
+                    result[i] = val / minval
+                continue
+            for i, val in zip(group, vals):
+                if val == val:
+                    result[i] = 1.0 if val == minval else float('inf')
+        return result
+
+    def rank(self, values, by, rows=None):
+        """ Return ranks of values within each group, where 1 is the smallest.
+
+        Tied values share the same (lowest) rank, such as ``[1, 2, 2, 4]``.
+        Missing values have rank 0.  See ``relative`` for ``by``.
+        """
+        # Uses: _getgroups
+        values = self._getvalues(values)
+        result = array('l', [0]) * len(self)
+        for group in self._getgroups(by, rows).values():
+            present = sorted(item for item in zip([values[i] for i in group],
+                                                  group)
+                             if item[0] == item[0])
+            prevval = None
+            for n, (val, i) in enumerate(present):
+                if n == 0 or val != prevval:
+                    rank = n + 1
+                    prevval = val
+                result[i] = rank
+        return result
+
+    def pivot(self, values, rows, cols, where=None):
+        """ Return a 2d table of ``values`` with a row and column per label.
+
+        ``rows`` and ``cols`` are column names, such as "benchindex" and
+        "arenaindex".  ``where`` limits the table to the given row indices.
+        Returns a tuple of the sorted row keys, the sorted column keys, and a
+        list of lists of values (None where there is no value).  Keys are
+        integer values or label codes (see ``decode``).
+        """
+        values = self._getvalues(values)
+        rowcol = self.columns[rows]
+        colcol = self.columns[cols]
+        if where is None:
+            where = range(len(self))
+        # The last value of a cell wins, like the last row of a group
+        cells = {}
+        for i in where:
+            val = values[i]
+            cells[rowcol[i], colcol[i]] = None if isnull(val) else val
+        rowkeys = sorted(set(rowkey for rowkey, _ in cells))
+        colkeys = sorted(set(colkey for _, colkey in cells))
+        table = [[cells.get((rowkey, colkey)) for colkey in colkeys]
+                 for rowkey in rowkeys]
+        return rowkeys, colkeys, table
+
+    def geomean(self, values, by, rows=None):
+        """ Return dict that maps group keys to geometric means of values.
+
+        Missing and non-positive values are ignored, and groups without any
+        positive values are omitted.  This is the usual way to summarize
+        relative times (see ``relative``) over many benchmarks.  See
+        ``relative`` for ``by``.
+        """
+        # Uses: _getgroups
+        values = self._getvalues(values)
+        means = {}
+        for key, group in self._getgroups(by, rows).items():
+            logs = [math.log(values[i]) for i in group
+                    if values[i] > 0 and values[i] != float('inf')]
+            if logs:
+                means[key] = math.exp(math.fsum(logs) / len(logs))
+        return means
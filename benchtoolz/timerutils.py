@@ -0,0 +1,290 @@
+from __future__ import print_function
+import ast
+import operator
+import textwrap
+import time
+import timeit
+
+default_overheadrepeat = 7
+# Inputs of per-iteration setups are created in batches of at most this
+# many iterations, and a timing run of ``loops`` iterations is split into
+# about ``default_itersetupbatches`` batches, so slow benchmarks (which use
+# few loops and often large inputs) only hold one input at a time.
+default_itersetupbatch = 4096
+default_itersetupbatches = 64
+
+# Timers that may be selected by name.  Timers with names that end with
+# "_ns" return integer nanoseconds, and the others return float seconds.
+timernames = {'default': timeit.default_timer}
+for _name in ['perf_counter', 'perf_counter_ns', 'process_time',
+              'process_time_ns', 'thread_time', 'thread_time_ns']:
+    if hasattr(time, _name):
+        timernames[_name] = getattr(time, _name)
+del _name
+
+# {(timername, loops, number of inputs): overhead in seconds}
+_overheadcache = {}
+# {(source, filename): code object}
+_codecache = {}
+
+# Like the template of ``timeit``, but the setup is run separately, so the
+# compiled loop is the same for every setup (such as for every function
+# being compared by a benchmark).
+_looptemplate = '''
+def _benchinner(_it, _timer):
+    _t0 = _timer()
+    for _i in _it:
+{statements}
+        pass
+    _t1 = _timer()
+    return _t1 - _t0
+'''
+
+# Like ``_looptemplate``, but the inputs of each iteration are created by
+# ``_benchsetup`` (see ``compilesetup``) before the timer is started.  Only
+# the loop over the inputs is timed, and the inputs are freed after the
+# timer is stopped.
+_itersetuptemplate = '''
+def _benchinner(_it, _timer):
+    _benchtotal = 0
+    _benchleft = _benchlength(_it)
+    _benchbatch = _benchgetbatch(_benchleft)
+    while _benchleft > 0:
+        _benchinputs = [_benchsetup()
+                        for _i in range(min(_benchleft, _benchbatch))]
+        _benchleft -= _benchbatch
+        _t0 = _timer()
+        for {names}, in _benchinputs:
+{statements}
+            pass
+        _t1 = _timer()
+        _benchtotal += _t1 - _t0
+        del _benchinputs
+    return _benchtotal
+'''
+
+# The body of a per-iteration setup, which returns the variables it assigns
+_setuptemplate = '''
+def _benchsetup({params}):
+{itersetup}
+    return ({names},)
+'''
+
+
+def gettimer(timer):
+    """ Return the name, function, and scale to seconds of a timer.
+
+    ``timer`` is a timer function or the name of one in ``timernames``,
+    such as "perf_counter_ns" or "process_time".  The scale is 1e-9 for
+    timers that return nanoseconds, and 1.0 otherwise.
+    """
+    # Used by: BenchTimer, getoverhead, getresolution
+    if isinstance(timer, str):
+        if timer not in timernames:
+            raise ValueError('Unknown timer: %r.  Must be one of %s'
+                             % (timer, sorted(timernames)))
+        name = timer
+        func = timernames[timer]
+    else:
+        func = timer
+        name = getattr(timer, '__name__', repr(timer))
+        if func is timeit.default_timer:
+            name = 'default'
+    scale = 1e-9 if name.endswith('_ns') else 1.0
+    return name, func, scale
+
+
+def getresolution(timer):
+    """ Return the resolution in seconds of a timer (or 1e-9 if unknown)"""
+    # Uses: gettimer
+    # Used by: getlooptimes
+    name, func, scale = gettimer(timer)
+    if func is timeit.default_timer:
+        name = getattr(func, '__name__', name)
+    if name.endswith('_ns'):
+        name = name[:-3]
+    try:
+        return time.get_clock_info(name).resolution
+    except (AttributeError, ValueError):
+        return 1e-9
+
+
+def compilecached(source, filename):
+    """ Compile ``source`` in "exec" mode, reusing the code object if the
+    same source was compiled before in this process.
+    """
+    # Used by: compileloop, BenchTimer, AsyncTimer, _compilesampler
+    key = (source, filename)
+    code = _codecache.get(key)
+    if code is None:
+        code = _codecache[key] = compile(source, filename, 'exec')
+    return code
+
+
+def compileloop(statements, template=_looptemplate, indent=8,
+                filename='<timeit-src>', **fields):
+    """ Return the cached code object of a timing loop of ``statements``.
+
+    ``statements`` are indented by ``indent`` spaces and inserted into
+    ``template``, which should define a function.  Other ``fields`` of the
+    template, such as ``names`` of ``_itersetuptemplate``, are inserted as
+    is.  A benchmark is compiled once per process and the code object is
+    reused for all of its trials, because the loop doesn't include the
+    setup.
+    """
+    # Uses: compilecached
+    # Used by: BenchTimer, AsyncTimer, _compilesampler, outputit
+    source = template.format(
+        statements=textwrap.indent(statements, ' ' * indent), **fields)
+    return compilecached(source, filename)
+
+
+def getinputnames(itersetup):
+    """ Return the sorted names of the variables assigned by ``itersetup``.
+
+    These are the inputs that a per-iteration setup creates for a benchmark.
+    Names assigned in nested functions, classes, and comprehensions are not
+    included.
+    """
+    # Used by: compilesetup, latencyit
+    scopes = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef,
+              ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp,
+              ast.GeneratorExp)
+    names = set()
+    stack = list(ast.parse(itersetup).body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                               ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split('.')[0])
+        if not isinstance(node, scopes):
+            stack.extend(ast.iter_child_nodes(node))
+    return sorted(names)
+
+
+def getitersetupbatch(loops):
+    """ Return the number of inputs created at once for ``loops`` iterations
+    (see ``default_itersetupbatches``).
+    """
+    # Used by: compilesetup
+    return min(max(loops // default_itersetupbatches, 1),
+               default_itersetupbatch)
+
+
+def compilesetup(itersetup, namespace):
+    """ Define the function ``_benchsetup`` of a per-iteration setup.
+
+    ``itersetup`` is run in a function each time ``_benchsetup`` is called,
+    which returns a tuple of the values of the variables it assigns (see
+    ``getinputnames``).  Variables that are also global variables of
+    ``namespace``, such as the input data of a parametrized benchmark, start
+    with the global value, so ``data = list(data)`` creates a fresh copy.
+    The function and its helpers are added to ``namespace``, and the names
+    of the variables are returned.
+    """
+    # Uses: getinputnames, getitersetupbatch, compilecached
+    # Used by: BenchTimer, memoryit, outputit, _compilesampler
+    names = getinputnames(itersetup)
+    if not names:
+        raise ValueError('A per-iteration setup must assign the inputs of '
+                         'the benchmark to variables')
+    params = ', '.join('%s=%s' % (name, name) for name in names
+                       if name in namespace)
+    source = _setuptemplate.format(
+        params=params, itersetup=textwrap.indent(itersetup, '    '),
+        names=', '.join(names))
+    exec(compilecached(source, '<itersetup-src>'), namespace)
+    namespace['_benchlength'] = operator.length_hint
+    namespace['_benchgetbatch'] = getitersetupbatch
+    return names
+
+
+class BenchTimer(timeit.Timer):
+    """ A ``timeit.Timer`` that always returns seconds.
+
+    The timer may be any timer accepted by ``gettimer``, including those that
+    return nanoseconds, and its name is saved as ``timername``.
+
+    Unlike ``timeit.Timer``, ``setup`` is run once in ``globals``, which
+    should be a fresh dict, and the timing loop of ``stmt`` is compiled only
+    once per process (see ``compileloop``).  Hence, creating timers of the
+    same benchmark for many functions is cheap.
+
+    If ``itersetup`` is given, it is run before every iteration to create
+    fresh inputs (see ``compilesetup``), such as a copy of a list that
+    ``stmt`` sorts in place.  Inputs are created in batches before the
+    timer is started, so the cost of ``itersetup`` is not included in the
+    times.  The cost of passing the inputs to ``stmt`` is included, but it
+    is measured and subtracted like the cost of the loop (see
+    ``getoverhead``).
+    """
+    def __init__(self, stmt='pass', setup='pass', timer=timeit.default_timer,
+                 globals=None, itersetup=None):
+        self.timerarg = timer
+        self.timername, self.timer, self.scale = gettimer(timer)
+        namespace = {} if globals is None else globals
+        exec(compilecached(setup, '<setup>'), namespace)
+        if itersetup is None:
+            self.numinputs = None
+            exec(compileloop(stmt), namespace)
+        else:
+            names = compilesetup(itersetup, namespace)
+            self.numinputs = len(names)
+            exec(compileloop(stmt, template=_itersetuptemplate, indent=12,
+                             names=', '.join(names)), namespace)
+        self.inner = namespace['_benchinner']
+
+    def timeit(self, number=timeit.default_number):
+        return self.scale * timeit.Timer.timeit(self, number)
+
+    def getoverhead(self, loops, numrepeat=default_overheadrepeat):
+        """ Return the overhead in seconds of timing ``loops`` loops"""
+        return getoverhead(self.timerarg, loops, numrepeat=numrepeat,
+                           numinputs=self.numinputs)
+
+
+def getoverhead(timer, loops, numrepeat=default_overheadrepeat,
+                numinputs=None):
+    """ Return the time in seconds to run ``loops`` loops of an empty statement.
+
+    This is the overhead of the loop and of calling the timer that is
+    included in every time measured by ``timeit``.  It is the minimum of
+    ``numrepeat`` repeats and is only measured once per process for each
+    timer and number of loops.  If ``numinputs`` is given, this is the
+    overhead of a loop with a per-iteration setup that creates that many
+    inputs (see ``BenchTimer``).
+    """
+    # Uses: BenchTimer
+    # Used by: BenchTimer.getoverhead, runbenchmarks
+    key = (gettimer(timer)[0], loops, numinputs)
+    if key not in _overheadcache:
+        itersetup = None
+        if numinputs is not None:
+            itersetup = ''.join('_benchinput%d = None\n' % i
+                                for i in range(numinputs))
+        empty = BenchTimer('pass', timer=timer, globals={},
+                           itersetup=itersetup)
+        _overheadcache[key] = min(empty.repeat(numrepeat, loops))
+    return _overheadcache[key]
+
+
+def getlooptimes(results, loops, benchtimer, calibrate=True):
+    """ Return the times of one loop from times of running ``loops`` loops.
+
+    If ``calibrate`` is True, then the overhead of the loop and timer of
+    ``benchtimer`` (see ``BenchTimer.getoverhead``) is subtracted first.
+    This matters for very fast benchmarks that take only tens of
+    nanoseconds.  Times are never less than the resolution of the timer
+    divided by ``loops``.
+    """
+    # Uses: getresolution
+    # Used by: bettertimeit, interleavedtimeit
+    if not calibrate:
+        return [x / loops for x in results]
+    overhead = benchtimer.getoverhead(loops)
+    resolution = getresolution(benchtimer.timerarg)
+    return [max(x - overhead, resolution) / loops for x in results]